@@ -0,0 +1,49 @@
+# agent_runtime.py
+import asyncio
+import threading
+
+from llm_client import get_client
+from main import get_flow
+
+
+class AgentRuntime:
+    """
+    Long-lived event loop running in a background thread, for synchronous callers
+    such as the Streamlit app. Submitting work here instead of calling asyncio.run
+    per request keeps the Flow, its nodes and the pooled LLM client (which is bound
+    to its event loop) alive across requests, reruns and sessions.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="agent-runtime", daemon=True)
+        self.thread.start()
+        self.run(self._warm_up())
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _warm_up(self):
+        # Build the shared Flow and this loop's LLM client once, up front.
+        get_flow()
+        get_client()
+
+    def run(self, coro, timeout=None):
+        """
+        Runs 'coro' on the background loop and blocks until it returns.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def iterate(self, async_iterator):
+        """
+        Yields the items of an async iterator (e.g. stream_agent_flow) synchronously,
+        while the work itself runs on the background loop.
+        """
+        try:
+            while True:
+                try:
+                    yield self.run(async_iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            self.run(async_iterator.aclose())
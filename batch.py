@@ -0,0 +1,150 @@
+# batch.py
+import asyncio
+import json
+import os
+import time
+
+# Store keys copied into each output record.
+RESULT_KEYS = [
+    "input_type",
+    "user_intent",
+    "summary",
+    "insights",
+    "generated_code",
+    "math_solution",
+    "video_results",
+    "final_result",
+    "partial",
+    "error",
+]
+
+
+def read_items(input_path):
+    """
+    Yields (id, input, error) triples from a JSONL file (objects with an "input",
+    "prompt" or "url" field and an optional "id") or from a plain text file (one
+    input per line, id = line number). 'error' describes a malformed JSONL line
+    (id = line number, input None); it is None for valid items.
+    """
+    is_jsonl = input_path.endswith((".jsonl", ".json"))
+    with open(input_path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if not is_jsonl:
+                yield str(line_number), line, None
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield str(line_number), None, f"Malformed JSON on line {line_number}: {e}"
+                continue
+            if not isinstance(record, dict):
+                yield str(line_number), None, f"Line {line_number} is not a JSON object."
+                continue
+            item_id = str(record.get("id", line_number))
+            user_input = record.get("input") or record.get("prompt") or record.get("url")
+            if not isinstance(user_input, str) or not user_input.strip():
+                yield item_id, None, f"Line {line_number} has no \"input\", \"prompt\" or \"url\" text."
+                continue
+            yield item_id, user_input, None
+
+
+def read_done_ids(output_path):
+    """
+    Returns the set of item IDs that completed successfully in an existing output file.
+    Items whose latest record failed are not included, so a resumed batch runs them
+    again (and their flows resume from their checkpoints, see checkpoint.py).
+    """
+    statuses = {}
+    if not os.path.exists(output_path):
+        return set()
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                statuses[str(record["id"])] = record.get("status", "ok")
+            except (ValueError, KeyError):
+                continue  # Ignore a partially written last line.
+    return {item_id for item_id, status in statuses.items() if status == "ok"}
+
+
+async def run_batch(run_agent_flow, input_path, output_path, concurrency=8, use_cache=True, resume=True,
+                    timeout=None):
+    """
+    Runs every item of 'input_path' through 'run_agent_flow' with at most 'concurrency'
+    flows in flight, appending one JSON line per item to 'output_path' as soon as it finishes.
+    With resume=True, items that already succeeded in the output file are skipped;
+    failed ones run again and get a new record (the latest record of an ID counts).
+    With resume=False every item runs again; earlier records are kept, and the new
+    ones supersede them. Malformed input lines get a failed record each.
+    'timeout' bounds each item (see run_agent_flow); items cut short count as failed.
+    Returns a dict with the run's counters and throughput.
+    """
+    done_ids = read_done_ids(output_path) if resume else set()
+    items, invalid, skipped = [], [], 0
+    for item_id, user_input, error in read_items(input_path):
+        if item_id in done_ids:
+            skipped += 1
+        elif error is not None:
+            invalid.append({"id": item_id, "input": None, "error": error, "status": "failed"})
+        else:
+            items.append((item_id, user_input))
+    total = len(items) + len(invalid)
+    print(f"Batch: {total} items to process ({len(invalid)} malformed), {skipped} already done, concurrency {concurrency}.")
+
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    counts = {"ok": 0, "failed": len(invalid)}
+    started = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out:
+        for record in invalid:
+            print(f"Batch: {record['id']} failed: {record['error']}")
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+        async def worker():
+            while True:
+                try:
+                    item_id, user_input = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                item_started = time.perf_counter()
+                record = {"id": item_id, "input": user_input}
+                try:
+                    store = await run_agent_flow(user_input, use_cache=use_cache, timeout=timeout)
+                    for key in RESULT_KEYS:
+                        record[key] = store.get(key)
+                    record["status"] = "failed" if store.get("error") else "ok"
+                except Exception as e:
+                    record["error"] = f"Unexpected error: {e}"
+                    record["status"] = "failed"
+                record["elapsed_s"] = round(time.perf_counter() - item_started, 3)
+
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                counts[record["status"]] += 1
+                finished = counts["ok"] + counts["failed"]
+                rate = finished / (time.perf_counter() - started)
+                print(f"Batch: [{finished}/{total}] {item_id} {record['status']} in {record['elapsed_s']}s ({rate:.2f} items/s)")
+
+        await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "processed": counts["ok"] + counts["failed"],
+        "ok": counts["ok"],
+        "failed": counts["failed"],
+        "skipped": skipped,
+        "elapsed_s": round(elapsed, 3),
+        "items_per_s": round((counts["ok"] + counts["failed"]) / elapsed, 3) if elapsed > 0 else 0.0,
+    }
+    print(
+        f"\nBatch finished: {summary['processed']} processed ({summary['ok']} ok, {summary['failed']} failed), "
+        f"{summary['skipped']} skipped, {summary['elapsed_s']}s, {summary['items_per_s']} items/s."
+    )
+    return summary
@@ -0,0 +1,145 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start benchmark: each scenario runs in a fresh interpreter, the way a batch
+worker or a newly scaled container starts.
+
+    python -m benchmarks.bench_startup --repeat 10
+    python -m benchmarks.bench_startup --ref HEAD~1
+
+Reports the median wall time of each scenario and which heavy dependencies it
+loaded. With --ref, the same scenarios also run on a git worktree of that commit,
+so the change can be read off directly.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("openai", "httpx", "sympy", "youtube_transcript_api", "tiktoken", "yt_dlp")
+
+# Scenario name -> code run in a fresh interpreter from the repository root.
+SCENARIOS = {
+    "python (baseline)": "pass",
+    "import main": "import main",
+    "import server": "import server",
+    "build flow": "import main; main.get_flow()",
+    "first text request": (
+        "import asyncio, main\n"
+        "asyncio.run(main.run_agent_flow('Write a Python function that reverses a string.', use_cache=False))"
+    ),
+    "first math request": (
+        "import asyncio, main\n"
+        "asyncio.run(main.run_agent_flow('Differentiate x^3 + 2x', use_cache=False))"
+    ),
+}
+REPORT_LOADED = (
+    "\nimport sys\n"
+    "print('LOADED=' + ','.join(m for m in {modules!r} if m in sys.modules), file=sys.stderr)"
+)
+
+
+def run_scenario(code, cwd, env):
+    """
+    Runs 'code' in a new interpreter. Returns (seconds, loaded heavy modules).
+    """
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", code + REPORT_LOADED.format(modules=HEAVY_MODULES)],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(f"Scenario failed in {cwd}:\n{completed.stderr[-2000:]}")
+    loaded = ""
+    for line in completed.stderr.splitlines():
+        if line.startswith("LOADED="):
+            loaded = line[len("LOADED="):]
+    return seconds, loaded
+
+
+def measure(cwd, env, repeat):
+    """
+    Returns {scenario: {"median_ms", "min_ms", "loaded"}} for the tree at 'cwd'.
+    """
+    results = {}
+    for name, code in SCENARIOS.items():
+        run_scenario(code, cwd, env)  # Warm the OS file cache and __pycache__.
+        times, loaded = [], ""
+        for _ in range(repeat):
+            seconds, loaded = run_scenario(code, cwd, env)
+            times.append(seconds * 1000)
+        results[name] = {
+            "median_ms": round(statistics.median(times), 1),
+            "min_ms": round(min(times), 1),
+            "loaded": loaded,
+        }
+    return results
+
+
+def add_worktree(ref):
+    path = tempfile.mkdtemp(prefix="agent-startup-")
+    subprocess.run(["git", "worktree", "add", "--detach", path, ref], cwd=REPO_DIR,
+                   check=True, capture_output=True)
+    return path
+
+
+def remove_worktree(path):
+    subprocess.run(["git", "worktree", "remove", "--force", path], cwd=REPO_DIR, capture_output=True)
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def print_report(label, results, baseline=None):
+    print(f"\n{label}")
+    header = f"{'Scenario':<22}{'median ms':>11}{'min ms':>9}"
+    print(header + (f"{'baseline':>11}{'change':>9}" if baseline else "") + "  loaded")
+    for name, fields in results.items():
+        line = f"{name:<22}{fields['median_ms']:>11}{fields['min_ms']:>9}"
+        if baseline:
+            old = baseline[name]["median_ms"]
+            line += f"{old:>11}{(fields['median_ms'] - old) / old * 100:>+8.0f}%"
+        print(f"{line}  {fields['loaded'] or '-'}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the agent.")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per scenario (the median is reported).")
+    parser.add_argument("--ref", help="Also measure this git commit, e.g. HEAD~1, for comparison.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = FakeOpenAIServer(latency=0.0, tokens_per_second=10000.0, completion_tokens=20).start_in_thread()
+    state_dir = tempfile.mkdtemp(prefix="agent-startup-state-")
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": server.base_url,
+        "OPENAI_API_KEY": "benchmark",
+        "LLM_CACHE_DIR": state_dir,
+        "TRANSCRIPT_CACHE_DIR": state_dir,
+        "INTENT_MODEL_PATH": os.path.join(state_dir, "intent_model.json"),
+    }
+
+    baseline = None
+    if args.ref:
+        path = add_worktree(args.ref)
+        try:
+            baseline = measure(path, env, args.repeat)
+        finally:
+            remove_worktree(path)
+        print_report(f"Commit {args.ref}:", baseline)
+
+    results = measure(REPO_DIR, env, args.repeat)
+    print_report("Working tree:", results, baseline)
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+# benchmarks/fake_openai_server.py
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+
+# Keywords used to answer intent-classification prompts with a plausible label.
+INTENT_KEYWORDS = [
+    ("math_query", ("differentiate", "integral", "integrate", "solve", "derivative", "equation")),
+    ("code_generation", ("function", "code", "script", "python", "javascript", "sql")),
+    ("summarize", ("summarize", "summarise", "summary")),
+    ("insights", ("insight", "takeaway", "key points")),
+]
+
+WORDS = (
+    "the model shows that latency grows with load while throughput depends on "
+    "connection reuse caching and the number of concurrent requests in flight"
+).split()
+
+
+def _classify(prompt):
+    match = re.search(r"User Prompt:(.*)$", prompt, re.S)
+    text = (match.group(1) if match else prompt).lower()
+    for intent, keywords in INTENT_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return intent
+    return "general_query"
+
+
+class FakeOpenAIServer:
+    """
+    Minimal OpenAI-compatible HTTP server for benchmarks. Serves
+    POST /v1/chat/completions (plain and streamed) with a configurable latency
+    before the first token and a configurable token rate afterwards. With 'rpm_limit'
+    set, requests beyond that many per minute get 429 responses like the real API.
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.3, tokens_per_second=200.0,
+                 completion_tokens=150, rpm_limit=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.rpm_limit = rpm_limit
+        self.requests = 0
+        self.rejected = 0
+        self._recent = deque()  # Monotonic times of the requests of the last minute.
+        self._server = None
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    def start_in_thread(self):
+        """
+        Runs the server on its own event loop in a daemon thread, so it does not
+        compete with the event loop being measured.
+        """
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-openai", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+                if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    await self._chat_completion(json.loads(body), writer)
+                else:
+                    self._write_response(writer, 404, {"error": {"message": f"Not found: {path}"}})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _write_response(self, writer, status, payload, headers=""):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n{headers}"
+            "Connection: keep-alive\r\n\r\n".encode("latin-1") + data
+        )
+
+    def _admit(self):
+        """
+        Applies rpm_limit. Returns (admitted, rate-limit header lines).
+        """
+        if not self.rpm_limit:
+            return True, ""
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 60:
+            self._recent.popleft()
+        admitted = len(self._recent) < self.rpm_limit
+        if admitted:
+            self._recent.append(now)
+        reset = 60 - (now - self._recent[0]) if self._recent else 0
+        headers = (
+            f"x-ratelimit-limit-requests: {self.rpm_limit}\r\n"
+            f"x-ratelimit-remaining-requests: {self.rpm_limit - len(self._recent)}\r\n"
+            f"x-ratelimit-reset-requests: {reset:.3f}s\r\n"
+        )
+        if not admitted:
+            headers += f"retry-after: {math.ceil(reset)}\r\n"
+        return admitted, headers
+
+    def _content(self, request):
+        prompt = request["messages"][-1]["content"]
+        if "Classify the following user prompt" in prompt:
+            return [_classify(prompt)]
+        count = min(self.completion_tokens, request.get("max_tokens") or self.completion_tokens)
+        words = [random.choice(WORDS) + " " for _ in range(count)]
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            # Structured reply as requested by SingleCallRouter, in about as many tokens as the words.
+            intent = _classify(prompt)
+            half = len(words) // 2 if intent == "summarize" else len(words)
+            reply = json.dumps({"intent": intent, "answer": "".join(words[:half]).strip(),
+                                "insights": "".join(words[half:]).strip()})
+            size = max(4, len(reply) // len(words)) if words else len(reply)
+            return [reply[i:i + size] for i in range(0, len(reply), size)]
+        return words
+
+    async def _chat_completion(self, request, writer):
+        admitted, limit_headers = self._admit()
+        if not admitted:
+            self.rejected += 1
+            self._write_response(writer, 429, {"error": {
+                "message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded",
+            }}, limit_headers)
+            return
+        self.requests += 1
+        tokens = self._content(request)
+        prompt_tokens = sum(len(m["content"]) for m in request["messages"]) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+        base = {"id": f"chatcmpl-fake-{self.requests}", "created": int(time.time()), "model": request["model"]}
+        await asyncio.sleep(self.latency)
+
+        if not request.get("stream"):
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+            self._write_response(writer, 200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(tokens).strip()}}],
+                "usage": usage,
+            }, limit_headers)
+            return
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+            + limit_headers.encode("latin-1")
+            + b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n"
+        )
+
+        def send(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+        batch = 5  # Tokens per SSE event, to keep the server cheap at high token rates.
+        for i in range(0, len(tokens), batch):
+            await asyncio.sleep(batch / self.tokens_per_second)
+            send(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "delta": {"content": "".join(tokens[i:i + batch])}, "finish_reason": None}]}))
+            await writer.drain()
+        send(json.dumps({**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        send("[DONE]")
+        writer.write(b"0\r\n\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for benchmarks.")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=150)
+    parser.add_argument("--rpm-limit", type=int, help="Answer 429 beyond this many requests per minute.")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, latency=args.latency,
+                              tokens_per_second=args.tokens_per_second,
+                              completion_tokens=args.completion_tokens,
+                              rpm_limit=args.rpm_limit)
+
+    async def serve():
+        await server.start()
+        print(f"Fake OpenAI server listening on {server.base_url}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
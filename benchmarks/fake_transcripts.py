@@ -0,0 +1,59 @@
+# benchmarks/fake_transcripts.py
+import random
+import string
+import time
+
+from youtube_transcript_api import NoTranscriptFound
+
+SENTENCES = [
+    "Today we are going to look at how large systems behave under load.",
+    "The first thing to notice is that most of the time is spent waiting on the network.",
+    "Caching the results of expensive calls can remove that wait entirely.",
+    "Connection reuse matters more than most people expect.",
+    "When many requests arrive at once, queueing delay starts to dominate.",
+    "Measuring the tail latency tells you what your slowest users experience.",
+]
+
+
+def random_video_id(rng=random):
+    return "".join(rng.choices(string.ascii_letters + string.digits + "-_", k=11))
+
+
+class FakeTranscriptSource:
+    """
+    Stand-in for the YouTube transcript download, for nodes.youtube.set_transcript_source.
+    Sleeps 'latency' seconds (it runs on the fetch worker pool, like the real one) and
+    returns a transcript of about 'words' words. Video IDs starting with "missing"
+    raise NoTranscriptFound. With noisy=True it looks like auto-generated captions:
+    short lines that overlap, [Music] markers and filler words.
+    """
+    def __init__(self, latency=0.5, words=2000, noisy=True):
+        self.latency = latency
+        self.words = words
+        self.noisy = noisy
+        self.calls = 0
+
+    def __call__(self, video_id):
+        self.calls += 1
+        time.sleep(self.latency)
+        if video_id.startswith("missing"):
+            raise NoTranscriptFound(video_id, ["en"], None)
+        rng = random.Random(video_id)
+        sentences, count = [], 0
+        while count < self.words:
+            sentence = rng.choice(SENTENCES)
+            sentences.append(sentence)
+            count += len(sentence.split())
+        if not self.noisy:
+            return " ".join(sentences)
+        words = " ".join(sentences).split()
+        lines, start = [], 0
+        while start < len(words):
+            line = words[max(0, start - 3):start + 8]  # Repeats the end of the previous line.
+            if rng.random() < 0.2:
+                line.insert(rng.randrange(len(line) + 1), rng.choice(("uh", "um")))
+            lines.append(" ".join(line))
+            if rng.random() < 0.05:
+                lines.append("[Music]")
+            start += 8
+        return "\n".join(lines)
@@ -0,0 +1,332 @@
+# benchmarks/run_benchmark.py
+"""
+Load test of the full agent flow against local stand-ins for the OpenAI API and
+YouTube, so results are repeatable and cost nothing.
+
+    python -m benchmarks.run_benchmark --requests 200 --concurrency 16
+    python -m benchmarks.run_benchmark --compare benchmarks/results/<earlier>.json
+
+Reports throughput, per-route and per-node latency percentiles, LLM token usage,
+event-loop lag and peak memory, and saves them to benchmarks/results/ as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_openai_server import FakeOpenAIServer
+from benchmarks.fake_transcripts import FakeTranscriptSource, random_video_id
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_MIX = "youtube=2,summarize=2,code=2,math=2,insights=1,general=1"
+
+PROMPTS = {
+    "summarize": "Summarize the following text: {paragraph}",
+    "code": "Write a Python function that returns the {n}th Fibonacci number.",
+    "math": "Differentiate x^{n} + {n}x^2 + sin(x)",
+    "insights": "What are the key takeaways from this: {paragraph}",
+    "general": "Tell me something interesting about the number {n}.",
+}
+PARAGRAPH = (
+    "Distributed systems trade consistency for availability when the network "
+    "partitions. Engineers pick the trade-off per feature, measuring latency, "
+    "error rates and the cost of stale reads before deciding."
+)
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("youtube", "videos") and kind not in PROMPTS:
+            raise SystemExit(f"Unknown input kind in --mix: {kind}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def make_inputs(count, mix, seed):
+    """
+    Returns 'count' (kind, user_input) pairs drawn from 'mix'. Every input is
+    distinct, so caches only help when the benchmark repeats inputs itself.
+    """
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=count)
+    inputs = []
+    for i, kind in enumerate(kinds):
+        if kind == "youtube":
+            inputs.append((kind, f"https://www.youtube.com/watch?v={random_video_id(rng)}"))
+        elif kind == "videos":
+            urls = [f"https://youtu.be/{random_video_id(rng)}" for _ in range(3)]
+            inputs.append((kind, "Compare these videos: " + " ".join(urls)))
+        else:
+            inputs.append((kind, PROMPTS[kind].format(n=i + 2, paragraph=f"{PARAGRAPH} (sample {i})")))
+    return inputs
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop wakes a task that sleeps 'interval' seconds,
+    i.e. how long callbacks are blocked by CPU work on the loop.
+    """
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {}
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000, 3)
+        return {"samples": len(ordered), "p50_ms": pick(50), "p99_ms": pick(99), "max_ms": round(ordered[-1] * 1000, 3)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(RESULTS_DIR),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _round(summary):
+    return {key: round(value, 6) if isinstance(value, float) else value for key, value in summary.items()}
+
+
+def collect_metrics(snapshot):
+    """
+    Reduces a metrics.registry snapshot to per-route, per-node and LLM figures.
+    """
+    routes, nodes, llm = {}, {}, {"requests": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0}
+    for histogram in snapshot["histograms"]:
+        fields = {k: histogram[k] for k in ("count", "mean", "p50", "p90", "p99")}
+        labels = histogram["labels"]
+        if histogram["name"] == "flow_duration_seconds":
+            routes[labels["route"]] = _round(fields)
+        elif histogram["name"] == "node_phase_seconds" and labels["phase"] == "total":
+            nodes[labels["node"]] = _round(fields)
+        elif histogram["name"] == "llm_request_seconds":
+            llm["requests"] += histogram["count"]
+    for counter in snapshot["counters"]:
+        labels = counter["labels"]
+        if counter["name"] == "llm_tokens_total":
+            llm[f"{labels['kind']}_tokens"] += counter["value"]
+        elif counter["name"] == "llm_cache_lookups_total" and labels["result"] == "hit":
+            llm["cache_hits"] += counter["value"]
+    return routes, nodes, llm
+
+
+async def run_load(run_agent_flow, inputs, concurrency, use_cache):
+    queue = asyncio.Queue()
+    for item in inputs:
+        queue.put_nowait(item)
+    latencies, failures, partial = [], 0, 0
+
+    async def worker():
+        nonlocal failures, partial
+        while True:
+            try:
+                kind, user_input = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            try:
+                store = await run_agent_flow(user_input, use_cache=use_cache)
+                if store.get("error"):
+                    failures += 1
+                if store.get("partial"):
+                    partial += 1
+            except Exception as e:
+                print(f"Request failed ({kind}): {e}")
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures, partial
+
+
+async def run_benchmark(args):
+    # Imported here so the environment set up in main() is in place first.
+    import metrics
+    from main import get_flow, run_agent_flow
+    from nodes.youtube import set_transcript_source
+    from llm_client import close_client
+
+    transcripts = FakeTranscriptSource(latency=args.transcript_latency, words=args.transcript_words)
+    set_transcript_source(transcripts)
+    get_flow()
+
+    inputs = make_inputs(args.requests, parse_mix(args.mix), args.seed)
+    if args.warmup:
+        await run_load(run_agent_flow, make_inputs(args.warmup, parse_mix(args.mix), args.seed + 1),
+                       args.concurrency, args.cache)
+    metrics.registry.reset()
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    latencies, failures, partial = await run_load(run_agent_flow, inputs, args.concurrency, args.cache)
+    wall = time.perf_counter() - started
+    await monitor.stop()
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    await close_client()
+
+    ordered = sorted(latencies)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))], 6)
+    routes, nodes, llm = collect_metrics(metrics.registry.snapshot())
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "requests": len(latencies),
+        "failed": failures,
+        "partial": partial,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 3) if wall else None,
+        "latency_s": {"p50": pick(50), "p90": pick(90), "p99": pick(99), "max": round(ordered[-1], 6)},
+        "routes": routes,
+        "nodes": nodes,
+        "llm": llm,
+        "event_loop_lag": monitor.summary(),
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "peak_traced_mb": round(traced_peak / 1024 / 1024, 1) if traced_peak is not None else None,
+        "fake_transcript_fetches": transcripts.calls,
+    }
+
+
+def print_report(result):
+    print(f"\nCommit {result['commit']}: {result['requests']} requests, {result['failed']} failed "
+          f"({result.get('partial', 0)} cut short by the deadline), "
+          f"{result['wall_s']}s, {result['throughput_rps']} req/s")
+    latency = result["latency_s"]
+    print(f"Latency: p50 {latency['p50']:.3f}s  p90 {latency['p90']:.3f}s  p99 {latency['p99']:.3f}s")
+    print(f"{'Route / node':<34}{'count':>7}{'p50 s':>10}{'p99 s':>10}")
+    for section in ("routes", "nodes"):
+        for name, fields in sorted(result[section].items()):
+            print(f"{name:<34}{fields['count']:>7}{fields['p50']:>10.3f}{fields['p99']:>10.3f}")
+    llm = result["llm"]
+    print(f"LLM: {llm['requests']} calls, {llm['cache_hits']} cache hits, "
+          f"{llm['prompt_tokens']} prompt + {llm['completion_tokens']} completion tokens")
+    lag = result["event_loop_lag"]
+    if lag:
+        print(f"Event-loop lag: p50 {lag['p50_ms']}ms  p99 {lag['p99_ms']}ms  max {lag['max_ms']}ms")
+    print(f"Peak RSS: {result['peak_rss_mb']} MB"
+          + (f", peak traced: {result['peak_traced_mb']} MB" if result["peak_traced_mb"] is not None else ""))
+
+
+def print_comparison(result, baseline):
+    """
+    Prints the headline numbers of 'result' next to those of an earlier run.
+    """
+    rows = [
+        ("throughput_rps", result["throughput_rps"], baseline["throughput_rps"]),
+        ("latency p50 s", result["latency_s"]["p50"], baseline["latency_s"]["p50"]),
+        ("latency p99 s", result["latency_s"]["p99"], baseline["latency_s"]["p99"]),
+        ("loop lag p99 ms", result["event_loop_lag"].get("p99_ms"), baseline["event_loop_lag"].get("p99_ms")),
+        ("peak RSS MB", result["peak_rss_mb"], baseline["peak_rss_mb"]),
+        ("LLM calls", result["llm"]["requests"], baseline["llm"]["requests"]),
+    ]
+    print(f"\nCompared with {baseline['commit']} ({baseline['timestamp']}):")
+    for label, new, old in rows:
+        if new is None or old is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"  {label:<18}{old:>12}{new:>12}{change:>10}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the agent flow against local stand-ins.")
+    parser.add_argument("--requests", type=int, default=100, help="Number of flow runs to measure.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Flow runs in flight at once.")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted input kinds (default: {DEFAULT_MIX}).")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured runs before the benchmark.")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Fake LLM seconds before the first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Fake LLM generation speed.")
+    parser.add_argument("--completion-tokens", type=int, default=150, help="Fake LLM tokens per answer.")
+    parser.add_argument("--rpm-limit", type=int, help="Make the fake LLM answer 429 beyond this many requests/minute.")
+    parser.add_argument("--transcript-latency", type=float, default=0.5, help="Fake YouTube seconds per fetch.")
+    parser.add_argument("--transcript-words", type=int, default=2000, help="Fake transcript length in words.")
+    parser.add_argument("--routing-mode", choices=("two_step", "single_call"), default="two_step",
+                        help="How text prompts are routed (see ROUTING_MODE in flow.py).")
+    parser.add_argument("--timeout", type=float,
+                        help="Per-request deadline in seconds (sets FLOW_TIMEOUT; 0 for none; default: FLOW_TIMEOUT).")
+    parser.add_argument("--cache", action="store_true", help="Use the LLM, transcript and similar-prompt caches (off by default).")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report peak Python allocations (slower).")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>-<time>.json).")
+    parser.add_argument("--compare", metavar="RESULT", help="Earlier result file to compare against.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = FakeOpenAIServer(
+        latency=args.llm_latency,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        rpm_limit=args.rpm_limit,
+    ).start_in_thread()
+
+    # Point the agent at the stand-ins, and keep its persistent state out of the way.
+    state_dir = tempfile.mkdtemp(prefix="agent-bench-")
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["LLM_CACHE_DIR"] = state_dir
+    os.environ["TRANSCRIPT_CACHE_DIR"] = state_dir
+    os.environ["INTENT_MODEL_PATH"] = os.path.join(state_dir, "intent_model.json")
+    os.environ["ROUTING_MODE"] = args.routing_mode
+    if args.timeout is not None:
+        os.environ["FLOW_TIMEOUT"] = str(args.timeout)
+    if not args.cache:
+        os.environ["TRANSCRIPT_CACHE_ENABLED"] = "false"
+
+    result = asyncio.run(run_benchmark(args))
+    result["fake_llm_requests"] = server.requests
+    result["fake_llm_rejected"] = server.rejected
+    print_report(result)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{result['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
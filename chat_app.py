@@ -1,13 +1,11 @@
 import streamlit as st
-import asyncio
 import os
-from dotenv import load_dotenv
+import config
 
 # Import the refactored agent function
-from main import run_agent_flow # Assuming run_agent_flow is in main.py
-
-# Load environment variables (important for OpenAI API key)
-load_dotenv()
+from agent_runtime import AgentRuntime
+from main import stream_agent_flow # Streaming variant of run_agent_flow in main.py
+from nodes.input_detector import extract_video_id
 
 # Set Streamlit page configuration
 st.set_page_config(page_title="AI Research Assistant", page_icon="🧠")
@@ -15,9 +13,70 @@ st.set_page_config(page_title="AI Research Assistant", page_icon="🧠")
 st.title("🧠 AI Research Assistant")
 st.write("Ask a question, provide a math query, or paste a YouTube link to get started!")
 
+@st.cache_resource
+def get_runtime():
+    """
+    One background event loop (with the shared Flow and LLM client) for the whole
+    Streamlit server, reused across reruns and sessions.
+    """
+    return AgentRuntime()
+
+def iterate_events(prompt, context_video_id=None):
+    """
+    Yields the events of stream_agent_flow from Streamlit's synchronous script
+    while the flow runs on the persistent background loop.
+    """
+    return get_runtime().iterate(stream_agent_flow(prompt, context_video_id=context_video_id))
+
+def format_video_results(final_store):
+    """
+    Formats a multi-video run: the combined summary, then each video's result.
+    """
+    sections = []
+    if final_store.get("summary"):
+        sections.append(f"**Combined Summary:**\n{final_store.get('summary')}")
+    for result in final_store.get("video_results"):
+        if result["status"] == "ok":
+            sections.append(f"**Video {result['video_id']}:**\n{result['insights'] or result['summary']}")
+        else:
+            sections.append(f"**Video {result['video_id']}:** failed: {result['error']}")
+    return "\n\n".join(sections)
+
+def format_output(final_store):
+    """
+    Picks the result to show from the final store, in order of preference.
+    """
+    if final_store.get("video_results"):
+        return format_video_results(final_store)
+    if final_store.get("math_solution"):
+        return f"**Math Solution:**\n{final_store.get('math_solution')}"
+    elif final_store.get("insights"):
+        return f"**Insights:**\n{final_store.get('insights')}"
+    elif final_store.get("generated_code"):
+        return f"**Generated Code:**\n```python\n{final_store.get('generated_code')}\n```" # Format code
+    elif final_store.get("summary"):
+        return f"**Summary:**\n{final_store.get('summary')}"
+    elif final_store.get("final_result"):
+        return final_store.get("final_result")
+    elif final_store.get("error"):
+        return f"**An error occurred:** {final_store.get('error')}"
+    else:
+        return "I couldn't generate a specific output for that request."
+
 # Initialize chat history in Streamlit's session state
 if "messages" not in st.session_state:
     st.session_state.messages = []
+# The last video summarized in this session: follow-up questions are answered
+# from the parts of its transcript most relevant to them.
+if "active_video" not in st.session_state:
+    st.session_state.active_video = None
+
+if st.session_state.active_video:
+    with st.sidebar:
+        st.caption(f"Follow-up questions refer to video {st.session_state.active_video}.")
+        if st.button("Forget this video"):
+            st.session_state.active_video = None
+            st.rerun()
 
 # Display chat messages from history on app rerun
 for message in st.session_state.messages:
@@ -34,38 +93,27 @@ if prompt := st.chat_input("What do you want to research?"):
 
     # Display assistant response
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            # Run the agent flow asynchronously
-            # Streamlit runs synchronously, so we need to use asyncio.run
-            # for the agent's async functions.
-            # For complex async in Streamlit, consider `nest_asyncio.apply()`
-            # if you encounter RuntimeError: Event loop is already running.
-            # For this simple case, asyncio.run should be fine.
-            try:
-                final_store = asyncio.run(run_agent_flow(prompt))
-
-                # Extract results from the store
-                output_content = ""
-                if final_store.get("math_solution"):
-                    output_content = f"**Math Solution:**\n{final_store.get('math_solution')}"
-                elif final_store.get("insights"):
-                    output_content = f"**Insights:**\n{final_store.get('insights')}"
-                elif final_store.get("generated_code"):
-                    output_content = f"**Generated Code:**\n```python\n{final_store.get('generated_code')}\n```" # Format code
-                elif final_store.get("summary"):
-                    output_content = f"**Summary:**\n{final_store.get('summary')}"
-                elif final_store.get("final_result"):
-                    output_content = final_store.get("final_result")
-                elif final_store.get("error"):
-                    output_content = f"**An error occurred:** {final_store.get('error')}"
-                else:
-                    output_content = "I couldn't generate a specific output for that request."
+        placeholder = st.empty()
+        try:
+            # Render tokens as the nodes generate them, one section per node.
+            streamed = {}
+            final_store = None
+            with st.spinner("Thinking..."):
+                for event in iterate_events(prompt, st.session_state.active_video):
+                    if event["type"] == "delta":
+                        streamed[event["node"]] = streamed.get(event["node"], "") + event["text"]
+                        placeholder.markdown("\n\n".join(f"**{node}:**\n{text}" for node, text in streamed.items()))
+                    elif event["type"] == "done":
+                        final_store = event["store"]
 
-                st.markdown(output_content)
-                st.session_state.messages.append({"role": "assistant", "content": output_content})
+            if final_store.get("input_type") == "youtube_url" and final_store.get("summary"):
+                st.session_state.active_video = extract_video_id(prompt.strip())
 
-            except Exception as e:
-                error_message = f"An unexpected error occurred during processing: {e}"
-                st.error(error_message)
-                st.session_state.messages.append({"role": "assistant", "content": error_message})
+            output_content = format_output(final_store)
+            placeholder.markdown(output_content)
+            st.session_state.messages.append({"role": "assistant", "content": output_content})
 
+        except Exception as e:
+            error_message = f"An unexpected error occurred during processing: {e}"
+            st.error(error_message)
+            st.session_state.messages.append({"role": "assistant", "content": error_message})
@@ -0,0 +1,142 @@
+# checkpoint.py
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from disk_cache import DiskCache
+from graph import DEADLINE_EXCEEDED
+
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "1") not in ("0", "false", "False")
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.getenv("LLM_CACHE_DIR", ".cache"))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(24 * 3600)))
+CHECKPOINT_MAX_BYTES = int(os.getenv("CHECKPOINT_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Store keys never restored from a checkpoint: they describe the interrupted run's
+# failure, and the resumed run sets them again.
+NOT_RESTORED = {"error", "final_result"}
+
+
+def completed(action):
+    """
+    True if a node that returned 'action' finished its work, so a resumed run can
+    reuse its results. Failures ("error", "..._failed", "..._timeout"), partial
+    results and nodes stopped by the deadline are run again.
+    """
+    return (
+        isinstance(action, str)
+        and action not in ("error", "partial", DEADLINE_EXCEEDED)
+        and not action.endswith(("_failed", "_timeout"))
+    )
+
+
+def checkpoint_key(user_input, context_video_id=None):
+    """
+    Identifies a request across retries: its input with whitespace collapsed, and
+    the video a follow-up prompt refers to, if any.
+    """
+    normalized = " ".join(user_input.split())
+    if context_video_id:
+        normalized = f"{context_video_id}\n{normalized}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """
+    Durable progress of flow runs, keyed by request (see checkpoint_key): the
+    action every finished node returned and the store values written by the nodes
+    that completed. Flow saves a checkpoint each time nodes finish, so a retry of
+    a failed request resumes at the nodes that did not complete. Each value is
+    stored on its own and written once per run, so a large one (a transcript) is
+    not rewritten with every checkpoint.
+    Saves are serialized and written by one background thread, in order, so they
+    never block the event loop.
+    """
+    version = 2
+
+    def __init__(self, path, ttl=CHECKPOINT_TTL, max_bytes=CHECKPOINT_MAX_BYTES):
+        self.cache = DiskCache(path, max_bytes=max_bytes, default_ttl=ttl)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = {}  # key -> Future of the last write queued for it
+        self._lock = threading.Lock()
+
+    def _record_key(self, key):
+        return f"{key}@v{self.version}"
+
+    def _value_key(self, key, name):
+        return f"{key}@v{self.version}/{name}"
+
+    def _submit(self, key, write):
+        with self._lock:
+            future = self._writer.submit(write)
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def load(self, key):
+        """
+        Returns (outcomes, values) saved for 'key', or None. Blocking.
+        Writes still queued for 'key' are waited for first.
+        """
+        with self._lock:
+            pending = self._pending.get(key)
+        if pending is not None:
+            pending.result()  # Writes run in order: the last one queued is the last to finish.
+        raw = self.cache.get(self._record_key(key))
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        values = {}
+        for name in record["values"]:
+            value = self.cache.get(self._value_key(key, name))
+            if value is None:
+                return None  # Evicted: the checkpoint is incomplete.
+            values[name] = json.loads(value)
+        return record["outcomes"], values
+
+    def save(self, key, outcomes, values, names):
+        """
+        Queues a checkpoint write: 'outcomes', the 'values' not saved before in this
+        run, and the 'names' of all values the checkpoint has (including earlier
+        ones). None of them may be changed afterwards.
+        """
+        def write():
+            for name, value in values.items():
+                payload = json.dumps(value, ensure_ascii=False, default=str)
+                self.cache.set(self._value_key(key, name), payload.encode("utf-8"))
+            record = json.dumps({"outcomes": outcomes, "values": names}, ensure_ascii=False, default=str)
+            self.cache.set(self._record_key(key), record.encode("utf-8"))
+        return self._submit(key, write)
+
+    def discard(self, key):
+        def delete():
+            raw = self.cache.get(self._record_key(key))
+            if raw is not None:
+                for name in json.loads(raw)["values"]:
+                    self.cache.delete(self._value_key(key, name))
+                self.cache.delete(self._record_key(key))
+        return self._submit(key, delete)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    """
+    Returns the process-wide CheckpointStore, or None when checkpointing is disabled.
+    """
+    global _store
+    if not CHECKPOINT_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(os.path.join(CHECKPOINT_DIR, "checkpoints.sqlite3"))
+        return _store
@@ -0,0 +1,6 @@
+# config.py
+from dotenv import load_dotenv
+
+# Loads the .env file once per process. Modules that read settings with os.getenv
+# at import time import this module first instead of calling load_dotenv themselves.
+load_dotenv()
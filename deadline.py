@@ -0,0 +1,71 @@
+# deadline.py
+import asyncio
+import contextvars
+import os
+import time
+
+import config
+
+# Seconds a request may take by default (see main.run_agent_flow); 0 disables the deadline.
+FLOW_TIMEOUT = float(os.getenv("FLOW_TIMEOUT", "120"))
+# Nodes still running this many seconds after the deadline are cancelled (see
+# Graph.run). Until then they can finish with what they have: their outbound
+# calls already fail with DeadlineExceeded at the deadline itself.
+FLOW_DEADLINE_GRACE = float(os.getenv("FLOW_DEADLINE_GRACE", "1"))
+
+# Deadline (time.monotonic() value) of the run the current task works for, or None.
+# Set by Flow.run; tasks started by the run inherit it.
+current_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """
+    Raised by bounded() when the current run's deadline passes.
+    """
+    def __init__(self, message="Request deadline exceeded."):
+        super().__init__(message)
+
+
+def deadline_after(timeout):
+    """
+    Returns the deadline 'timeout' seconds from now, or None for no deadline
+    (timeout None or not positive).
+    """
+    if timeout is None or timeout <= 0:
+        return None
+    return time.monotonic() + timeout
+
+
+def remaining(deadline=None):
+    """
+    Seconds left until 'deadline' (by default the current run's), at least 0,
+    or None if there is no deadline.
+    """
+    deadline = current_deadline.get() if deadline is None else deadline
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired(deadline=None):
+    left = remaining(deadline)
+    return left is not None and left <= 0
+
+
+async def bounded(awaitable):
+    """
+    Awaits 'awaitable' (a coroutine), cancelling it and raising DeadlineExceeded
+    if the current run's deadline passes first.
+    """
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        awaitable.close()
+        raise DeadlineExceeded()
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        if not expired():
+            raise  # A timeout of the awaited work itself.
+        raise DeadlineExceeded() from None
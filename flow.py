@@ -1,104 +1,321 @@
 import asyncio
-from nodes.input_detector import InputDetector
-from nodes.youtube import YouTubeFetcher
-from nodes.summarizer import Summarizer
-from nodes.intent import IntentClassifier
-from nodes.codegen import CodeGenerator
-from nodes.insights import InsightsNode
-from nodes.math_solver import MathSolver # NEW: Import MathSolver
+import os
+import time
+import config
+import deadline
+import metrics
+from checkpoint import NOT_RESTORED, checkpoint_key, completed, get_checkpoint_store
+from graph import DEADLINE_EXCEEDED, Graph
+from nodes import LazyNode
+
+# When enabled, YouTube insights are extracted from the raw transcript in parallel
+# with summarization instead of waiting for the summary.
+PARALLEL_INSIGHTS = os.getenv("FLOW_PARALLEL_INSIGHTS", "0") in ("1", "true", "True")
+# How text prompts are routed: "two_step" (IntentClassifier, then the intent's node)
+# or "single_call" (SingleCallRouter classifies and answers in one completion,
+# falling back to two steps when it cannot).
+ROUTING_MODE = os.getenv("ROUTING_MODE", "two_step")
+
+# Store keys callers read after a run. Everything else the nodes write (e.g. the
+# transcript) is released as soon as no remaining node needs it.
+OUTPUT_KEYS = (
+    "input_type",
+    "user_intent",
+    "intent_source",
+    "summary",
+    "insights",
+    "generated_code",
+    "math_solution",
+    "math_solver_reasoning",
+    "math_solver_source",
+    "video_results",
+    "final_result",
+    "partial",
+    "error",
+)
 
 class Flow:
     """
     Orchestrates the execution of different nodes based on the detected input type.
+    The routing is declared as a Graph (see graph.py): edges are keyed on the actions
+    nodes return, and nodes whose inputs are ready run concurrently.
+    A Flow is meant to be long-lived: nodes hold no per-request state, so one
+    instance can serve many concurrent runs, each with its own SharedStore.
+    Nodes are LazyNodes (see nodes/__init__.py): each is constructed, and its
+    dependencies imported, the first time a run's route reaches it.
     """
-    def __init__(self):
-        self.input_detector = InputDetector()
-        self.youtube_fetcher = YouTubeFetcher()
-        self.summarizer = Summarizer()
-        self.intent_classifier = IntentClassifier()
-        self.code_generator = CodeGenerator()
-        self.insights_node = InsightsNode()
-        self.math_solver = MathSolver() # NEW: Initialize MathSolver
+    def __init__(self, parallel_insights=PARALLEL_INSIGHTS, routing_mode=ROUTING_MODE):
+        if routing_mode not in ("two_step", "single_call"):
+            raise ValueError(f"Unknown routing mode: {routing_mode}")
+        self.input_detector = LazyNode("InputDetector")
+        self.youtube_fetcher = LazyNode("YouTubeFetcher")
+        self.summarizer = LazyNode("Summarizer")
+        self.intent_classifier = LazyNode("IntentClassifier")
+        self.code_generator = LazyNode("CodeGenerator")
+        self.insights_node = LazyNode("InsightsNode")
+        self.math_solver = LazyNode("MathSolver")
+        self.multi_video_processor = LazyNode(
+            "MultiVideoProcessor", self.youtube_fetcher, self.summarizer, self.insights_node
+        )
+        self.similar_prompts = LazyNode("SimilarPromptLookup")
+        self.context_retriever = LazyNode("ContextRetriever")
+        self.single_call_router = LazyNode("SingleCallRouter", self.intent_classifier)
+        self.parallel_insights = parallel_insights
+        self.routing_mode = routing_mode
+        self.graph = self._build_graph()
+
+    def _build_graph(self):
+        graph = Graph()
+        graph.add_node(self.input_detector, start=True)
+        for node in (self.youtube_fetcher, self.summarizer, self.intent_classifier,
+                     self.code_generator, self.insights_node, self.math_solver,
+                     self.multi_video_processor, self.similar_prompts, self.context_retriever):
+            graph.add_node(node)
+
+        # YouTube URL: fetch transcript -> summarize -> insights
+        graph.add_edge("InputDetector", "YouTubeFetcher", on="youtube_url")
+        if self.parallel_insights:
+            # Insights from the raw transcript don't need to wait for the summary,
+            # so both run side by side right after the fetch.
+            graph.add_node(LazyNode("Summarizer", name="TranscriptSummarizer"))
+            graph.add_node(LazyNode("InsightsNode", name="TranscriptInsights", source_keys=("transcript",)))
+            graph.add_edge("YouTubeFetcher", "TranscriptSummarizer", on="success")
+            graph.add_edge("YouTubeFetcher", "TranscriptInsights", on="success")
+        else:
+            graph.add_edge("YouTubeFetcher", "Summarizer", on="success")
+
+        # Several videos / playlists: each runs fetch -> summarize -> insights, then a combined summary
+        graph.add_edge("InputDetector", "MultiVideoProcessor", on="youtube_batch")
+
+        # Text prompt: answer from a similar earlier prompt if there is one,
+        # else classify intent, then route to the matching node.
+        # Follow-ups about the session's video first retrieve the relevant transcript
+        # chunks; their answers depend on the video, so they skip the similar-prompt cache.
+        graph.add_edge("InputDetector", "ContextRetriever", on="text_prompt")
+        graph.add_edge("ContextRetriever", "SimilarPromptLookup", on="none")
+        graph.add_edge("ContextRetriever", "IntentClassifier", on="retrieved")
+        routers = ["IntentClassifier"]
+        if self.routing_mode == "single_call":
+            # One completion both classifies and answers; IntentClassifier is the fallback.
+            graph.add_node(self.single_call_router)
+            graph.add_edge("SimilarPromptLookup", "SingleCallRouter", on="miss")
+            graph.add_edge("SingleCallRouter", "IntentClassifier", on="fallback")
+            routers.append("SingleCallRouter")
+        else:
+            graph.add_edge("SimilarPromptLookup", "IntentClassifier", on="miss")
+        for router in routers:
+            graph.add_edge(router, "Summarizer", on="summarize")
+            graph.add_edge(router, "CodeGenerator", on="code_generation")
+            graph.add_edge(router, "InsightsNode", on=("insights", "general_query"))
+            graph.add_edge(router, "MathSolver", on="math_query")
+        # Summaries (of text prompts, and of transcripts unless insights run in parallel) get insights
+        graph.add_edge("Summarizer", "InsightsNode", on="success")
+
+        graph.validate()
+        return graph
 
     async def run(self, store):
         """
         Runs the main orchestration logic.
+        Records a per-request trace of node spans in 'trace' (see metrics.py).
+        Progress is checkpointed after every node (see checkpoint.py): if an earlier
+        run of the same input failed part-way, this run restores the results of
+        the nodes that completed and only runs the rest. Runs with 'use_cache'
+        set to False start from scratch.
+        A 'deadline' in the store (see deadline.py) bounds the run: outbound calls
+        fail once it passes, and nodes still running shortly after are cancelled.
+        What finished by then is kept, with 'partial' set and 'final_result'
+        saying so; a retry resumes from the checkpoint.
+        Returns a dict of node name -> action for every node that ran.
         """
         print("Starting flow execution...")
+        started = time.perf_counter()
+        run_deadline = store.get("deadline")
+        token = deadline.current_deadline.set(run_deadline)
+        try:
+            metrics.start_trace(store)
+            checkpoints = get_checkpoint_store()
+            key = checkpoint_key(store.get("input") or "", store.get("context_video_id"))
+            done = None
+            saved = set()  # Names of the values the checkpoint already has.
+            if checkpoints is not None and store.get("use_cache") is not False:
+                done = await self._restore_checkpoint(checkpoints, key, store, saved)
+            outcomes = await self.graph.run(
+                store,
+                keep=OUTPUT_KEYS,
+                done=done,
+                on_progress=(lambda outcomes: self._save_checkpoint(checkpoints, key, store, outcomes, saved))
+                if checkpoints is not None else None,
+                deadline=run_deadline,
+                grace=deadline.FLOW_DEADLINE_GRACE,
+            )
+            if checkpoints is not None and all(completed(action) for action in outcomes.values()):
+                checkpoints.discard(key)  # Nothing left to resume.
+            partial = self._deadline_exceeded(store, outcomes)
+            self._set_final_result(store, outcomes)
+            if partial:
+                store.set("final_result", "Partial result, the request deadline passed. " + store.get("final_result"))
+            if outcomes.get("SimilarPromptLookup") == "miss":
+                self.similar_prompts.remember(store)
+            metrics.finish_trace(store, self._route(store, outcomes), started)
+        finally:
+            deadline.current_deadline.reset(token)
+        print("Flow execution finished.")
+        return outcomes
+
+    def _deadline_exceeded(self, store, outcomes):
+        """
+        True if the run's deadline passed before all of its nodes completed. Then
+        marks the store as 'partial' and records the deadline as the error, unless
+        a node already set one.
+        """
+        run_deadline = store.get("deadline")
+        if run_deadline is None or not deadline.expired(run_deadline):
+            return False
+        if all(completed(action) for action in outcomes.values()):
+            return False
+        store.set("partial", True)
+        if not store.get("error"):
+            store.set("error", str(deadline.DeadlineExceeded()))
+        stopped = [name for name, action in outcomes.items() if action == DEADLINE_EXCEEDED]
+        print(f"Flow: Deadline exceeded; returning partial results (stopped: {', '.join(stopped) or 'none'}).")
+        metrics.registry.inc("flow_deadline_exceeded_total")
+        return True
+
+    async def _restore_checkpoint(self, checkpoints, key, store, saved):
+        """
+        Loads the checkpoint of an earlier run of this request into 'store', adding
+        the names of its values to 'saved'.
+        Returns the outcomes of its completed nodes, or None if there is none.
+        """
+        checkpoint = await asyncio.to_thread(checkpoints.load, key)
+        if checkpoint is None:
+            return None
+        outcomes, values = checkpoint
+        done = {name: action for name, action in outcomes.items() if completed(action)}
+        if not done:
+            return None
+        for name, value in values.items():
+            store.set(name, value)
+        saved.update(values)
+        print(f"Resuming from checkpoint: skipping {', '.join(done)}.")
+        metrics.registry.inc("flow_resumed_total")
+        metrics.registry.inc("flow_resumed_nodes_total", len(done))
+        return done
+
+    def _save_checkpoint(self, checkpoints, key, store, outcomes, saved):
+        """
+        Queues a checkpoint with the outcomes so far and the values written by
+        completed nodes that are not 'saved' yet (then adds them to 'saved').
+        """
+        keys = set()
+        for name, action in outcomes.items():
+            if completed(action):
+                keys.update(self.graph.nodes[name].writes)
+        values = {}
+        for name in keys - NOT_RESTORED - saved:
+            value = store.get(name)
+            if value is not None:
+                values[name] = value
+        saved.update(values)
+        checkpoints.save(key, dict(outcomes), values, sorted(saved))
 
-        # Step 1: Detect input type
-        print("Running InputDetector...")
-        input_type = await self.input_detector.run(store)
-        print(f"InputDetector finished. Detected type: {input_type}")
+    def _route(self, store, outcomes):
+        """
+        Names the path a run took, e.g. "youtube_url" or "text_prompt:math_query".
+        """
+        input_type = outcomes.get("InputDetector") or "none"
+        if input_type == "text_prompt":
+            if outcomes.get("SimilarPromptLookup") == "hit":
+                return f"{input_type}:similar_prompt"
+            return f"{input_type}:{store.get('user_intent') or 'unclassified'}"
+        return input_type
+
+    async def stream(self, store):
+        """
+        Runs the flow like run(), yielding {"type": "delta", "node": ..., "text": ...}
+        events while the LLM nodes generate their output.
+        """
+        queue = asyncio.Queue()
+        store.set("stream", lambda node, text: queue.put_nowait({"type": "delta", "node": node, "text": text}))
+        task = asyncio.ensure_future(self.run(store))
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            task.result()  # Re-raise anything the run failed with.
+        finally:
+            task.cancel()
+            store.set("stream", None)
+
+    def _set_final_result(self, store, outcomes):
+        """
+        Sets 'final_result' to a status message describing which steps succeeded.
+        """
+        input_type = outcomes.get("InputDetector")
 
-        # Step 2: Orchestrate based on input type
         if input_type == "youtube_url":
-            print("Flow: Handling YouTube URL...")
-            fetch_status = await self.youtube_fetcher.run(store)
-            if fetch_status == "success":
-                print("YouTubeFetcher finished. Attempting summarization...")
-                summarize_status = await self.summarizer.run(store)
-                if summarize_status == "success":
-                    print("Summarizer finished. Attempting insights generation...")
-                    insights_status = await self.insights_node.run(store)
-                    if insights_status == "success":
-                        store.set("final_result", "YouTube transcript fetched, summarized, and insights generated successfully.")
-                    else:
-                        store.set("final_result", f"YouTube transcript fetched and summarized, but insights generation failed: {store.get('error')}")
-                else:
-                    store.set("final_result", f"YouTube transcript fetched, but summarization failed: {store.get('error')}")
-            else:
+            summarize_status = outcomes.get("TranscriptSummarizer") or outcomes.get("Summarizer")
+            insights_status = outcomes.get("TranscriptInsights") or outcomes.get("InsightsNode")
+            if outcomes.get("YouTubeFetcher") != "success":
                 store.set("final_result", f"Failed to fetch YouTube transcript: {store.get('error')}")
+            elif summarize_status != "success":
+                store.set("final_result", f"YouTube transcript fetched, but summarization failed: {store.get('error')}")
+            elif insights_status == "success":
+                store.set("final_result", "YouTube transcript fetched, summarized, and insights generated successfully.")
+            else:
+                store.set("final_result", f"YouTube transcript fetched and summarized, but insights generation failed: {store.get('error')}")
+
+        elif input_type == "youtube_batch":
+            results = store.get("video_results") or []
+            failed = [r["video_id"] for r in results if r["status"] != "ok"]
+            status = outcomes.get("MultiVideoProcessor")
+            if status in ("success", "partial"):
+                message = f"Processed {len(results)} YouTube videos: {len(results) - len(failed)} summarized"
+                store.set("final_result", message + (f", failed: {', '.join(failed)}." if failed else "."))
+            else:
+                store.set("final_result", f"Processing the YouTube videos failed: {store.get('error')}")
 
         elif input_type == "text_prompt":
-            print("Flow: Handling Text Prompt...")
-            intent_return_status = await self.intent_classifier.run(store)
             user_intent = store.get("user_intent")
-            print(f"IntentClassifier finished. Detected intent: {user_intent}")
-
-            if intent_return_status != "error":
-                if user_intent == "summarize":
-                    print("Flow: Intent is 'summarize'. Running Summarizer...")
-                    summarize_status = await self.summarizer.run(store)
-                    if summarize_status == "success":
-                        store.set("final_result", "Text prompt summarized successfully.")
-                        insights_status = await self.insights_node.run(store)
-                        if insights_status == "success":
-                            store.set("final_result", store.get("final_result") + " Insights also generated.")
-                        else:
-                            store.set("final_result", store.get("final_result") + f" But insights generation failed: {store.get('error')}")
-                    else:
-                        store.set("final_result", f"Text prompt summarization failed: {store.get('error')}")
-
-                elif user_intent == "code_generation":
-                    print("Flow: Intent is 'code_generation'. Running CodeGenerator...")
-                    codegen_status = await self.code_generator.run(store)
-                    if codegen_status == "success":
-                        store.set("final_result", "Code generated successfully.")
-                    else:
-                        store.set("final_result", f"Code generation failed: {store.get('error')}")
-
-                elif user_intent == "insights" or user_intent == "general_query":
-                    print(f"Flow: Intent is '{user_intent}'. Running InsightsNode...")
-                    insights_status = await self.insights_node.run(store)
-                    if insights_status == "success":
-                        store.set("final_result", "Insights generated successfully.")
-                    else:
-                        store.set("final_result", f"Insights generation failed: {store.get('error')}")
-
-                elif user_intent == "math_query": # Handle math_query intent
-                    print("Flow: Intent is 'math_query'. Running MathSolver node.")
-                    math_solver_status = await self.math_solver.run(store) # Call MathSolver
-                    if math_solver_status == "success":
-                        store.set("final_result", "Math query solved successfully.")
-                    else:
-                        store.set("final_result", f"Math query failed: {store.get('error')}")
-
-                else: # Unknown intent from classifier
-                    print("Flow: Unknown intent detected. Defaulting to general response.")
-                    store.set("final_result", "Unknown intent. Please rephrase your request.")
-            else: # Intent classification itself failed
+            # In single_call mode SingleCallRouter may have answered in place of the intent's node.
+            answered = outcomes.get("SingleCallRouter") == "answered"
+            succeeded = lambda node: answered or outcomes.get(node) == "success"
+            if outcomes.get("SimilarPromptLookup") == "hit":
+                store.set("final_result", f"Answered from the results of a similar earlier request ({user_intent}).")
+            elif user_intent is None or "error" in (outcomes.get("IntentClassifier"), outcomes.get("SingleCallRouter")):
+                # Classification failed, or never ran (e.g. the deadline passed first).
                 store.set("final_result", f"Intent classification failed: {store.get('error')}")
+            elif user_intent == "summarize":
+                if succeeded("Summarizer"):
+                    store.set("final_result", "Text prompt summarized successfully.")
+                    if outcomes.get("InsightsNode") == "success" or (answered and store.get("insights")):
+                        store.set("final_result", store.get("final_result") + " Insights also generated.")
+                    elif not answered:
+                        store.set("final_result", store.get("final_result") + f" But insights generation failed: {store.get('error')}")
+                else:
+                    store.set("final_result", f"Text prompt summarization failed: {store.get('error')}")
+            elif user_intent == "code_generation":
+                if succeeded("CodeGenerator"):
+                    store.set("final_result", "Code generated successfully.")
+                else:
+                    store.set("final_result", f"Code generation failed: {store.get('error')}")
+            elif user_intent == "insights" or user_intent == "general_query":
+                if succeeded("InsightsNode"):
+                    store.set("final_result", "Insights generated successfully.")
+                else:
+                    store.set("final_result", f"Insights generation failed: {store.get('error')}")
+            elif user_intent == "math_query":
+                if succeeded("MathSolver"):
+                    store.set("final_result", "Math query solved successfully.")
+                else:
+                    store.set("final_result", f"Math query failed: {store.get('error')}")
+            else: # Unknown intent from classifier
+                print("Flow: Unknown intent detected. Defaulting to general response.")
+                store.set("final_result", "Unknown intent. Please rephrase your request.")
 
         elif input_type == "error":
             print("Flow: An error occurred during input detection.")
@@ -106,5 +323,3 @@ class Flow:
         else:
             print(f"Flow: Unknown input type: {input_type}")
             store.set("final_result", "Unknown input type detected.")
-
-        print("Flow execution finished.")
@@ -0,0 +1,204 @@
+# graph.py
+import asyncio
+import time
+
+# Keys any node may write, concurrently or not (last writer wins).
+SHARED_WRITE_KEYS = {"error"}
+# Outcome of nodes that were cancelled, or never started, because the run's deadline passed.
+DEADLINE_EXCEEDED = "deadline_exceeded"
+
+
+class Graph:
+    """
+    Declarative DAG of nodes.
+    Edges are keyed on the action strings returned by BaseNode.run: an edge
+    src -> dst fires when src returns one of the edge's actions. A node runs once
+    all of its predecessors have either finished or been skipped and at least one
+    incoming edge fired; if none fired it is skipped. Ready nodes run concurrently,
+    so independent branches only cost the length of the critical path.
+    Nodes declare the SharedStore keys they read and write ('reads' / 'writes').
+    """
+    def __init__(self):
+        self.nodes = {}
+        self.start = None
+        self.predecessors = {}
+        self.successors = {}
+
+    def add_node(self, node, start=False):
+        if node.name in self.nodes:
+            raise ValueError(f"Duplicate node name in graph: {node.name}")
+        self.nodes[node.name] = node
+        self.predecessors[node.name] = set()
+        self.successors[node.name] = []
+        if start:
+            self.start = node.name
+        return node
+
+    def add_edge(self, src, dst, on):
+        """
+        Adds an edge from node 'src' to node 'dst' that fires when 'src' returns
+        the action 'on' (a string or a tuple of strings).
+        """
+        for name in (src, dst):
+            if name not in self.nodes:
+                raise ValueError(f"Unknown node in edge {src} -> {dst}: {name}")
+        actions = (on,) if isinstance(on, str) else tuple(on)
+        self.predecessors[dst].add(src)
+        self.successors[src].append((frozenset(actions), dst))
+
+    def ancestors(self, name):
+        seen, stack = set(), list(self.predecessors[name])
+        while stack:
+            current = stack.pop()
+            if current not in seen:
+                seen.add(current)
+                stack.extend(self.predecessors[current])
+        return seen
+
+    def descendants(self, name):
+        seen, stack = set(), [dst for _, dst in self.successors[name]]
+        while stack:
+            current = stack.pop()
+            if current not in seen:
+                seen.add(current)
+                stack.extend(dst for _, dst in self.successors[current])
+        return seen
+
+    def _actions_towards(self, src, target):
+        # Actions of 'src' whose edges lead (directly or not) to 'target'.
+        actions = set()
+        for edge_actions, dst in self.successors[src]:
+            if dst == target or target in self.descendants(dst):
+                actions |= edge_actions
+        return actions
+
+    def mutually_exclusive(self, a, b):
+        """
+        True if 'a' and 'b' can never both run: some common ancestor reaches
+        them only through disjoint sets of actions.
+        """
+        for src in self.ancestors(a) & self.ancestors(b):
+            if not self._actions_towards(src, a) & self._actions_towards(src, b):
+                return True
+        return False
+
+    def validate(self):
+        """
+        Checks that the graph has a start node, has no cycles, and that no two nodes
+        that may run concurrently in the same run write the same store key.
+        """
+        if self.start is None:
+            raise ValueError("Graph has no start node.")
+        ancestors = {name: self.ancestors(name) for name in self.nodes}
+        for name, above in ancestors.items():
+            if name in above:
+                raise ValueError(f"Graph has a cycle through node: {name}")
+        names = list(self.nodes)
+        for i, a in enumerate(names):
+            for b in names[i + 1:]:
+                if a in ancestors[b] or b in ancestors[a] or self.mutually_exclusive(a, b):
+                    continue
+                shared = (set(self.nodes[a].writes) & set(self.nodes[b].writes)) - SHARED_WRITE_KEYS
+                if shared:
+                    raise ValueError(f"Nodes {a} and {b} may run concurrently but both write: {sorted(shared)}")
+
+    def release_unneeded(self, store, remaining, keep):
+        """
+        Releases the store keys written by graph nodes that none of the 'remaining'
+        nodes reads, except those in 'keep' (the caller's outputs).
+        """
+        needed = set(keep)
+        for name in remaining:
+            needed.update(self.nodes[name].reads)
+        for node in self.nodes.values():
+            for key in node.writes:
+                if key not in needed:
+                    store.release(key)
+
+    async def run(self, store, keep=None, done=None, on_progress=None, deadline=None, grace=0.0):
+        """
+        Runs the graph on 'store' from the start node.
+        If 'keep' (a collection of store keys) is given, intermediate values are
+        released as soon as no node that may still run reads them; only the keys in
+        'keep' and those no node writes (such as the input) survive the run.
+        'done' maps nodes that already ran (in an earlier, interrupted run whose
+        results are in 'store') to the actions they returned: they are not run
+        again, but their edges fire as if they had just finished.
+        'on_progress(outcomes)' is called whenever nodes finish, before any
+        intermediate values are released.
+        'deadline' (a time.monotonic() value) bounds the run: no node starts after
+        it, and nodes still running 'grace' seconds after it are cancelled. Both get
+        the outcome DEADLINE_EXCEEDED; the results of the nodes that finished stay.
+        Returns a dict of node name -> returned action for every node that ran
+        (including those in 'done').
+        """
+        outcomes = {}
+        skipped = set()
+        fired = set()
+        pending = set(self.nodes)
+        running = {}
+
+        for name, action in (done or {}).items():
+            if name not in self.nodes:
+                continue  # The graph has changed since; the node no longer exists.
+            outcomes[name] = action
+            pending.discard(name)
+            for actions, dst in self.successors[name]:
+                if action in actions:
+                    fired.add(dst)
+
+        def schedule_ready():
+            progress = True
+            while progress:
+                progress = False
+                for name in list(pending):
+                    if not all(p in outcomes or p in skipped for p in self.predecessors[name]):
+                        continue
+                    pending.discard(name)
+                    progress = True
+                    if name != self.start and name not in fired:
+                        skipped.add(name)
+                    elif deadline is not None and time.monotonic() >= deadline:
+                        print(f"Not running {name}: deadline exceeded.")
+                        outcomes[name] = DEADLINE_EXCEEDED
+                    else:
+                        print(f"Running {name}...")
+                        running[asyncio.ensure_future(self.nodes[name].run(store))] = name
+
+        try:
+            schedule_ready()
+            while running:
+                timeout = None if deadline is None else max(0.0, deadline + grace - time.monotonic())
+                finished, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not finished:
+                    await self._cancel_overdue(running, outcomes, grace)
+                for task in finished:
+                    name = running.pop(task)
+                    action = task.result()
+                    outcomes[name] = action
+                    print(f"{name} finished. Action: {action}")
+                    for actions, dst in self.successors[name]:
+                        if action in actions:
+                            fired.add(dst)
+                if on_progress is not None:
+                    on_progress(outcomes)
+                schedule_ready()
+                if keep is not None:
+                    self.release_unneeded(store, pending | set(running.values()), keep)
+        finally:
+            for task in running:
+                task.cancel()
+        return outcomes
+
+    async def _cancel_overdue(self, running, outcomes, grace):
+        """
+        Cancels the nodes still running past the deadline and waits (up to 'grace'
+        seconds) for them to unwind, so they release what they hold.
+        """
+        for task, name in running.items():
+            print(f"Cancelling {name}: deadline exceeded.")
+            task.cancel()
+            outcomes[name] = DEADLINE_EXCEEDED
+        if grace > 0:
+            await asyncio.wait(running, timeout=grace)
+        running.clear()
@@ -0,0 +1,140 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import config
+from disk_cache import DiskCache
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False")
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache")
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Request options that change how a completion is delivered, not what it contains.
+TRANSPORT_PARAMS = {"stream", "stream_options", "timeout", "extra_headers", "extra_query", "extra_body"}
+
+
+def _parse_completion(payload):
+    from openai.types.chat import ChatCompletion  # Imported on first use (slow to import).
+    return ChatCompletion.model_validate_json(payload)
+
+
+class LLMCache:
+    """
+    Content-addressed cache for chat completions.
+    Keys are a hash of the model, messages and sampling parameters. Lookups go to an
+    in-memory LRU tier first and then to an on-disk tier that survives restarts.
+    """
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL,
+                 disk_path=None, disk_max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (expires_at, completion JSON)
+        self._lock = threading.Lock()
+        self.disk = DiskCache(disk_path, max_bytes=disk_max_bytes, default_ttl=ttl) if disk_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(params):
+        """
+        Builds the cache key for a chat.completions.create call from its keyword arguments.
+        """
+        relevant = {k: v for k, v in params.items() if k not in TRANSPORT_PARAMS}
+        encoded = json.dumps(relevant, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    async def get(self, key):
+        """
+        Returns the cached ChatCompletion for 'key', or None on a miss.
+        """
+        payload = self._get_memory(key)
+        if payload is not None:
+            with self._lock:
+                self.memory_hits += 1
+            return _parse_completion(payload)
+
+        if self.disk is not None:
+            raw = await asyncio.to_thread(self.disk.get, key)
+            if raw is not None:
+                payload = raw.decode("utf-8")
+                self._set_memory(key, payload)
+                with self._lock:
+                    self.disk_hits += 1
+                return _parse_completion(payload)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def set(self, key, completion):
+        payload = completion.model_dump_json()
+        self._set_memory(key, payload)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, payload.encode("utf-8"))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """
+        Returns hit/miss counters and tier sizes as a plain dict.
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self.disk.total_bytes() if self.disk is not None else 0,
+            }
+
+    def _get_memory(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return payload
+
+    def _set_memory(self, key, payload):
+        with self._lock:
+            self._memory[key] = (time.time() + self.ttl, payload)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Returns the process-wide LLMCache, or None when caching is disabled.
+    """
+    global _cache
+    if not CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(disk_path=os.path.join(CACHE_DIR, "llm_cache.sqlite3"))
+        return _cache
@@ -0,0 +1,200 @@
+# llm_client.py
+import asyncio
+import os
+import threading
+import time
+import weakref
+
+import config
+import deadline
+import metrics
+from llm_cache import LLMCache, get_llm_cache
+from rate_limiter import MAX_RETRIES, estimate_request_tokens, get_rate_limiter
+from singleflight import SingleFlight
+
+# Connection pool settings. Every LLM node shares one pool per event loop,
+# so TLS handshakes and client setup are paid once per process, not per request.
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+
+# httpx connection pools are bound to the event loop that opened them,
+# so one client is kept per running loop (normally there is only one).
+_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+# Identical in-flight completion requests (same cache key) share one API call.
+llm_flight = SingleFlight("llm")
+
+
+def has_api_key():
+    return bool(os.getenv("OPENAI_API_KEY"))
+
+
+def _build_client():
+    # openai (and httpx) are imported on first use: together they take most of
+    # the process's import time, and many runs never reach an LLM node.
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+    # Retries are done by _request_completion, which coordinates them across requests.
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=0)
+
+
+def get_client():
+    """
+    Returns the shared AsyncOpenAI client for the running event loop,
+    creating it (and its connection pool) on first use.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _clients.get(loop)
+        if client is None:
+            client = _build_client()
+            _clients[loop] = client
+        return client
+
+
+async def close_client():
+    """
+    Closes the shared client of the running event loop, if one was created.
+    Call this on shutdown of long-lived processes.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _clients.pop(loop, None)
+    if client is not None:
+        await client.close()
+
+
+async def chat_completion(use_cache=True, on_delta=None, **params):
+    """
+    Sends a chat completion request through the shared client.
+    Accepts the same keyword arguments as client.chat.completions.create.
+    Identical requests are answered from the LLM cache unless use_cache is False,
+    and (unless use_cache is False) share a single API call while one is in flight.
+    If 'on_delta' is given, the completion is streamed and on_delta(text) is called
+    for every content delta as it arrives; the assembled ChatCompletion is still returned.
+    Raises deadline.DeadlineExceeded if the calling run's deadline passes first.
+    """
+    started = time.perf_counter()
+    cache = get_llm_cache() if use_cache else None
+    key = LLMCache.make_key(params) if use_cache else None
+    if cache is not None:
+        cached = await cache.get(key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached.choices[0].message.content or "")
+            metrics.record_llm_call(params.get("model"), cached, time.perf_counter() - started, "hit")
+            return cached
+
+    if key is None:
+        completion = await deadline.bounded(_request_completion(on_delta, params))
+        cache_result = "bypass"
+    else:
+        made_request = False
+
+        async def request():
+            nonlocal made_request
+            made_request = True
+            return await _request_completion(on_delta, params)
+
+        # The shared request runs without any caller's deadline; each caller bounds its own wait.
+        completion = await deadline.bounded(llm_flight.do(key, request))
+        if not made_request:
+            # Another caller made the request; this one only sees the finished text.
+            if on_delta is not None:
+                on_delta(completion.choices[0].message.content or "")
+            metrics.record_llm_call(params.get("model"), completion, time.perf_counter() - started, "shared")
+            return completion
+        cache_result = "miss" if cache is not None else "bypass"
+    metrics.record_llm_call(params.get("model"), completion, time.perf_counter() - started, cache_result)
+
+    if cache is not None:
+        await cache.set(key, completion)
+    return completion
+
+
+async def _request_completion(on_delta, params):
+    """
+    Sends the request once the model's rate limiter allows it (see rate_limiter.py),
+    retrying rate-limited and transient failures with backoff. Streams are only
+    retried while no delta has been delivered yet. A retry that could not start
+    before the run's deadline is not attempted.
+    """
+    model = params.get("model")
+    limiter = get_rate_limiter(model)
+    estimate = estimate_request_tokens(params)
+    attempt = 0
+    while True:
+        async with limiter.slot(estimate):
+            try:
+                if on_delta is None:
+                    raw = await get_client().chat.completions.with_raw_response.create(**params)
+                else:
+                    raw = await get_client().chat.completions.with_raw_response.create(
+                        stream=True, stream_options={"include_usage": True}, **params
+                    )
+            except Exception as e:
+                delay = limiter.retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                failure = e
+            else:
+                limiter.observe_headers(raw.headers)
+                if on_delta is None:
+                    completion = raw.parse()
+                else:
+                    completion = await _collect_stream(raw.parse(), on_delta, model)
+                limiter.on_success(estimate, completion.usage)
+                return completion
+        left = deadline.remaining()
+        if left is not None and delay >= left:
+            raise failure
+        attempt += 1
+        print(f"LLM request to {model} failed ({failure}); retry {attempt}/{MAX_RETRIES} in {delay:.1f}s.")
+        await asyncio.sleep(delay)
+
+
+async def _collect_stream(stream, on_delta, model):
+    """
+    Consumes a streamed chat completion, passing content deltas to on_delta, and
+    returns the assembled ChatCompletion (including usage when the API reports it).
+    """
+    from openai.types.chat import ChatCompletion
+
+    parts = []
+    fields = {"id": "", "created": 0, "model": model or ""}
+    finish_reason = None
+    usage = None
+    async for chunk in stream:
+        fields = {"id": chunk.id, "created": chunk.created, "model": chunk.model}
+        if chunk.usage is not None:
+            usage = chunk.usage.model_dump()
+        for choice in chunk.choices:
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                on_delta(choice.delta.content)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+
+    return ChatCompletion.model_validate({
+        **fields,
+        "object": "chat.completion",
+        "choices": [{
+            "index": 0,
+            "finish_reason": finish_reason or "stop",
+            "message": {"role": "assistant", "content": "".join(parts)},
+        }],
+        "usage": usage,
+    })
@@ -0,0 +1,178 @@
+# local_intent.py
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import config
+
+INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", os.path.join(".cache", "intent_model.json"))
+# Below this confidence the IntentClassifier falls back to the LLM.
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+
+# (intent, pattern, weight). Patterns are matched against the lower-cased prompt.
+RULES = [
+    ("summarize", r"^\s*(please\s+)?(summari[sz]e|give me a summary|tl;?dr)\b", 3.0),
+    ("summarize", r"\bsummar(y|ies|i[sz]e|i[sz]ing)\b", 1.5),
+    # A bounded gap: with ".*" the rule is quadratic in the length of a single-line prompt.
+    ("code_generation", r"\b(write|generate|create|implement|build|code)\b.{0,80}\b(code|function|script|class|program|method|snippet|query|regex)\b", 3.0),
+    ("code_generation", r"\b(python|javascript|typescript|java|c\+\+|c#|golang|rust|sql|bash|html|css)\b", 1.5),
+    ("code_generation", r"```", 2.0),
+    ("math_query", r"\b(differentiate|derivative|integrate|integral|antiderivative|solve for|simplify|factori[sz]e)\b", 3.0),
+    ("math_query", r"\bd/d[a-z]\b", 3.0),
+    ("math_query", r"^[\s\d\.\+\-\*/\^\(\)=x]*\d[\s\d\.\+\-\*/\^\(\)=x]*\??$", 3.0),
+    ("math_query", r"\d\s*[\+\-\*/\^]\s*\d|\b[a-z]\s*\^\s*\d", 1.5),
+    ("insights", r"\b(insights?|key takeaways?|takeaways|lessons learned|key points|actionable)\b", 3.0),
+    ("general_query", r"^\s*(what|who|why|how|when|where|which|tell me|explain|describe)\b", 1.0),
+]
+_COMPILED_RULES = [(intent, re.compile(pattern), weight) for intent, pattern, weight in RULES]
+
+# Probability mass reserved for "no evidence", so a single weak rule match
+# is never enough on its own to skip the LLM.
+RULE_PRIOR = 1.0
+
+# Seed examples so the model is useful before it has learned anything.
+SEED_EXAMPLES = [
+    ("summarize", "summarize the main points of quantum computing for a beginner"),
+    ("summarize", "give me a short summary of this article"),
+    ("summarize", "summarise the following text"),
+    ("code_generation", "write a python function to calculate the fibonacci sequence"),
+    ("code_generation", "generate a javascript function to reverse a string"),
+    ("code_generation", "create a sql query that joins two tables"),
+    ("math_query", "differentiate 12x^3"),
+    ("math_query", "solve for x: 2x + 5 = 15"),
+    ("math_query", "what is the integral of x^2 from 0 to 1"),
+    ("math_query", "what is 25 * 4 + 3"),
+    ("insights", "what are the key insights from this text"),
+    ("insights", "give me the key takeaways and actionable points"),
+    ("general_query", "what are the key challenges in adopting renewable energy"),
+    ("general_query", "tell me something interesting about black holes"),
+    ("general_query", "who invented the telephone"),
+]
+
+
+def tokenize(text):
+    """
+    Lower-cases 'text' and returns word unigrams and bigrams. Numbers are
+    collapsed to '<num>' and arithmetic operators are kept as tokens.
+    """
+    words = re.findall(r"[a-z]+|\d+(?:\.\d+)?|[\^\+\-\*/=]", text.lower())
+    words = ["<num>" if w[0].isdigit() else w for w in words]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class LocalIntentClassifier:
+    """
+    Fast local intent classifier combining keyword/regex rules with a small
+    multinomial Naive Bayes model. The model keeps learning from labels supplied
+    by the LLM and is persisted to disk as JSON.
+    """
+    def __init__(self, intents, model_path=INTENT_MODEL_PATH, save_every=10):
+        self.intents = list(intents)
+        self.model_path = model_path
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self.class_counts = Counter()
+        self.token_counts = {intent: Counter() for intent in self.intents}
+        self.token_totals = Counter()
+        self.vocabulary = set()
+        if not self._load():
+            for intent, text in SEED_EXAMPLES:
+                if intent in self.token_counts:
+                    self._learn(text, intent)
+
+    def classify(self, text):
+        """
+        Returns (intent, confidence) for 'text', confidence in [0, 1].
+        """
+        rule_dist = self._rule_distribution(text)
+        with self._lock:
+            nb_dist = self._nb_distribution(text)
+        if nb_dist is None:
+            combined = rule_dist
+        else:
+            combined = {intent: 0.5 * rule_dist[intent] + 0.5 * nb_dist[intent] for intent in self.intents}
+        intent = max(combined, key=combined.get)
+        return intent, combined[intent]
+
+    def learn(self, text, intent):
+        """
+        Adds a labelled example (e.g. an LLM classification) to the model.
+        """
+        if intent not in self.token_counts:
+            return
+        with self._lock:
+            self._learn(text, intent)
+            self._unsaved += 1
+            should_save = self._unsaved >= self.save_every
+        if should_save:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            data = {
+                "class_counts": dict(self.class_counts),
+                "token_counts": {intent: dict(counts) for intent, counts in self.token_counts.items()},
+            }
+            self._unsaved = 0
+        directory = os.path.dirname(self.model_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.model_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.model_path)
+
+    def _load(self):
+        try:
+            with open(self.model_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for intent, count in data.get("class_counts", {}).items():
+            if intent in self.token_counts:
+                self.class_counts[intent] = count
+        for intent, counts in data.get("token_counts", {}).items():
+            if intent in self.token_counts:
+                self.token_counts[intent].update(counts)
+                self.token_totals[intent] += sum(counts.values())
+                self.vocabulary.update(counts)
+        return bool(self.class_counts)
+
+    def _learn(self, text, intent):
+        tokens = tokenize(text)
+        self.class_counts[intent] += 1
+        self.token_counts[intent].update(tokens)
+        self.token_totals[intent] += len(tokens)
+        self.vocabulary.update(tokens)
+
+    def _rule_distribution(self, text):
+        lowered = text.lower()
+        scores = {intent: 0.0 for intent in self.intents}
+        for intent, pattern, weight in _COMPILED_RULES:
+            if intent in scores and pattern.search(lowered):
+                scores[intent] += weight
+        total = sum(scores.values()) + RULE_PRIOR
+        return {intent: score / total for intent, score in scores.items()}
+
+    def _nb_distribution(self, text):
+        total_examples = sum(self.class_counts.values())
+        tokens = [t for t in tokenize(text) if t in self.vocabulary]
+        if not total_examples or not tokens:
+            return None
+        vocab_size = len(self.vocabulary)
+        log_probs = {}
+        for intent in self.intents:
+            counts = self.token_counts[intent]
+            denominator = self.token_totals[intent] + vocab_size
+            log_prob = math.log((self.class_counts[intent] + 1) / (total_examples + len(self.intents)))
+            for token in tokens:
+                log_prob += math.log((counts[token] + 1) / denominator)
+            log_probs[intent] = log_prob
+        peak = max(log_probs.values())
+        exp = {intent: math.exp(lp - peak) for intent, lp in log_probs.items()}
+        norm = sum(exp.values())
+        return {intent: value / norm for intent, value in exp.items()}
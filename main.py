@@ -1,35 +1,132 @@
+import argparse
 import asyncio
 import os
-from dotenv import load_dotenv
+from typing import TYPE_CHECKING, Optional
+import config
 
+import deadline
+import metrics
+from deadline import FLOW_TIMEOUT, deadline_after
 from shared_store import SharedStore
-from flow import Flow
+from nodes.input_detector import extract_playlist_ids, extract_video_id, extract_video_ids
+from singleflight import SingleFlight
 
-# Load environment variables from .env file at the very beginning
-load_dotenv()
+if TYPE_CHECKING:
+    from flow import Flow
 
-async def run_agent_flow(user_input: str) -> SharedStore:
+# A single Flow (and with it every node and the pooled LLM client) is built
+# once per process and shared by all requests. Flow.run keeps all per-request
+# state in the SharedStore it is given, so concurrent runs are safe.
+_flow = None
+
+# Concurrent runs of the same request (same video, or same prompt text) share one flow.
+flow_flight = SingleFlight("flow")
+
+def get_flow() -> "Flow":
+    """
+    Returns the process-wide Flow instance, creating it on first use.
+    The flow module (and with it the nodes) is only imported here, so importing
+    main stays cheap for processes that never run a flow, e.g. --help.
+    """
+    global _flow
+    if _flow is None:
+        from flow import Flow
+        _flow = Flow()
+    return _flow
+
+def request_key(user_input: str, use_cache: bool = True, context_video_id: Optional[str] = None):
+    """
+    Normalized identity of a request: the video and playlist IDs for YouTube
+    URLs (told apart the way InputDetector does), otherwise the prompt with
+    whitespace collapsed (and the video it follows up on, if any).
+    """
+    video_ids = extract_video_ids(user_input)
+    playlist_ids = extract_playlist_ids(user_input)
+    if len(video_ids) > 1 or playlist_ids:
+        return "youtube:" + ",".join(video_ids), "list:" + ",".join(playlist_ids), use_cache
+    video_id = extract_video_id(user_input.strip())
+    if video_id:
+        return f"youtube:{video_id}", use_cache
+    return "text:" + " ".join(user_input.split()), use_cache, context_video_id
+
+async def run_agent_flow(user_input: str, use_cache: bool = True,
+                         context_video_id: Optional[str] = None,
+                         timeout: Optional[float] = None) -> SharedStore:
     """
     Runs the AI Research Assistant Agent's flow with a given user input.
+    Set use_cache=False to bypass the LLM completion cache for this request.
+    Pass the ID of a video fetched earlier in the session as context_video_id to
+    answer a text prompt from the most relevant parts of its transcript.
+    The run takes at most about 'timeout' seconds (default FLOW_TIMEOUT; 0 for no
+    limit): work still unfinished then is cancelled, and the store holds what
+    finished, with 'partial' set (see Flow.run).
+    Identical requests arriving while one is running wait for it instead of running
+    the flow again; each caller still gets its own SharedStore, and waits no longer
+    than its own timeout. If the run it joined stopped at an earlier deadline,
+    the caller resumes it (from its checkpoint) with the time it has left.
     Returns the populated SharedStore object.
     """
     # Check if OPENAI_API_KEY is loaded (optional, but good for early debugging)
     if not os.getenv("OPENAI_API_KEY"):
         print("Warning: OPENAI_API_KEY is not set. Some nodes may not function correctly.")
 
+    run_deadline = deadline_after(FLOW_TIMEOUT if timeout is None else timeout)
+    try:
+        # A run started by another caller has that caller's deadline: wait only until ours.
+        store = await flow_flight.do(
+            request_key(user_input, use_cache, context_video_id),
+            lambda: _run_flow(user_input, use_cache, context_video_id, run_deadline),
+            copy=SharedStore.copy,
+            timeout=deadline.remaining(run_deadline),
+        )
+    except asyncio.TimeoutError:
+        print(f"Deadline exceeded while waiting for a shared run of: {user_input}")
+        metrics.registry.inc("flow_deadline_exceeded_total")
+        store = _new_store(user_input, use_cache, context_video_id, run_deadline)
+        store.set("partial", True)
+        store.set("error", str(deadline.DeadlineExceeded()))
+        store.set("final_result", "Partial result, the request deadline passed while waiting on an identical request in progress.")
+        return store
+    if store.get("partial") and not deadline.expired(run_deadline):
+        # Joined a run with an earlier deadline: finish it with the time we have left.
+        store = await _run_flow(user_input, use_cache, context_video_id, run_deadline)
+    store.set("input", user_input)  # A shared run may have been started with another spelling.
+    return store
+
+def _new_store(user_input: str, use_cache: bool, context_video_id: Optional[str],
+               run_deadline: Optional[float]) -> SharedStore:
     store = SharedStore()
     store.set("input", user_input)
+    store.set("use_cache", use_cache)
+    store.set("context_video_id", context_video_id)
+    store.set("deadline", run_deadline)
+    return store
 
-    flow = Flow()
-    await flow.run(store)
+async def _run_flow(user_input: str, use_cache: bool, context_video_id: Optional[str],
+                    run_deadline: Optional[float]) -> SharedStore:
+    store = _new_store(user_input, use_cache, context_video_id, run_deadline)
+    await get_flow().run(store)
     return store
 
-async def main():
+async def stream_agent_flow(user_input: str, use_cache: bool = True, context_video_id: Optional[str] = None,
+                            timeout: Optional[float] = None):
+    """
+    Streaming variant of run_agent_flow: an async iterator of
+    {"type": "delta", "node": ..., "text": ...} events as tokens arrive, ending with
+    a {"type": "done", "store": SharedStore} event once the flow has finished.
+    """
+    store = _new_store(user_input, use_cache, context_video_id,
+                       deadline_after(FLOW_TIMEOUT if timeout is None else timeout))
+    async for event in get_flow().stream(store):
+        yield event
+    yield {"type": "done", "store": store}
+
+async def main(timeout: Optional[float] = None):
     """
     Main entry point for the AI Research Assistant Agent when run directly.
     """
     user_input = input("Enter prompt or URL: ")
-    final_store = await run_agent_flow(user_input)
+    final_store = await run_agent_flow(user_input, timeout=timeout)
 
     print("\n🧠 Final Output:")
     # --- DEBUGGING LINE START ---
@@ -37,7 +134,13 @@ async def main():
     # --- DEBUGGING LINE END ---
 
     # Check for specific results and print them in order of preference
-    if final_store.get("math_solution"):
+    if final_store.get("video_results"):
+        print("Combined Summary:")
+        print(final_store.get("summary") or "(none)")
+        for result in final_store.get("video_results"):
+            print(f"\nVideo {result['video_id']}: {result['status']}")
+            print(result["insights"] or result["summary"] or result["error"])
+    elif final_store.get("math_solution"):
         print("Math Solution:")
         print(final_store.get("math_solution"))
     elif final_store.get("insights"):
@@ -57,6 +160,30 @@ async def main():
         print("No specific final result, summary, code, insights, or math solution generated yet.")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="AI Research Assistant Agent")
+    parser.add_argument("--batch", metavar="INPUT", help="Run every prompt/URL in a JSONL or text file instead of asking interactively.")
+    parser.add_argument("--output", metavar="OUTPUT", help="JSONL file results are appended to in batch mode (default: <INPUT>.results.jsonl).")
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of flows running at once in batch mode.")
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess items that already succeeded in the output file (their new records are appended).")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM completion cache.")
+    parser.add_argument("--timeout", type=float, help="Seconds each request may take; unfinished work is cancelled and partial results returned (default: FLOW_TIMEOUT, 0 for no limit).")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    if args.batch:
+        from batch import run_batch
+        asyncio.run(run_batch(
+            run_agent_flow,
+            args.batch,
+            args.output or os.path.splitext(args.batch)[0] + ".results.jsonl",
+            concurrency=args.concurrency,
+            use_cache=not args.no_cache,
+            resume=not args.no_resume,
+            timeout=args.timeout,
+        ))
+    else:
+        asyncio.run(main(args.timeout))
 
@@ -0,0 +1,85 @@
+# map_reduce.py
+import asyncio
+import os
+
+import config
+
+from text_processing import chunk_text, count_tokens, estimate_tokens
+
+# Texts longer than this are processed in chunked (map-reduce) mode.
+CHUNKED_THRESHOLD_TOKENS = int(os.getenv("CHUNKED_THRESHOLD_TOKENS", "3000"))
+# Token budget of a single map chunk or reduce group.
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "2000"))
+# Maximum number of concurrent LLM calls per map-reduce run.
+MAP_REDUCE_MAX_PARALLEL = int(os.getenv("MAP_REDUCE_MAX_PARALLEL", "4"))
+
+
+def needs_chunking(text):
+    return count_tokens(text) > CHUNKED_THRESHOLD_TOKENS
+
+
+def group_by_budget(parts, max_tokens):
+    """
+    Packs consecutive parts into groups of at most 'max_tokens' tokens.
+    Every group holds at least two parts (when available) so each reduce level
+    strictly shrinks the list.
+    """
+    groups, current, current_tokens = [], [], 0
+    for part in parts:
+        part_tokens = estimate_tokens(part)
+        if len(current) >= 2 and current_tokens + part_tokens > max_tokens:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(part)
+        current_tokens += part_tokens
+    if current:
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        else:
+            groups.append(current)
+    return groups
+
+
+async def map_reduce(text, map_fn, reduce_fn, chunk_tokens=CHUNK_TOKENS,
+                     max_parallel=MAP_REDUCE_MAX_PARALLEL, final_reduce_fn=None):
+    """
+    Splits 'text' into chunks, runs 'map_fn(chunk)' on all of them concurrently and
+    then reduces the partial results hierarchically with 'reduce_fn(list_of_parts)'
+    until one result is left. At most 'max_parallel' calls run at the same time.
+    'final_reduce_fn', if given, replaces reduce_fn for the last (single-group) reduce,
+    e.g. to stream only the final result.
+    Latency grows with the depth of the reduce tree rather than the length of the text.
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def bounded(fn, arg):
+        async with semaphore:
+            return await fn(arg)
+
+    chunks = chunk_text(text, chunk_tokens)
+    print(f"Map-reduce: processing {len(chunks)} chunks (max {max_parallel} in parallel)...")
+    parts = await asyncio.gather(*(bounded(map_fn, chunk) for chunk in chunks))
+    return await reduce_parts(parts, reduce_fn, chunk_tokens, max_parallel, final_reduce_fn)
+
+
+async def reduce_parts(parts, reduce_fn, chunk_tokens=CHUNK_TOKENS,
+                       max_parallel=MAP_REDUCE_MAX_PARALLEL, final_reduce_fn=None):
+    """
+    The reduce half of map_reduce: merges 'parts' with 'reduce_fn(list_of_parts)'
+    in groups of at most 'chunk_tokens' tokens, level by level, until one result is
+    left (a single part is returned as is).
+    """
+    semaphore = asyncio.Semaphore(max_parallel)
+
+    async def bounded(fn, arg):
+        async with semaphore:
+            return await fn(arg)
+
+    level = 0
+    while len(parts) > 1:
+        level += 1
+        groups = group_by_budget(parts, chunk_tokens)
+        print(f"Map-reduce: reduce level {level}, {len(parts)} parts into {len(groups)} groups...")
+        fn = final_reduce_fn if final_reduce_fn is not None and len(groups) == 1 else reduce_fn
+        parts = await asyncio.gather(*(bounded(fn, group) for group in groups))
+    return parts[0]
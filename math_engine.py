@@ -0,0 +1,268 @@
+# math_engine.py
+import json
+import math
+import re
+import sys
+
+# sympy is imported on first use (see _load_sympy): it takes about half a second,
+# and most runs never solve math locally.
+sympy = None
+parse_expr = None
+_sympy_loaded = False
+
+MAX_QUERY_LENGTH = 200
+# Refuse expressions whose powers would take seconds (or forever) to expand, such as
+# 2^1000000000 or 9^99^99: no number may have more digits than MAX_RESULT_DIGITS, and
+# symbolic bases may be raised to at most MAX_SYMBOLIC_EXPONENT. Checked on the
+# unevaluated parse tree, before sympy computes anything (see _check_size).
+MAX_RESULT_DIGITS = 4000  # Below Python's 4300-digit limit on int -> str conversion.
+MAX_SYMBOLIC_EXPONENT = 1000
+# Equations with more solutions than this (e.g. x^1000 - 1 = 0) are left to the LLM.
+MAX_SOLUTIONS = 20
+
+_TRANSFORMATIONS = None
+
+# Names the parser may see. Anything else (besides single-letter variables) is rejected,
+# so arbitrary user text never reaches sympy's eval-based parser.
+_FUNCTIONS = {
+    "sin", "cos", "tan", "cot", "sec", "csc", "asin", "acos", "atan",
+    "sinh", "cosh", "tanh", "exp", "log", "ln", "sqrt", "abs", "pi",
+}
+_ALLOWED_CHARS = re.compile(r"^[0-9a-z+\-*/^().,= ]+$")
+_WORD = re.compile(r"[a-z]+")
+
+_DERIVATIVE = re.compile(
+    r"^(?:differentiate|(?:what is |find )?the derivative of|derivative of|d/d([a-z]))\s*(?:of\s+)?"
+    r"(.+?)(?:\s+(?:with respect to|wrt)\s+([a-z]))?$"
+)
+_INTEGRAL = re.compile(
+    r"^(?:integrate|(?:what is |find )?the (?:integral|antiderivative) of|integral of|antiderivative of)\s+"
+    r"(.+?)(?:\s*d([a-z]))?(?:\s+from\s+(\S+)\s+to\s+(\S+))?$"
+)
+_SOLVE = re.compile(r"^solve(?:\s+for\s+([a-z]))?\s*:?\s*(.+)$")
+_EVALUATE = re.compile(r"^(?:what is|what's|calculate|compute|evaluate|simplify)\s+(.+)$")
+
+
+def _load_sympy():
+    """
+    Imports sympy once. Returns False if it is not installed.
+    """
+    global sympy, parse_expr, _TRANSFORMATIONS, _sympy_loaded
+    if not _sympy_loaded:
+        try:
+            import sympy as sympy_module
+            from sympy.parsing.sympy_parser import (
+                convert_xor,
+                implicit_multiplication_application,
+                parse_expr as sympy_parse_expr,
+                standard_transformations,
+            )
+        except ImportError:  # The local engine is optional; MathSolver falls back to the LLM.
+            sympy_module = None
+        else:
+            parse_expr = sympy_parse_expr
+            _TRANSFORMATIONS = standard_transformations + (implicit_multiplication_application, convert_xor)
+        sympy = sympy_module
+        _sympy_loaded = True
+    return sympy is not None
+
+
+def is_available():
+    return _load_sympy()
+
+
+def _check_size(expr):
+    """
+    Returns log10 of an upper bound of |expr| for a numeric (unevaluated) expression,
+    or None for a symbolic one. Raises ValueError if evaluating it would produce a
+    number with more than MAX_RESULT_DIGITS digits, or a symbolic power above
+    MAX_SYMBOLIC_EXPONENT, at any level (e.g. the exponent of a power tower).
+    """
+    if expr.is_Integer:
+        return math.log10(abs(int(expr))) if expr else 0.0
+    if expr.is_Rational:
+        return max(math.log10(abs(int(expr.p))), math.log10(int(expr.q)))
+    if expr.is_Float:
+        return math.log10(abs(float(expr))) if expr else 0.0
+    if expr.is_NumberSymbol:
+        return 1.0
+    if expr.is_Symbol:
+        return None
+    sizes = [_check_size(arg) for arg in expr.args]
+    if expr.is_Pow:
+        base, exponent = sizes
+        if exponent is None:
+            return None  # e.g. 2^x stays symbolic.
+        if exponent > math.log10(MAX_RESULT_DIGITS):
+            raise ValueError("Exponent too large.")
+        exponent_value = 10 ** exponent
+        if base is None:
+            if exponent_value > MAX_SYMBOLIC_EXPONENT:
+                raise ValueError("Exponent too large.")
+            return None
+        digits = exponent_value * abs(base)
+        if digits > MAX_RESULT_DIGITS:
+            raise ValueError("Result too large.")
+        return digits
+    if any(size is None for size in sizes):
+        return None
+    if expr.is_Add:
+        return max(sizes) + math.log10(len(sizes))
+    if expr.is_Mul:
+        return sum(sizes)
+    return None  # Functions such as sin(5): their arguments are checked, their value is not tracked.
+
+
+def _parse(text):
+    text = text.strip().rstrip(".").replace("×", "*").replace("÷", "/")
+    if not text or not _ALLOWED_CHARS.match(text) or "__" in text:
+        raise ValueError(f"Unsupported expression: {text}")
+    for word in _WORD.findall(text):
+        # Besides known functions, only short runs of single-letter variables ("xy").
+        if word not in _FUNCTIONS and len(word) > 2:
+            raise ValueError(f"Unsupported name in expression: {word}")
+    text = re.sub(r"\bln\b", "log", text)
+    options = {"local_dict": {"e": sympy.E}, "transformations": _TRANSFORMATIONS}
+    _check_size(parse_expr(text, evaluate=False, **options))
+    return parse_expr(text, evaluate=True, **options)
+
+
+def _fmt(expr):
+    return str(expr).replace("**", "^")
+
+
+def _variable(expr, name=None):
+    if name:
+        return sympy.Symbol(name)
+    symbols = sorted(expr.free_symbols, key=lambda s: s.name)
+    if not symbols:
+        return sympy.Symbol("x")
+    for preferred in ("x", "t", "y"):
+        for symbol in symbols:
+            if symbol.name == preferred:
+                return symbol
+    return symbols[0]
+
+
+def _differentiate(match):
+    var_name = match.group(1) or match.group(3)
+    expr = _parse(match.group(2))
+    var = _variable(expr, var_name)
+    result = sympy.diff(expr, var)
+    steps = [f"Function: f({var}) = {_fmt(expr)}"]
+    if isinstance(expr, sympy.Add):
+        steps.append("Differentiate term by term:")
+        for term in expr.args:
+            steps.append(f"  d/d{var} [{_fmt(term)}] = {_fmt(sympy.diff(term, var))}")
+    steps.append(f"Result: f'({var}) = {_fmt(result)}")
+    return f"d/d{var} [{_fmt(expr)}] = {_fmt(result)}", steps
+
+
+def _integrate(match):
+    expr = _parse(match.group(1))
+    var = _variable(expr, match.group(2))
+    antiderivative = sympy.integrate(expr, var)
+    if antiderivative.has(sympy.Integral):
+        raise ValueError("No closed-form antiderivative found.")
+    steps = [f"Integrand: {_fmt(expr)}"]
+    if isinstance(expr, sympy.Add):
+        steps.append("Integrate term by term:")
+        for term in expr.args:
+            steps.append(f"  ∫ {_fmt(term)} d{var} = {_fmt(sympy.integrate(term, var))}")
+    steps.append(f"Antiderivative: F({var}) = {_fmt(antiderivative)} + C")
+
+    if match.group(3) is None:
+        return f"∫ {_fmt(expr)} d{var} = {_fmt(antiderivative)} + C", steps
+
+    lower, upper = _parse(match.group(3)), _parse(match.group(4))
+    upper_value = antiderivative.subs(var, upper)
+    lower_value = antiderivative.subs(var, lower)
+    result = sympy.simplify(upper_value - lower_value)
+    steps.append(f"Evaluate: F({_fmt(upper)}) - F({_fmt(lower)}) = {_fmt(upper_value)} - {_fmt(lower_value)} = {_fmt(result)}")
+    answer = _fmt(result)
+    if not result.is_Integer and result.is_number:
+        answer += f" ≈ {float(result):.6g}"
+    return f"∫ from {_fmt(lower)} to {_fmt(upper)} of {_fmt(expr)} d{var} = {answer}", steps
+
+
+def _solve(var_name, equation_text):
+    sides = equation_text.split("=")
+    if len(sides) != 2:
+        raise ValueError("Expected a single equation.")
+    left, right = _parse(sides[0]), _parse(sides[1])
+    expr = sympy.expand(left - right)
+    var = _variable(expr, var_name)
+    solutions = sympy.solve(sympy.Eq(left, right), var)
+    steps = [
+        f"Equation: {_fmt(left)} = {_fmt(right)}",
+        f"Move all terms to one side: {_fmt(expr)} = 0",
+    ]
+    if len(solutions) > MAX_SOLUTIONS:
+        raise ValueError("Too many solutions.")
+    if not solutions:
+        steps.append("No solutions found.")
+        return f"No solution for {var}.", steps
+    rendered = ", ".join(f"{var} = {_fmt(s)}" for s in solutions)
+    steps.append(f"Solve for {var}: {rendered}")
+    return rendered, steps
+
+
+def _evaluate(expression_text):
+    shown = expression_text.strip()
+    expr = _parse(expression_text)
+    if expr.free_symbols:
+        result = sympy.simplify(expr)
+        return f"{shown} = {_fmt(result)}", [f"Simplify: {shown} = {_fmt(result)}"]
+    result = sympy.nsimplify(expr) if expr.is_Float else expr
+    answer = _fmt(result)
+    if not result.is_Integer and result.is_number:
+        answer += f" ≈ {float(result):.6g}"
+    return f"{shown} = {answer}", [f"Evaluate: {shown} = {answer}"]
+
+
+def solve_locally(query):
+    """
+    Tries to answer a math query without the LLM.
+    Handles arithmetic, differentiation, (definite) integration of elementary
+    functions and single-variable equations. Returns (solution, steps) where
+    'steps' is a list of strings, or None if the query is not understood.
+    """
+    if not query or len(query) > MAX_QUERY_LENGTH or not _load_sympy():
+        return None
+    text = query.strip().lower().rstrip("?").strip()
+    try:
+        match = _DERIVATIVE.match(text)
+        if match:
+            return _differentiate(match)
+        match = _INTEGRAL.match(text)
+        if match:
+            return _integrate(match)
+        match = _SOLVE.match(text)
+        if match:
+            return _solve(match.group(1), match.group(2))
+        if "=" in text and _ALLOWED_CHARS.match(text):
+            return _solve(None, text)
+        match = _EVALUATE.match(text)
+        return _evaluate(match.group(1) if match else text)
+    except Exception:
+        # Parse errors, unsupported syntax, no closed form, ...: let the LLM handle it.
+        return None
+
+
+def _serve():
+    """
+    Worker loop of math_workers.MathWorkerPool: writes whether sympy is available,
+    then answers one JSON-encoded query per stdin line with solve_locally's result
+    as one line of JSON.
+    """
+    replies = sys.stdout
+    sys.stdout = sys.stderr  # Keep stray prints out of the replies.
+    replies.write(json.dumps(_load_sympy()) + "\n")
+    replies.flush()
+    for line in sys.stdin:
+        replies.write(json.dumps(solve_locally(json.loads(line))) + "\n")
+        replies.flush()
+
+
+if __name__ == "__main__":
+    _serve()
@@ -0,0 +1,101 @@
+# math_workers.py
+import asyncio
+import json
+import os
+import sys
+import threading
+import weakref
+import config
+
+# Local math engine processes running at once; further queries wait for a free one.
+LOCAL_MATH_WORKERS = int(os.getenv("LOCAL_MATH_WORKERS", "2"))
+# Seconds a new engine process may take to start (it imports sympy).
+LOCAL_MATH_STARTUP_TIMEOUT = float(os.getenv("LOCAL_MATH_STARTUP_TIMEOUT", "15"))
+
+_ENGINE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Longest reply line accepted from a worker.
+_MAX_REPLY_BYTES = 1024 * 1024
+
+# Pools are per event loop (their pipes are loop-bound): loop -> MathWorkerPool
+_pools = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class MathWorkerPool:
+    """
+    Runs math_engine.solve_locally in child processes ("python -m math_engine"), so
+    a query that takes too long can actually be stopped: sympy holds the GIL and
+    cannot be interrupted, so a thread left running stalls the event loop and keeps
+    an executor worker busy. A worker that overruns its timeout, or whose caller is
+    cancelled, is killed; the next query starts a new one. Idle workers are reused.
+    """
+    def __init__(self, size=LOCAL_MATH_WORKERS):
+        self._slots = asyncio.Semaphore(max(1, size))
+        self._idle = []
+        self.available = True  # False once a worker reports that sympy is not installed.
+
+    async def _start(self):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "math_engine",
+            cwd=_ENGINE_DIR,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=_MAX_REPLY_BYTES,
+        )
+        try:
+            # The first line says whether the engine could load sympy.
+            ready = await asyncio.wait_for(process.stdout.readline(), LOCAL_MATH_STARTUP_TIMEOUT)
+        except BaseException:
+            _kill(process)
+            raise
+        if ready.strip() != b"true":
+            _kill(process)
+            if ready:
+                self.available = False
+            return None
+        return process
+
+    async def solve(self, query, timeout):
+        """
+        Returns solve_locally(query) computed by a worker process, or None if the
+        engine is unavailable or cannot answer. Raises asyncio.TimeoutError (after
+        killing the worker) if the answer takes longer than 'timeout' seconds.
+        """
+        if not self.available:
+            return None
+        async with self._slots:
+            process = self._idle.pop() if self._idle else await self._start()
+            if process is None:
+                return None
+            try:
+                process.stdin.write(json.dumps(query).encode("utf-8") + b"\n")
+                line = await asyncio.wait_for(process.stdout.readline(), timeout)
+            except BaseException:
+                _kill(process)
+                raise
+            if not line:  # The worker died.
+                _kill(process)
+                return None
+            self._idle.append(process)
+        result = json.loads(line)
+        return tuple(result) if result is not None else None
+
+
+def _kill(process):
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+def get_math_workers():
+    """
+    Returns the MathWorkerPool of the running event loop, creating it on first use.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        pool = _pools.get(loop)
+        if pool is None:
+            pool = _pools[loop] = MathWorkerPool()
+        return pool
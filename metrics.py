@@ -0,0 +1,212 @@
+# metrics.py
+import contextvars
+import json
+import math
+import threading
+import time
+from collections import deque
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Percentiles are computed over this many most recent observations per series.
+WINDOW_SIZE = 2048
+
+# The span of the node currently running in this task (set by BaseNode.run).
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram (for Prometheus) plus a sliding window of recent
+    observations for p50/p90/p99.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        self.window.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+
+    def percentile(self, q):
+        if not self.window:
+            return None
+        ordered = sorted(self.window)
+        index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+def _label_text(labels):
+    return ",".join(f'{key}="{value}"' for key, value in labels)
+
+
+def _braced(label_text):
+    return f"{{{label_text}}}" if label_text else ""
+
+
+class MetricsRegistry:
+    """
+    Process-wide store of counters and histograms, keyed by metric name and labels.
+    Exportable as a JSON snapshot or in the Prometheus text format.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """
+        Returns all metrics as a JSON-serializable dict.
+        """
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.summary()}
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+        return {"timestamp": time.time(), "histograms": histograms, "counters": counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            seen = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                lines.append(f"{name}{_braced(_label_text(labels))} {value}")
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in seen:
+                    lines.append(f"# TYPE {name} histogram")
+                    seen.add(name)
+                prefix = _label_text(labels)
+                separator = "," if prefix else ""
+                for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f'{name}_bucket{{{prefix}{separator}le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{prefix}{separator}le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{_braced(prefix)} {histogram.sum}")
+                lines.append(f"{name}_count{_braced(prefix)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def start_trace(store):
+    """
+    Attaches a new per-request trace to 'store'. Node spans are appended to it.
+    """
+    trace = {"started_at": time.time(), "spans": []}
+    store.set("trace", trace)
+    return trace
+
+
+def finish_trace(store, route, started):
+    trace = store.get("trace")
+    duration = time.perf_counter() - started
+    if trace is not None:
+        trace["route"] = route
+        trace["duration_s"] = round(duration, 6)
+    registry.observe("flow_duration_seconds", duration, route=route)
+    registry.inc("flow_runs_total", route=route)
+
+
+def start_span(store, node_name):
+    """
+    Creates the span of a node run and appends it to the run's trace. While it is
+    set as 'current_span', LLM calls are attributed to it.
+    """
+    span = {
+        "node": node_name,
+        "started_at": time.time(),
+        "llm_calls": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cache_hits": 0,
+    }
+    trace = store.get("trace")
+    if trace is not None:
+        trace["spans"].append(span)
+    return span
+
+
+def finish_span(span, action, phases):
+    """
+    Records a finished node run. 'phases' maps phase name -> seconds.
+    """
+    span["action"] = action
+    for phase, seconds in phases.items():
+        span[f"{phase}_s"] = round(seconds, 6)
+        registry.observe("node_phase_seconds", seconds, node=span["node"], phase=phase)
+    registry.inc("node_actions_total", node=span["node"], action=str(action))
+
+
+def record_llm_call(model, completion, seconds, cache_result):
+    """
+    Records one chat completion (token usage, latency, cache result "hit", "miss",
+    "bypass" or "shared", i.e. answered by a concurrent identical request) against
+    the current node span, if any, and the process-wide metrics.
+    """
+    cached = cache_result in ("hit", "shared")
+    span = current_span.get()
+    node = span["node"] if span is not None else "none"
+    # Cache hits cost no tokens.
+    usage = getattr(completion, "usage", None) if not cached else None
+    prompt_tokens = usage.prompt_tokens if usage is not None else 0
+    completion_tokens = usage.completion_tokens if usage is not None else 0
+
+    registry.observe("llm_request_seconds", seconds, node=node, model=model, cache=cache_result)
+    registry.inc("llm_cache_lookups_total", node=node, result=cache_result)
+    if not cached:
+        registry.inc("llm_tokens_total", prompt_tokens, node=node, kind="prompt")
+        registry.inc("llm_tokens_total", completion_tokens, node=node, kind="completion")
+
+    if span is not None:
+        span["llm_calls"] += 1
+        span["prompt_tokens"] += prompt_tokens
+        span["completion_tokens"] += completion_tokens
+        span["cache_hits"] += int(cached)
@@ -0,0 +1,79 @@
+# nodes/__init__.py
+import importlib
+import threading
+
+# Node class name -> module that defines it. Modules are imported on first use,
+# so building a Flow does not load every node's dependencies up front.
+NODE_MODULES = {
+    "InputDetector": "nodes.input_detector",
+    "ContextRetriever": "nodes.context_retriever",
+    "SimilarPromptLookup": "nodes.similar_prompts",
+    "YouTubeFetcher": "nodes.youtube",
+    "MultiVideoProcessor": "nodes.multi_video",
+    "Summarizer": "nodes.summarizer",
+    "IntentClassifier": "nodes.intent",
+    "SingleCallRouter": "nodes.single_call",
+    "CodeGenerator": "nodes.codegen",
+    "InsightsNode": "nodes.insights",
+    "MathSolver": "nodes.math_solver",
+}
+
+
+def node_class(class_name):
+    """
+    Returns the node class registered as 'class_name', importing its module.
+    """
+    return getattr(importlib.import_module(NODE_MODULES[class_name]), class_name)
+
+
+class LazyNode:
+    """
+    Stands in for a node in a Graph until a run first reaches it: the node is
+    constructed (with 'args'/'kwargs') on its first run() and reused afterwards.
+    'reads' and 'writes' come from the class, so validating a graph only imports
+    the node modules, which keep their heavy dependencies (openai, sympy,
+    youtube_transcript_api) out of module import time.
+    """
+    def __init__(self, class_name, *args, name=None, **kwargs):
+        self.class_name = class_name
+        self.name = name or class_name
+        self._args = args
+        self._kwargs = kwargs if name is None else {**kwargs, "name": name}
+        self._node = None
+        self._lock = threading.Lock()
+
+    @property
+    def node_class(self):
+        return node_class(self.class_name)
+
+    @property
+    def reads(self):
+        return self._node.reads if self._node is not None else self.node_class.reads
+
+    @property
+    def writes(self):
+        return self._node.writes if self._node is not None else self.node_class.writes
+
+    @property
+    def node(self):
+        """
+        The node itself, constructed on first access.
+        """
+        if self._node is None:
+            with self._lock:
+                if self._node is None:
+                    self._node = self.node_class(*self._args, **self._kwargs)
+        return self._node
+
+    @property
+    def loaded(self):
+        return self._node is not None
+
+    async def run(self, store):
+        return await self.node.run(store)
+
+    def __getattr__(self, attribute):
+        # Anything else (e.g. SimilarPromptLookup.remember) is the node's own.
+        if attribute.startswith("_"):
+            raise AttributeError(attribute)
+        return getattr(self.node, attribute)
@@ -1,5 +1,12 @@
 # nodes/base.py
+import time
+import metrics
+
 class BaseNode:
+    # SharedStore keys this node reads and writes, used by the Flow's graph engine.
+    reads = ()
+    writes = ()
+
     def __init__(self, name):
         self.name = name
 
@@ -13,7 +20,23 @@ class BaseNode:
         pass
 
     async def run(self, store):
-        await self.preprocess(store)
-        action = await self.execute(store)
-        await self.postprocess(store)
+        # Time each phase and attach a span to the run's trace (see metrics.py).
+        span = metrics.start_span(store, self.name)
+        token = metrics.current_span.set(span)
+        try:
+            started = time.perf_counter()
+            await self.preprocess(store)
+            preprocessed = time.perf_counter()
+            action = await self.execute(store)
+            executed = time.perf_counter()
+            await self.postprocess(store)
+            finished = time.perf_counter()
+        finally:
+            metrics.current_span.reset(token)
+        metrics.finish_span(span, action, {
+            "preprocess": preprocessed - started,
+            "execute": executed - preprocessed,
+            "postprocess": finished - executed,
+            "total": finished - started,
+        })
         return action
@@ -1,23 +1,17 @@
-import os
-from dotenv import load_dotenv
-from openai import AsyncOpenAI # Changed to AsyncOpenAI
-from nodes.base import BaseNode
+from nodes.llm_node import LLMNode
 
-# Load environment variables from .env file
-load_dotenv()
-
-class CodeGenerator(BaseNode):
+class CodeGenerator(LLMNode):
     """
     Node to generate code based on a text prompt using the OpenAI API.
     It expects 'processed_input' (the user's code generation request) in the store.
     It sets 'generated_code' in the shared store.
     """
+    reads = ("processed_input",)
+    writes = ("generated_code", "final_result", "error")
+    prompt_budget = 6000
+
     def __init__(self):
         super().__init__("CodeGenerator")
-        # Initialize AsyncOpenAI client for asynchronous calls
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        if not self.client.api_key:
-            print("Error: OPENAI_API_KEY not found in environment variables for CodeGenerator.")
 
     async def execute(self, store):
         """
@@ -38,10 +32,12 @@ class CodeGenerator(BaseNode):
                 "Generate code based on the following request. "
                 "Provide only the code block, without any additional explanations or conversational text. "
                 "If the request is ambiguous, make reasonable assumptions. "
-                "Request:\n\n" + code_prompt
+                "Request:\n\n" + self.fit_budget(code_prompt)
             )
 
-            chat_completion = await self.client.chat.completions.create(
+            chat_completion = await self.chat(
+                store,
+                stream=True,
                 model="gpt-3.5-turbo", # Consider "gpt-4" for more complex code generation
                 messages=[
                     {"role": "system", "content": "You are an expert programmer. Generate clean, functional code."},
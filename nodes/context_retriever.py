@@ -0,0 +1,77 @@
+# nodes/context_retriever.py
+import asyncio
+import metrics
+from nodes.base import BaseNode
+from retrieval_index import RETRIEVAL_TOP_K, get_retrieval_index_store
+from transcript_store import get_transcript_store
+
+# Placed between retrieved chunks that are not adjacent in the transcript.
+GAP = "\n\n[...]\n\n"
+
+
+def with_request(request, context):
+    """
+    Text for the Summarizer and InsightsNode to work on for a follow-up prompt:
+    the retrieved transcript excerpts, preceded by the request they were found for.
+    """
+    return f"Request: {request}\n\nRelevant excerpts from the video transcript:\n\n{context}"
+
+
+class ContextRetriever(BaseNode):
+    """
+    Node for follow-up text prompts about a video fetched earlier in the session
+    ('context_video_id', set by the caller): looks up the 'top_k' transcript chunks
+    most relevant to the prompt in the video's BM25 index (see retrieval_index.py)
+    and sets them, in transcript order, as 'retrieved_context' for the Summarizer
+    and InsightsNode. A video that was never indexed is indexed from the
+    transcript cache first.
+    Returns "retrieved", or "none" when there is no context video or transcript.
+    """
+    reads = ("processed_input", "context_video_id")
+    writes = ("retrieved_context",)
+
+    def __init__(self, name="ContextRetriever", top_k=RETRIEVAL_TOP_K):
+        super().__init__(name)
+        self.top_k = top_k
+
+    async def execute(self, store):
+        video_id = store.get("context_video_id")
+        prompt = store.get("processed_input")
+        indexes = get_retrieval_index_store()
+        if not video_id or not prompt or indexes is None:
+            return "none"
+
+        index = await asyncio.to_thread(self._load_index, indexes, video_id)
+        if index is None or not len(index):
+            print(f"{self.name}: No transcript available for context video {video_id}.")
+            metrics.registry.inc("retrieval_lookups_total", result="no_index")
+            return "none"
+
+        selected = index.search(prompt, self.top_k)
+        if selected:
+            metrics.registry.inc("retrieval_lookups_total", result="match")
+        else:
+            # Nothing specific asked about ("summarize it"): take chunks from across the video.
+            selected = index.spread(self.top_k)
+            metrics.registry.inc("retrieval_lookups_total", result="spread")
+
+        parts, previous = [], None
+        for i in sorted(selected):
+            if previous is not None:
+                parts.append(" " if i == previous + 1 else GAP)
+            parts.append(index.chunks[i])
+            previous = i
+        store.set("retrieved_context", "".join(parts))
+        print(f"{self.name}: Using {len(selected)} of {len(index)} transcript chunks of {video_id}.")
+        return "retrieved"
+
+    @staticmethod
+    def _load_index(indexes, video_id):
+        index = indexes.get(video_id)
+        if index is not None:
+            return index
+        transcripts = get_transcript_store()
+        cached = transcripts.get(video_id) if transcripts is not None else None
+        if cached is None or cached[0] != "success":
+            return None
+        return indexes.build(video_id, cached[1])
@@ -1,11 +1,68 @@
+import asyncio
 import re
+from urllib.parse import parse_qs, urlsplit
 from nodes.base import BaseNode
+from nodes.youtube import fetch_playlist_video_ids
+
+# Regex to detect YouTube video URLs
+YOUTUBE_REGEX = re.compile(
+    r"(?:https?://)?(?:www\.)?"
+    r"(?:youtube\.com|youtu\.be)/"
+    r"(?:watch\?v=|embed/|v/|)([\w-]{11})(?:[?&].*)?"
+)
+
+
+# Any YouTube video or playlist URL anywhere in the input.
+VIDEO_URL_REGEX = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:[^\s#]*?&)?v=|embed/|v/|shorts/|live/)|youtu\.be/)([\w-]{11})"
+)
+YOUTUBE_PAGE_REGEX = re.compile(r"(?:https?://)?(?:www\.|m\.)?youtube\.com/\S*")
+
+
+def extract_video_id(user_input):
+    """
+    Returns the video ID if 'user_input' is a YouTube URL, else None.
+    """
+    match = YOUTUBE_REGEX.match(user_input)
+    return match.group(1) if match else None
+
+
+def extract_video_ids(user_input):
+    """
+    Returns the IDs of all video URLs in 'user_input', in order, without duplicates.
+    """
+    return list(dict.fromkeys(VIDEO_URL_REGEX.findall(user_input)))
+
+
+def extract_playlist_ids(user_input):
+    """
+    Returns the IDs of the playlist URLs in 'user_input', in order, without duplicates:
+    youtube.com/playlist?list=... pages, or other 'list=' links without a video.
+    A watch link shared from a playlist (watch?v=...&list=...) is a single video.
+    """
+    playlist_ids = []
+    for url in YOUTUBE_PAGE_REGEX.findall(user_input):
+        parts = urlsplit(url if "://" in url else "https://" + url)
+        query = parse_qs(parts.query)
+        if "v" in query and parts.path.rstrip("/") != "/playlist":
+            continue
+        for playlist_id in query.get("list", ())[:1]:
+            match = re.match(r"[\w-]+", playlist_id)  # Drops trailing punctuation of the sentence.
+            if match:
+                playlist_ids.append(match.group())
+    return list(dict.fromkeys(playlist_ids))
+
 
 class InputDetector(BaseNode):
         """
         Node to detect the type of user input (e.g., YouTube URL, text prompt).
         It sets 'input_type' and 'processed_input' in the shared store.
+        Inputs with several video URLs or a playlist become "youtube_batch"
+        runs, with all their video IDs in 'video_ids'.
         """
+        reads = ("input",)
+        writes = ("input_type", "processed_input", "video_ids", "error")
+
         def __init__(self):
             super().__init__("InputDetector")
 
@@ -22,16 +79,15 @@ class InputDetector(BaseNode):
                 store.set("input_type", "error")
                 return "error"
 
-            # Regex to detect YouTube video URLs
-            youtube_regex = (
-                r"(?:https?://)?(?:www\.)?"
-                r"(?:youtube\.com|youtu\.be)/"
-                r"(?:watch\?v=|embed/|v/|)([\w-]{11})(?:[?&].*)?"
-            )
-            match = re.match(youtube_regex, user_input)
+            video_ids = extract_video_ids(user_input)
+            playlist_ids = extract_playlist_ids(user_input)
+            if len(video_ids) > 1 or playlist_ids:
+                return await self._detect_batch(store, video_ids, playlist_ids)
 
-            if match:
-                video_id = match.group(1)
+            # Stripped as in main.request_key, so both see the same kind of request.
+            video_id = extract_video_id(user_input.strip())
+
+            if video_id:
                 store.set("input_type", "youtube_url")
                 store.set("processed_input", video_id) # Store just the video ID
                 print(f"Detected YouTube URL: {user_input} (Video ID: {video_id})")
@@ -42,4 +98,26 @@ class InputDetector(BaseNode):
                 print(f"Detected Text Prompt: {user_input}")
                 return "text_prompt"
 
-    
\ No newline at end of file
+    
+
+        async def _detect_batch(self, store, video_ids, playlist_ids):
+            """
+            Collects the videos of a multi-video input, expanding playlists.
+            """
+            for playlist_id in playlist_ids:
+                try:
+                    playlist_videos = await asyncio.to_thread(fetch_playlist_video_ids, playlist_id)
+                except Exception as e:
+                    print(f"Could not expand playlist {playlist_id}: {e}")
+                    continue
+                print(f"Playlist {playlist_id}: {len(playlist_videos)} videos.")
+                video_ids.extend(v for v in playlist_videos if v not in video_ids)
+
+            if not video_ids:
+                store.set("error", "Could not find any videos in the playlist(s).")
+                store.set("input_type", "error")
+                return "error"
+            store.set("input_type", "youtube_batch")
+            store.set("video_ids", video_ids)
+            print(f"Detected {len(video_ids)} YouTube videos: {', '.join(video_ids)}")
+            return "youtube_batch"
@@ -1,67 +1,71 @@
-import os
-from dotenv import load_dotenv
-from openai import AsyncOpenAI # Changed to AsyncOpenAI
-from nodes.base import BaseNode
+from map_reduce import map_reduce, needs_chunking
+from nodes.context_retriever import with_request
+from nodes.llm_node import LLMNode
 
-# Load environment variables from .env file
-load_dotenv()
+INSIGHTS_INSTRUCTION = (
+    "Extract the most important insights, key takeaways, and actionable points "
+    "from the following text. Present them as a bulleted list. "
+)
+# Used in chunked mode: first on each part of a long text, then to merge the partial lists.
+CHUNK_INSTRUCTION = (
+    "The following text is one part of a longer text. "
+    "Extract the most important insights, key takeaways, and actionable points "
+    "from this part. Present them as a bulleted list. "
+)
+REDUCE_INSTRUCTION = (
+    "The following are bulleted lists of insights extracted from consecutive parts of one longer text. "
+    "Merge them into a single bulleted list of the most important insights, key takeaways, "
+    "and actionable points, removing duplicates. "
+)
 
-class InsightsNode(BaseNode):
+class InsightsNode(LLMNode):
     """
     Node to generate insights from text (e.g., a summary or transcript) using the OpenAI API.
-    It expects 'summary' or 'transcript' (in that order of preference) in the store.
+    It expects 'summary', 'transcript', 'retrieved_context' or 'processed_input' (in that order of
+    preference) in the store; retrieved context is sent along with the request it was retrieved for.
+    pass 'source_keys' to use other keys, e.g. only 'transcript' to run alongside the Summarizer.
     It sets 'insights' in the shared store.
     """
-    def __init__(self):
-        super().__init__("InsightsNode")
-        # Initialize AsyncOpenAI client for asynchronous calls
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        if not self.client.api_key:
-            print("Error: OPENAI_API_KEY not found in environment variables for InsightsNode.")
+    reads = ("summary", "transcript", "retrieved_context", "processed_input")
+    writes = ("insights", "final_result", "error")
+
+    def __init__(self, name="InsightsNode", source_keys=("summary", "transcript", "retrieved_context", "processed_input")):
+        super().__init__(name)
+        self.source_keys = tuple(source_keys)
+        self.reads = self.source_keys
 
     async def execute(self, store):
         """
-        Generates insights from the available text ('summary' or 'transcript')
+        Generates insights from the first available text in 'source_keys'
         and stores the result in 'insights'.
         """
-        text_for_insights = store.get("summary")
+        text_for_insights = None
+        for key in self.source_keys:
+            text_for_insights = store.get(key)
+            if text_for_insights:
+                print(f"{self.name}: Using '{key}' as text for insights.")
+                if key == "retrieved_context":
+                    text_for_insights = with_request(store.get("processed_input"), text_for_insights)
+                break
         if not text_for_insights:
-            text_for_insights = store.get("transcript")
-            if not text_for_insights:
-                # If no summary or transcript, try to use the original processed_input
-                text_for_insights = store.get("processed_input")
-                if not text_for_insights:
-                    print("Error: No text found in store for InsightsNode (neither 'summary', 'transcript', nor 'processed_input').")
-                    store.set("error", "No text available for insights generation.")
-                    return "error"
-                else:
-                    print("InsightsNode: Using 'processed_input' as text for insights.")
-            else:
-                print("InsightsNode: Using 'transcript' as text for insights.")
-        else:
-            print("InsightsNode: Using 'summary' as text for insights.")
+            keys = ", ".join(f"'{key}'" for key in self.source_keys)
+            print(f"Error: No text found in store for {self.name} (none of {keys}).")
+            store.set("error", "No text available for insights generation.")
+            return "error"
 
         print(f"Generating insights from text of length: {len(text_for_insights)} characters...")
 
         try:
-            # Craft a prompt for insights generation
-            prompt = (
-                "Extract the most important insights, key takeaways, and actionable points "
-                "from the following text. Present them as a bulleted list. "
-                "Text:\n\n" + text_for_insights
-            )
-
-            chat_completion = await self.client.chat.completions.create(
-                model="gpt-3.5-turbo", # Or "gpt-4" for more nuanced insights
-                messages=[
-                    {"role": "system", "content": "You are an expert analyst. Provide concise and valuable insights."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500, # Adjust as needed for the number/length of insights
-                temperature=0.5, # Balance between creativity and factual accuracy
-            )
-
-            insights = chat_completion.choices[0].message.content.strip()
+            if needs_chunking(text_for_insights):
+                print(f"{self.name}: Text is long, using chunked map-reduce insights extraction.")
+                insights = await map_reduce(
+                    text_for_insights,
+                    lambda chunk: self._extract_insights(store, CHUNK_INSTRUCTION, chunk),
+                    lambda parts: self._extract_insights(store, REDUCE_INSTRUCTION, "\n\n".join(parts)),
+                    final_reduce_fn=lambda parts: self._extract_insights(store, REDUCE_INSTRUCTION, "\n\n".join(parts), stream=True),
+                )
+            else:
+                insights = await self._extract_insights(store, INSIGHTS_INSTRUCTION, text_for_insights, stream=True)
 
             store.set("insights", insights)
             store.set("final_result", insights)  # <-- ADD THIS
@@ -74,3 +78,24 @@ class InsightsNode(BaseNode):
             store.set("error", f"Insights generation failed: {e}")
             return "insights_failed"
 
+    async def _extract_insights(self, store, instruction, text, stream=False):
+        """
+        Runs a single insights call and returns the bulleted insights text.
+        Only final insights are streamed (stream=True), never partial ones.
+        """
+        # Craft a prompt for insights generation
+        prompt = instruction + "Text:\n\n" + text
+
+        chat_completion = await self.chat(
+            store,
+            stream=stream,
+            model="gpt-3.5-turbo", # Or "gpt-4" for more nuanced insights
+            messages=[
+                {"role": "system", "content": "You are an expert analyst. Provide concise and valuable insights."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500, # Adjust as needed for the number/length of insights
+            temperature=0.5, # Balance between creativity and factual accuracy
+        )
+        return chat_completion.choices[0].message.content.strip()
+
@@ -1,24 +1,22 @@
-import os
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from nodes.base import BaseNode
+from local_intent import INTENT_CONFIDENCE_THRESHOLD, LocalIntentClassifier
+from nodes.llm_node import LLMNode
 
-# Load environment variables
-load_dotenv()
-
-class IntentClassifier(BaseNode):
+class IntentClassifier(LLMNode):
     """
     Node to classify the user's intent from a text prompt using the OpenAI API.
     It expects 'processed_input' in the store.
     It sets 'user_intent' in the store: one of ['summarize', 'code_generation', 'insights', 'math_query', 'general_query', 'unknown'].
+    A local rules + Naive Bayes classifier answers first; the LLM is only asked when
+    its confidence is below INTENT_CONFIDENCE_THRESHOLD. 'intent_source' records
+    which path was taken ("local" or "llm").
     """
+    reads = ("processed_input",)
+    writes = ("user_intent", "intent_source", "error")
+    # The start of a prompt is enough to classify it; don't pay for the rest.
+    prompt_budget = 500
 
     def __init__(self):
         super().__init__("IntentClassifier")
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        if not self.client.api_key:
-            print("❌ Error: OPENAI_API_KEY not found in environment variables.")
 
         # Define supported intents
         self.valid_intents = [
@@ -28,6 +26,8 @@ class IntentClassifier(BaseNode):
             "math_query",
             "general_query"
         ]
+        self.local_classifier = LocalIntentClassifier(self.valid_intents)
+        self.confidence_threshold = INTENT_CONFIDENCE_THRESHOLD
 
     async def execute(self, store):
         user_prompt = store.get("processed_input")
@@ -38,6 +38,15 @@ class IntentClassifier(BaseNode):
             return "error"
 
         print(f"🔍 Classifying intent for prompt: '{user_prompt}'")
+        user_prompt = self.fit_budget(user_prompt)  # For the local classifier too: it runs on the loop.
+
+        local_intent, confidence = self.local_classifier.classify(user_prompt)
+        if confidence >= self.confidence_threshold:
+            store.set("user_intent", local_intent)
+            store.set("intent_source", "local")
+            print(f"⚡ Local classifier: '{local_intent}' (confidence {confidence:.2f}), skipping LLM.")
+            return local_intent
+        print(f"🔍 Local classifier not confident ('{local_intent}', {confidence:.2f}), asking the LLM...")
 
         # Prompt for classification
         prompt = (
@@ -47,7 +56,8 @@ class IntentClassifier(BaseNode):
         )
 
         try:
-            response = await self.client.chat.completions.create(
+            response = await self.chat(
+                store,
                 model="gpt-3.5-turbo",
                 messages=[
                     {"role": "system", "content": "You are an AI assistant that classifies user intent."},
@@ -62,8 +72,12 @@ class IntentClassifier(BaseNode):
             if classified not in self.valid_intents:
                 print(f"⚠️ Unrecognized intent '{classified}', defaulting to 'unknown'.")
                 classified = "unknown"
+            else:
+                # Teach the local model so similar prompts skip the LLM next time.
+                self.local_classifier.learn(user_prompt, classified)
 
             store.set("user_intent", classified)
+            store.set("intent_source", "llm")
             print(f"✅ User intent classified as: {classified}")
             return classified
 
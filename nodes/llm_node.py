@@ -0,0 +1,90 @@
+# nodes/llm_node.py
+import json
+import os
+import config
+import metrics
+from nodes.base import BaseNode
+from llm_client import chat_completion, get_client, has_api_key
+from text_processing import count_tokens, truncate_to_tokens
+
+# Context window (prompt + completion tokens) per model.
+MODEL_CONTEXT_TOKENS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+# Per-node overrides of LLMNode.prompt_budget, e.g. '{"CodeGenerator": 4000}'
+PROMPT_BUDGETS = json.loads(os.getenv("PROMPT_BUDGETS", "{}"))
+
+
+class LLMNode(BaseNode):
+    """
+    Base class for nodes that call the OpenAI chat completions API.
+    All LLM nodes share the process-wide pooled client from llm_client
+    instead of each creating their own AsyncOpenAI client.
+    'prompt_budget' caps the tokens of user-supplied text a node puts in one
+    prompt (see fit_budget); chat() additionally keeps every request within the
+    model's context window.
+    """
+    prompt_budget = None
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.prompt_budget = PROMPT_BUDGETS.get(name, self.prompt_budget)
+        if not has_api_key():
+            print(f"Error: OPENAI_API_KEY not found in environment variables for {name}.")
+
+    @property
+    def client(self):
+        return get_client()
+
+    def fit_budget(self, text, model="gpt-3.5-turbo"):
+        """
+        Returns 'text' truncated to this node's prompt budget, if it has one.
+        """
+        if not self.prompt_budget or not text:
+            return text
+        fitted = truncate_to_tokens(text, self.prompt_budget, model)
+        if fitted is not text:
+            print(f"{self.name}: Input truncated to its prompt budget of {self.prompt_budget} tokens.")
+            metrics.registry.inc("prompt_truncations_total", node=self.name, reason="budget")
+        return fitted
+
+    def _fit_context(self, params):
+        """
+        Shortens the last message if prompt plus max_tokens would exceed the model's context.
+        """
+        model = params.get("model", "")
+        messages = params.get("messages") or []
+        if not messages:
+            return params
+        context = MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+        # About 4 tokens of message framing per message, plus the completion.
+        reserved = (params.get("max_tokens") or 0) + 4 * len(messages) + 8
+        other = sum(count_tokens(m.get("content") or "", model) for m in messages[:-1])
+        available = context - reserved - other
+        last = messages[-1].get("content") or ""
+        if count_tokens(last, model) <= available:
+            return params
+        print(f"{self.name}: Prompt exceeds the {context}-token context of {model}, truncating.")
+        metrics.registry.inc("prompt_truncations_total", node=self.name, reason="context")
+        fitted = {**messages[-1], "content": truncate_to_tokens(last, max(available, 1), model)}
+        return {**params, "messages": [*messages[:-1], fitted]}
+
+    async def chat(self, store, stream=False, **params):
+        """
+        Runs a chat completion for this node on behalf of the run owning 'store'.
+        Accepts the same keyword arguments as client.chat.completions.create.
+        The LLM cache is skipped when the run has set 'use_cache' to False.
+        With stream=True and a 'stream' callback in the store (see Flow.stream),
+        tokens are forwarded as stream(node_name, text) while they are generated.
+        """
+        on_delta = None
+        sink = store.get("stream") if stream else None
+        if sink is not None:
+            on_delta = lambda text: sink(self.name, text)
+        params = self._fit_context(params)
+        return await chat_completion(use_cache=store.get("use_cache") is not False, on_delta=on_delta, **params)
@@ -1,22 +1,25 @@
+import asyncio
 import os
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from nodes.base import BaseNode
+import config
+from math_workers import get_math_workers
+from nodes.llm_node import LLMNode
 
-# Load environment variables from .env file
-load_dotenv()
+# Seconds the local math engine may spend before the query goes to the LLM instead.
+LOCAL_MATH_TIMEOUT = float(os.getenv("LOCAL_MATH_TIMEOUT", "2"))
 
-class MathSolver(BaseNode):
+class MathSolver(LLMNode):
     """
-    Node to solve mathematical queries using the OpenAI API.
+    Node to solve mathematical queries, locally when possible and with the OpenAI API otherwise.
     It expects 'processed_input' (the mathematical query) in the store.
-    It sets 'math_solution' and 'math_solver_reasoning' in the shared store.
+    It sets 'math_solution' and 'math_solver_reasoning' in the shared store, and
+    'math_solver_source' to "local" or "llm".
     """
+    reads = ("processed_input",)
+    writes = ("math_solution", "math_solver_reasoning", "math_solver_source", "error")
+    prompt_budget = 2000
+
     def __init__(self):
         super().__init__("MathSolver")
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        if not self.client.api_key:
-            print("Error: OPENAI_API_KEY not found in environment variables for MathSolver.")
 
     async def execute(self, store):
         """
@@ -31,16 +34,31 @@ class MathSolver(BaseNode):
 
         print(f"Attempting to solve math query: '{math_query}'")
 
+        local_result = await self._solve_locally(math_query)
+        if local_result is not None:
+            math_solution, steps = local_result
+            store.set("math_solution", math_solution)
+            store.set("math_solver_reasoning", "\n".join(steps))
+            store.set("math_solver_source", "local")
+            stream = store.get("stream")
+            if stream is not None:
+                stream(self.name, math_solution)
+            print(f"Solved math query locally: {math_solution}")
+            return "success"
+        print("Local math engine could not handle the query, asking the LLM...")
+
         try:
             # Craft a prompt for mathematical problem-solving
             prompt = (
                 "Solve the following mathematical problem. "
                 "Provide the solution clearly and concisely. "
                 "If it's a differentiation or integration, show the steps. "
-                "Problem:\n\n" + math_query
+                "Problem:\n\n" + self.fit_budget(math_query)
             )
 
-            chat_completion = await self.client.chat.completions.create(
+            chat_completion = await self.chat(
+                store,
+                stream=True,
                 model="gpt-3.5-turbo", # "gpt-4" might be better for complex math
                 messages=[
                     {"role": "system", "content": "You are a highly accurate mathematical assistant. Provide solutions and steps where appropriate."},
@@ -60,6 +78,7 @@ class MathSolver(BaseNode):
 
             store.set("math_solution", math_solution)
             store.set("math_solver_reasoning", math_solver_reasoning) # Store the reasoning
+            store.set("math_solver_source", "llm")
             print(f"Successfully generated math solution. Length: {len(math_solution)} characters.")
             return "success"
 
@@ -69,3 +88,17 @@ class MathSolver(BaseNode):
             store.set("math_solver_reasoning", f"Error during math solving: {e}") # Store error as reasoning
             return "math_solver_failed"
 
+    async def _solve_locally(self, math_query):
+        """
+        Runs the local math engine in a worker process, which is killed if it takes
+        longer than LOCAL_MATH_TIMEOUT. Returns (solution, steps), or None if the
+        query isn't supported or timed out.
+        """
+        try:
+            return await get_math_workers().solve(math_query, LOCAL_MATH_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Local math engine timed out after {LOCAL_MATH_TIMEOUT}s.")
+            return None
+        except OSError as e:
+            print(f"Local math engine unavailable: {e}")
+            return None
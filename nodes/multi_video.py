@@ -0,0 +1,128 @@
+# nodes/multi_video.py
+import asyncio
+import os
+import config
+from graph import Graph
+from map_reduce import reduce_parts
+from nodes.llm_node import LLMNode
+from shared_store import SharedStore
+
+# Videos processed at the same time, and the most videos one request may contain.
+MULTI_VIDEO_MAX_PARALLEL = int(os.getenv("MULTI_VIDEO_MAX_PARALLEL", "4"))
+MULTI_VIDEO_MAX_VIDEOS = int(os.getenv("MULTI_VIDEO_MAX_VIDEOS", "25"))
+
+COMBINE_INSTRUCTION = (
+    "The following are summaries of several different videos. "
+    "Write a combined summary across all of them: the common themes first, "
+    "then what each video adds or where they disagree. Refer to videos by their labels. "
+)
+# Per-video results kept in 'video_results'.
+VIDEO_RESULT_KEYS = ("summary", "insights", "error")
+
+
+class MultiVideoProcessor(LLMNode):
+    """
+    Node for inputs with several videos (see InputDetector's "youtube_batch").
+    Runs the single-video pipeline (fetch -> summarize -> insights) for every ID in
+    'video_ids' concurrently, each in its own SharedStore, at most
+    MULTI_VIDEO_MAX_PARALLEL at a time. Sets 'video_results' (one dict per video with
+    its status, summary, insights and error) and a combined cross-video 'summary'.
+    """
+    reads = ("video_ids",)
+    writes = ("video_results", "summary", "error")
+
+    def __init__(self, youtube_fetcher, summarizer, insights_node, name="MultiVideoProcessor"):
+        super().__init__(name)
+        self.pipeline = Graph()
+        self.pipeline.add_node(youtube_fetcher, start=True)
+        self.pipeline.add_node(summarizer)
+        self.pipeline.add_node(insights_node)
+        self.pipeline.add_edge(youtube_fetcher.name, summarizer.name, on="success")
+        self.pipeline.add_edge(summarizer.name, insights_node.name, on="success")
+        self.pipeline.validate()
+
+    async def execute(self, store):
+        video_ids = store.get("video_ids") or []
+        if not video_ids:
+            store.set("error", "No video IDs provided.")
+            return "error"
+        skipped = video_ids[MULTI_VIDEO_MAX_VIDEOS:]
+        video_ids = video_ids[:MULTI_VIDEO_MAX_VIDEOS]
+        if skipped:
+            print(f"{self.name}: Only the first {MULTI_VIDEO_MAX_VIDEOS} videos are processed, skipping {len(skipped)}.")
+
+        slots = asyncio.Semaphore(MULTI_VIDEO_MAX_PARALLEL)
+
+        async def process(video_id):
+            async with slots:
+                return await self._process_video(store, video_id)
+
+        print(f"{self.name}: Processing {len(video_ids)} videos (max {MULTI_VIDEO_MAX_PARALLEL} in parallel)...")
+        results = await asyncio.gather(*(process(video_id) for video_id in video_ids))
+        results += [{"video_id": video_id, "status": "skipped", "summary": None, "insights": None,
+                     "error": f"More than {MULTI_VIDEO_MAX_VIDEOS} videos in one request."} for video_id in skipped]
+        store.set("video_results", results)
+
+        succeeded = [r for r in results if r["status"] == "ok"]
+        failed = len(results) - len(succeeded)
+        print(f"{self.name}: {len(succeeded)} videos succeeded, {failed} failed or skipped.")
+        if not succeeded:
+            store.set("error", "None of the videos could be processed.")
+            return "all_failed"
+
+        try:
+            summary = await self._combine(store, succeeded)
+        except Exception as e:
+            print(f"An error occurred while combining video summaries: {e}")
+            store.set("error", f"Combining video summaries failed: {e}")
+            return "combine_failed"
+        store.set("summary", summary)
+        return "success" if not failed else "partial"
+
+    async def _process_video(self, store, video_id):
+        """
+        Runs the single-video pipeline for 'video_id' and returns its result dict.
+        """
+        sub_store = SharedStore()
+        sub_store.set("processed_input", video_id)
+        sub_store.set("use_cache", store.get("use_cache"))
+        sub_store.set("trace", store.get("trace"))  # Node spans join the parent run's trace.
+        try:
+            outcomes = await self.pipeline.run(sub_store, keep=VIDEO_RESULT_KEYS)
+        except Exception as e:
+            sub_store.set("error", f"Unexpected error: {e}")
+            outcomes = {}
+        result = {"video_id": video_id, **{key: sub_store.get(key) for key in VIDEO_RESULT_KEYS}}
+        # A video with a summary counts as done even if its insights failed ('error' says so).
+        result["status"] = "ok" if result["summary"] else "failed"
+        if result["status"] == "failed" and not result["error"]:
+            result["error"] = f"Pipeline stopped: {outcomes}"
+        return result
+
+    async def _combine(self, store, results):
+        """
+        Merges the per-video summaries into one cross-video summary.
+        A single successful video's summary is used as is.
+        """
+        if len(results) == 1:
+            return results[0]["summary"]
+        parts = [f"Video {r['video_id']}:\n{r['summary']}" for r in results]
+        return await reduce_parts(
+            parts,
+            lambda group: self._combine_group(store, group),
+            final_reduce_fn=lambda group: self._combine_group(store, group, stream=True),
+        )
+
+    async def _combine_group(self, store, parts, stream=False):
+        chat_completion = await self.chat(
+            store,
+            stream=stream,
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+                {"role": "user", "content": COMBINE_INSTRUCTION + "Summaries:\n\n" + "\n\n".join(parts)},
+            ],
+            max_tokens=700,
+            temperature=0.5,
+        )
+        return chat_completion.choices[0].message.content.strip()
@@ -0,0 +1,75 @@
+# nodes/similar_prompts.py
+import copy
+import metrics
+from nodes.base import BaseNode
+from similarity_cache import get_similarity_cache
+
+# Store keys a text-prompt run produces, saved and restored by SimilarPromptLookup.
+CACHED_KEYS = (
+    "user_intent",
+    "summary",
+    "insights",
+    "generated_code",
+    "math_solution",
+    "math_solver_reasoning",
+    "math_solver_source",
+)
+# The key holding the main answer of each intent, streamed on a hit.
+ANSWER_KEYS = {
+    "summarize": "summary",
+    "insights": "insights",
+    "general_query": "insights",
+    "code_generation": "generated_code",
+    "math_query": "math_solution",
+}
+
+
+class SimilarPromptLookup(BaseNode):
+    """
+    Node that answers a text prompt from the results of an earlier, sufficiently
+    similar prompt (see similarity_cache.py) before any LLM is called.
+    On a hit it restores the stored results and returns "hit"; otherwise "miss",
+    and the Flow calls remember() once the run has finished.
+    Skipped when the run has set 'use_cache' to False.
+    """
+    reads = ("processed_input",)
+    writes = CACHED_KEYS + ("intent_source",)
+
+    def __init__(self, name="SimilarPromptLookup"):
+        super().__init__(name)
+
+    async def execute(self, store):
+        cache = get_similarity_cache()
+        prompt = store.get("processed_input")
+        if cache is None or not prompt or store.get("use_cache") is False:
+            return "miss"
+
+        found = cache.lookup(prompt)
+        if found is None:
+            metrics.registry.inc("similarity_cache_lookups_total", result="miss")
+            return "miss"
+        result, score = found
+        metrics.registry.inc("similarity_cache_lookups_total", result="hit")
+        for key, value in result.items():
+            store.set(key, copy.deepcopy(value))
+        store.set("intent_source", "similar_prompt")
+        print(f"{self.name}: Answered from a similar earlier prompt (similarity {score:.2f}).")
+
+        sink = store.get("stream")
+        answer = store.get(ANSWER_KEYS.get(result.get("user_intent"), ""))
+        if sink is not None and isinstance(answer, str):
+            sink(self.name, answer)
+        return "hit"
+
+    def remember(self, store):
+        """
+        Saves the results of a finished, successful text-prompt run for later lookups.
+        """
+        cache = get_similarity_cache()
+        intent = store.get("user_intent")
+        if cache is None or store.get("use_cache") is False or store.get("error") or intent not in ANSWER_KEYS:
+            return
+        if not store.get(ANSWER_KEYS[intent]):
+            return
+        result = {key: store.get(key) for key in CACHED_KEYS if store.get(key) is not None}
+        cache.add(store.get("input"), intent, copy.deepcopy(result))
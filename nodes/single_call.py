@@ -0,0 +1,110 @@
+# nodes/single_call.py
+import json
+import os
+import config
+from deadline import DeadlineExceeded
+from map_reduce import needs_chunking
+from nodes.llm_node import LLMNode
+
+SINGLE_CALL_MODEL = os.getenv("SINGLE_CALL_MODEL", "gpt-3.5-turbo")
+
+SINGLE_CALL_INSTRUCTION = (
+    "Classify the user's request into exactly one of these intents and answer it in the same reply.\n"
+    "- summarize: summarize the text in the request; also list its key insights as bullets in 'insights'.\n"
+    "- code_generation: 'answer' is only the code block, without explanations.\n"
+    "- math_query: solve the problem concisely, showing steps for differentiation or integration.\n"
+    "- insights: the most important insights, key takeaways and actionable points as a bulleted list.\n"
+    "- general_query: anything else; answer with the most important points as a bulleted list.\n"
+    'Reply with a JSON object: {"intent": "<intent>", "answer": "<answer>", "insights": "<bullets, summarize only>"}.'
+)
+# Store key that receives the 'answer' of each intent.
+ANSWER_KEYS = {
+    "summarize": "summary",
+    "code_generation": "generated_code",
+    "math_query": "math_solution",
+    "insights": "insights",
+    "general_query": "insights",
+}
+
+
+class SingleCallRouter(LLMNode):
+    """
+    Node for ROUTING_MODE=single_call (see flow.py): classifies a text prompt and
+    answers it with one structured (JSON) completion instead of IntentClassifier
+    followed by the intent's node, filling the same store keys those nodes would.
+    Prompts the local intent classifier is confident about go straight to their
+    node, as with IntentClassifier (so math still tries the local engine first),
+    except summaries: the single call returns the summary and its insights
+    together, where the two-step route needs Summarizer and then InsightsNode.
+    Returns "answered", an intent for the direct route, or "fallback" to hand the
+    prompt to IntentClassifier: for texts long enough to need chunking, or when
+    the reply cannot be used. Returns "error" when the run's deadline passes, as
+    there is no time left for the two-step route either.
+    """
+    reads = ("processed_input",)
+    writes = ("user_intent", "intent_source", "summary", "insights", "generated_code",
+              "math_solution", "math_solver_reasoning", "math_solver_source", "error")
+    prompt_budget = 6000
+
+    def __init__(self, intent_classifier, name="SingleCallRouter"):
+        super().__init__(name)
+        # Shares IntentClassifier's local model, and teaches it the intents the LLM reports.
+        self.intent_classifier = intent_classifier
+
+    async def execute(self, store):
+        user_prompt = store.get("processed_input")
+        if not user_prompt or needs_chunking(user_prompt):
+            return "fallback"
+
+        user_prompt = self.fit_budget(user_prompt)
+        local_classifier = self.intent_classifier.local_classifier
+        local_intent, confidence = local_classifier.classify(user_prompt)
+        if confidence >= self.intent_classifier.confidence_threshold and local_intent != "summarize":
+            store.set("user_intent", local_intent)
+            store.set("intent_source", "local")
+            print(f"{self.name}: Local classifier: '{local_intent}' (confidence {confidence:.2f}).")
+            return local_intent
+
+        try:
+            response = await self.chat(
+                store,
+                model=SINGLE_CALL_MODEL,
+                messages=[
+                    {"role": "system", "content": SINGLE_CALL_INSTRUCTION},
+                    {"role": "user", "content": user_prompt},
+                ],
+                response_format={"type": "json_object"},
+                max_tokens=1200,
+                temperature=0.3,
+            )
+            reply = json.loads(response.choices[0].message.content)
+        except DeadlineExceeded as e:
+            print(f"{self.name}: Single-call answer stopped: {e}")
+            store.set("error", str(e))
+            return "error"
+        except Exception as e:
+            print(f"{self.name}: Single-call answer failed ({e}), falling back to two steps.")
+            return "fallback"
+
+        intent = str(reply.get("intent", "")).strip().lower() if isinstance(reply, dict) else ""
+        answer = reply.get("answer") if isinstance(reply, dict) else None
+        if intent not in ANSWER_KEYS or not isinstance(answer, str) or not answer.strip():
+            print(f"{self.name}: Unusable single-call reply, falling back to two steps.")
+            return "fallback"
+        answer = answer.strip()
+
+        local_classifier.learn(user_prompt, intent)
+        store.set("user_intent", intent)
+        store.set("intent_source", "single_call")
+        store.set(ANSWER_KEYS[intent], answer)
+        if intent == "summarize" and isinstance(reply.get("insights"), str) and reply["insights"].strip():
+            store.set("insights", reply["insights"].strip())
+        elif intent == "math_query":
+            store.set("math_solver_reasoning", answer)
+            store.set("math_solver_source", "llm")
+
+        sink = store.get("stream")
+        if sink is not None:
+            sink(self.name, answer)  # The reply is JSON, so it is forwarded once complete.
+        print(f"{self.name}: Answered '{intent}' in a single call. Length: {len(answer)} characters.")
+        return "answered"
@@ -1,33 +1,50 @@
-import os
-from dotenv import load_dotenv
-from nodes.base import BaseNode
-from openai import AsyncOpenAI
+from map_reduce import map_reduce, needs_chunking
+from nodes.context_retriever import with_request
+from nodes.llm_node import LLMNode
 
-# Load environment variables from .env file
-load_dotenv()
+SUMMARY_INSTRUCTION = (
+    "Please summarize the following text concisely and accurately. "
+    "Focus on the main points and key information. "
+)
+# Used in chunked mode: first on each part of a long text, then to merge partial summaries.
+CHUNK_INSTRUCTION = (
+    "The following text is one part of a longer text. "
+    "Summarize this part concisely, keeping all main points and key information. "
+)
+REDUCE_INSTRUCTION = (
+    "The following are summaries of consecutive parts of one longer text. "
+    "Combine them into a single concise and accurate summary of the whole text. "
+)
 
-class Summarizer(BaseNode):
+
+class Summarizer(LLMNode):
     """
     Node to summarize text using the OpenAI API.
-    It expects 'transcript' (or any text to summarize) in the store.
+    It expects 'transcript' (or any text to summarize) in the store. For follow-up
+    prompts about an earlier video it summarizes 'retrieved_context' instead.
     It sets 'summary' in the shared store.
     """
-    def __init__(self):
-        super().__init__("Summarizer")
-        # Initialize OpenAI client
-        self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        if not self.client.api_key:
-            print("Error: OPENAI_API_KEY not found in environment variables.")
-            # You might want to raise an exception or handle this more gracefully
-            # if the key is absolutely required for the node to function.
+    reads = ("transcript", "retrieved_context", "processed_input")
+    writes = ("summary", "error")
+
+    def __init__(self, name="Summarizer"):
+        super().__init__(name)
 
     async def execute(self, store):
         """
         Summarizes the text found in 'transcript' (or 'processed_input' if no transcript)
         using the OpenAI API and stores the result in 'summary'.
+        Long texts are summarized in chunks concurrently and the partial summaries
+        are merged hierarchically (see map_reduce.py).
         """
         text_to_summarize = store.get("transcript")
-        if not text_to_summarize:
+        if text_to_summarize:
+            print(f"{self.name}: Using 'transcript' as text to summarize.")
+        elif store.get("retrieved_context"):
+            # Follow-up about an earlier video: summarize its relevant parts with the request in view.
+            print(f"{self.name}: Using 'retrieved_context' as text to summarize.")
+            text_to_summarize = with_request(store.get("processed_input"), store.get("retrieved_context"))
+        else:
             # Fallback to processed_input if no transcript is available
             text_to_summarize = store.get("processed_input")
             if not text_to_summarize:
@@ -35,34 +52,21 @@ class Summarizer(BaseNode):
                 store.set("error", "No text available for summarization.")
                 return "error"
             else:
-                print("Summarizer: Using 'processed_input' as text to summarize.")
-        else:
-            print("Summarizer: Using 'transcript' as text to summarize.")
-
+                print(f"{self.name}: Using 'processed_input' as text to summarize.")
 
         print(f"Summarizing text of length: {len(text_to_summarize)} characters...")
 
         try:
-            # Define the prompt for summarization
-            prompt = (
-                "Please summarize the following text concisely and accurately. "
-                "Focus on the main points and key information. "
-                "Text:\n\n" + text_to_summarize
-            )
-
-            # Call the OpenAI API for chat completion
-            # Using gpt-3.5-turbo for cost-effectiveness and good performance
-            chat_completion = await self.client.chat.completions.create(
-                model="gpt-3.5-turbo", # Or "gpt-4" for higher quality
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that summarizes text."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500, # Adjust as needed for summary length
-                temperature=0.7, # Controls randomness, lower for more focused summaries
-            )
-
-            summary = chat_completion.choices[0].message.content.strip()
+            if needs_chunking(text_to_summarize):
+                print(f"{self.name}: Text is long, using chunked map-reduce summarization.")
+                summary = await map_reduce(
+                    text_to_summarize,
+                    lambda chunk: self._summarize(store, CHUNK_INSTRUCTION, chunk),
+                    lambda parts: self._summarize(store, REDUCE_INSTRUCTION, "\n\n".join(parts)),
+                    final_reduce_fn=lambda parts: self._summarize(store, REDUCE_INSTRUCTION, "\n\n".join(parts), stream=True),
+                )
+            else:
+                summary = await self._summarize(store, SUMMARY_INSTRUCTION, text_to_summarize, stream=True)
 
             store.set("summary", summary)
             print(f"Successfully generated summary. Length: {len(summary)} characters.")
@@ -73,3 +77,26 @@ class Summarizer(BaseNode):
             store.set("error", f"Summarization failed: {e}")
             return "summarization_failed"
 
+    async def _summarize(self, store, instruction, text, stream=False):
+        """
+        Runs a single summarization call and returns the summary text.
+        Only final summaries are streamed (stream=True), never partial ones.
+        """
+        # Define the prompt for summarization
+        prompt = instruction + "Text:\n\n" + text
+
+        # Call the OpenAI API for chat completion
+        # Using gpt-3.5-turbo for cost-effectiveness and good performance
+        chat_completion = await self.chat(
+            store,
+            stream=stream,
+            model="gpt-3.5-turbo", # Or "gpt-4" for higher quality
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant that summarizes text."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=500, # Adjust as needed for summary length
+            temperature=0.7, # Controls randomness, lower for more focused summaries
+        )
+        return chat_completion.choices[0].message.content.strip()
+
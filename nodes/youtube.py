@@ -1,9 +1,85 @@
+import asyncio
+import os
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import config
+import deadline
 from nodes.base import BaseNode
-from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
+from singleflight import SingleFlight
+from retrieval_index import get_retrieval_index_store
+from transcript_cleaning import clean_captions
+from transcript_store import get_transcript_store
+
+# youtube_transcript_api is synchronous, so fetches run on a bounded worker pool
+# instead of blocking the event loop for every other in-flight flow.
+FETCH_WORKERS = int(os.getenv("YOUTUBE_FETCH_WORKERS", "8"))
+MAX_CONCURRENT_FETCHES = int(os.getenv("YOUTUBE_MAX_CONCURRENT_FETCHES", str(FETCH_WORKERS)))
+FETCH_TIMEOUT = float(os.getenv("YOUTUBE_FETCH_TIMEOUT", "30"))
+
+_fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="youtube-fetch")
+
+
+def fetch_transcript_text(video_id):
+    """
+    Downloads the transcript for 'video_id', one caption snippet per line. Blocking.
+    """
+    from youtube_transcript_api import YouTubeTranscriptApi  # Imported on first fetch (slow to import).
+
+    yt_api_instance = YouTubeTranscriptApi()
+    transcript_list = yt_api_instance.fetch(video_id)
+    return "\n".join([item.text for item in transcript_list])
+
+def fetch_playlist_video_ids(playlist_id):
+    """
+    Returns the video IDs of a YouTube playlist, in playlist order. Blocking.
+    Requires the optional yt-dlp package.
+    """
+    try:
+        import yt_dlp
+    except ImportError:  # Optional: only needed to expand playlist URLs.
+        raise RuntimeError("Expanding playlists requires the yt-dlp package (pip install yt-dlp).")
+    options = {"extract_flat": "in_playlist", "quiet": True, "skip_download": True}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(f"https://www.youtube.com/playlist?list={playlist_id}", download=False)
+    return [entry["id"] for entry in info.get("entries") or [] if entry and entry.get("id")]
+
+# The blocking function used to download transcripts. Replaceable (see
+# set_transcript_source) so benchmarks and tests can run without YouTube.
+_transcript_source = fetch_transcript_text
+
+
+def set_transcript_source(source):
+    """
+    Replaces the transcript download function: source(video_id) -> transcript text
+    (captions may be on separate lines). Pass None to restore the real YouTube fetcher.
+    """
+    global _transcript_source
+    _transcript_source = source or fetch_transcript_text
+
+
+def fetch_clean_transcript(video_id):
+    """
+    Downloads and cleans (see transcript_cleaning.py) the transcript. Blocking.
+    """
+    raw = _transcript_source(video_id)
+    cleaned = clean_captions(raw)
+    print(f"Cleaned transcript for {video_id}: {len(raw)} -> {len(cleaned)} characters.")
+    return cleaned
+
+
+transcript_flight = SingleFlight("transcript")
+
 
 class YouTubeFetcher(BaseNode):
+    reads = ("processed_input",)
+    writes = ("transcript", "error")
+
     def __init__(self):
         super().__init__("YouTubeFetcher")
+        self.transcript_store = get_transcript_store()
+        self.retrieval_index = get_retrieval_index_store()
+        # One fetch semaphore per event loop (asyncio primitives are loop-bound).
+        self._fetch_slots = weakref.WeakKeyDictionary()
 
     async def execute(self, store):
         video_id = store.get("processed_input")
@@ -12,25 +88,93 @@ class YouTubeFetcher(BaseNode):
             store.set("error", "No YouTube video ID provided.")
             return "error"
 
+        if self.transcript_store is not None:
+            cached = await asyncio.to_thread(self.transcript_store.get, video_id)
+            if cached is not None:
+                status, full_transcript = cached
+                if status == "success":
+                    store.set("transcript", full_transcript)
+                    print(f"Using cached transcript for {video_id}. Length: {len(full_transcript)} characters.")
+                    self._index(video_id, full_transcript)
+                    return "success"
+                print(f"Known failure for video ID {video_id} (cached): {status}")
+                return self._record_failure(store, video_id, status)
+
         print(f"Attempting to fetch transcript for video ID: {video_id}")
+        from youtube_transcript_api import NoTranscriptFound, TranscriptsDisabled
+
         try:
-            # This is the crucial line:
-            yt_api_instance = YouTubeTranscriptApi()
-            transcript_list = yt_api_instance.fetch(video_id)
-            full_transcript = " ".join([item.text for item in transcript_list])
+            # Concurrent runs for the same video share one download.
+            full_transcript = await deadline.bounded(
+                transcript_flight.do(video_id, lambda: self._fetch_off_loop(video_id))
+            )
             store.set("transcript", full_transcript)
             print(f"Successfully fetched transcript for {video_id}. Length: {len(full_transcript)} characters.")
+            if self.transcript_store is not None:
+                await asyncio.to_thread(self.transcript_store.put, video_id, full_transcript)
+            self._index(video_id, full_transcript)
             return "success"
 
         except NoTranscriptFound:
-            print(f"Error: No transcript found for video ID: {video_id}.")
-            store.set("error", f"No transcript found for video ID: {video_id}.")
-            return "no_transcript_found"
+            return await self._remember_failure(store, video_id, "no_transcript_found")
         except TranscriptsDisabled:
-            print(f"Error: Transcripts are disabled for video ID: {video_id}.")
-            store.set("error", f"Transcripts are disabled for video ID: {video_id}.")
-            return "transcripts_disabled"
+            return await self._remember_failure(store, video_id, "transcripts_disabled")
+        except asyncio.TimeoutError as e:
+            # FETCH_TIMEOUT, or the run's deadline (deadline.DeadlineExceeded) if that is sooner.
+            print(f"Error: Timed out fetching transcript for video ID: {video_id} ({e or f'after {FETCH_TIMEOUT}s'}).")
+            store.set("error", f"Timed out fetching transcript for video ID: {video_id}.")
+            return "fetch_timeout"
         except Exception as e:
             print(f"An unexpected error occurred while fetching transcript: {e}")
             store.set("error", f"Failed to fetch transcript: {e}")
-            return "fetch_failed"
\ No newline at end of file
+            return "fetch_failed"
+
+    def _index(self, video_id, transcript):
+        # Indexed in the background for follow-up prompts (see nodes/context_retriever.py).
+        if self.retrieval_index is not None:
+            self.retrieval_index.add(video_id, transcript)
+
+    async def _fetch_off_loop(self, video_id):
+        """
+        Downloads and cleans the transcript on the worker pool, limited to MAX_CONCURRENT_FETCHES
+        at a time and FETCH_TIMEOUT seconds per fetch. A slot is only released once its
+        worker thread is actually done, so timed-out fetches still count against the limit.
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._fetch_slots.get(loop)
+        if slots is None:
+            slots = self._fetch_slots[loop] = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+        await slots.acquire()
+        try:
+            future = loop.run_in_executor(_fetch_executor, fetch_clean_transcript, video_id)
+        except BaseException:
+            slots.release()
+            raise
+
+        def _on_done(done):
+            slots.release()
+            if not done.cancelled():
+                done.exception()  # Mark as retrieved when the caller already timed out.
+
+        future.add_done_callback(_on_done)
+        return await asyncio.wait_for(asyncio.shield(future), timeout=FETCH_TIMEOUT)
+
+    async def _remember_failure(self, store, video_id, status):
+        """
+        Negative-caches a permanent failure for 'video_id' and records it in the store.
+        """
+        if self.transcript_store is not None:
+            await asyncio.to_thread(self.transcript_store.put_failure, video_id, status)
+        return self._record_failure(store, video_id, status)
+
+    def _record_failure(self, store, video_id, status):
+        if status == "no_transcript_found":
+            message = f"No transcript found for video ID: {video_id}."
+        elif status == "transcripts_disabled":
+            message = f"Transcripts are disabled for video ID: {video_id}."
+        else:
+            message = f"Failed to fetch transcript for video ID: {video_id}."
+        print(f"Error: {message}")
+        store.set("error", message)
+        return status
@@ -0,0 +1,243 @@
+# rate_limiter.py
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+import config
+import metrics
+from text_processing import estimate_tokens
+
+# Starting budgets per model. Once the API reports its x-ratelimit-* headers,
+# the real limits of the account replace these.
+DEFAULT_RPM = int(os.getenv("LLM_RPM", "500"))
+DEFAULT_TPM = int(os.getenv("LLM_TPM", "200000"))
+# Per-model overrides, e.g. '{"gpt-4": {"rpm": 500, "tpm": 30000}}'
+MODEL_LIMITS = json.loads(os.getenv("LLM_RATE_LIMITS", "{}"))
+# Bounds of the adaptive number of concurrent requests per model.
+MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Completion tokens assumed for a request that does not set max_tokens.
+DEFAULT_COMPLETION_ESTIMATE = 512
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """
+    Parses durations as used in OpenAI rate-limit headers ("20ms", "1s", "6m0s")
+    or plain seconds. Returns seconds, or None.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts) if parts else None
+
+
+def estimate_request_tokens(params):
+    """
+    Estimates the tokens a chat completion request counts against TPM:
+    the prompt plus the completion it may generate.
+    """
+    prompt = sum(estimate_tokens(m.get("content") or "") + 4 for m in params.get("messages", ()))
+    return prompt + (params.get("max_tokens") or DEFAULT_COMPLETION_ESTIMATE)
+
+
+class TokenBucket:
+    """
+    Refills 'per_minute' units evenly over a minute, holding at most a minute's worth.
+    """
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount):
+        """
+        Seconds until 'amount' units are available (0 if they are now).
+        """
+        self._refill()
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket.
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount):
+        self._refill()
+        self.level -= amount
+
+    def set_capacity(self, per_minute):
+        self._refill()
+        self.capacity = float(per_minute)
+        self.level = min(self.level, self.capacity)
+
+    def set_remaining(self, remaining):
+        self._refill()
+        self.level = min(self.level, float(remaining))
+
+
+class ModelLimiter:
+    """
+    Schedules the requests of one model: requests-per-minute and tokens-per-minute
+    token buckets, plus an AIMD concurrency limit that grows by about one per
+    round of successful requests and halves on a 429. After a 429 every request
+    for the model waits out the Retry-After period.
+    """
+    def __init__(self, model, rpm, tpm):
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limit = float(min(MAX_CONCURRENCY, max(MIN_CONCURRENCY, 8)))
+        self.active = 0
+        self.blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._changed = asyncio.Condition()
+
+    async def _acquire(self, estimate):
+        async with self._changed:
+            while True:
+                now = time.monotonic()
+                wait = max(
+                    self.blocked_until - now,
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimate),
+                )
+                if wait <= 0 and self.active < int(self.limit):
+                    self.requests.take(1)
+                    self.tokens.take(estimate)
+                    self.active += 1
+                    return
+                try:
+                    # Woken early when a slot frees up; otherwise re-check once budget has refilled.
+                    await asyncio.wait_for(self._changed.wait(), timeout=wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self):
+        async with self._changed:
+            self.active -= 1
+            self._changed.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, estimate):
+        """
+        Waits until a request with an estimated 'estimate' tokens fits the budgets
+        and the concurrency limit, and holds a concurrency slot while it runs.
+        """
+        await self._acquire(estimate)
+        try:
+            yield
+        finally:
+            await self._release()
+
+    def observe_headers(self, headers):
+        """
+        Adopts the limits and remaining budgets the API reports.
+        """
+        limit_requests = headers.get("x-ratelimit-limit-requests")
+        limit_tokens = headers.get("x-ratelimit-limit-tokens")
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        try:
+            if limit_requests:
+                self.requests.set_capacity(int(limit_requests))
+            if limit_tokens:
+                self.tokens.set_capacity(int(limit_tokens))
+            if remaining_requests:
+                self.requests.set_remaining(int(remaining_requests))
+            if remaining_tokens:
+                self.tokens.set_remaining(int(remaining_tokens))
+        except ValueError:
+            pass  # Unexpected header format; keep the current budgets.
+
+    def on_success(self, estimate, usage):
+        """
+        Grows the concurrency limit and corrects the token bucket by the difference
+        between the estimated and the actual token count.
+        """
+        self.limit = min(MAX_CONCURRENCY, self.limit + 1 / self.limit)
+        if usage is not None:
+            self.tokens.take(usage.total_tokens - estimate)
+
+    def retry_delay(self, error, attempt):
+        """
+        Returns the seconds to wait before retrying after 'error', or None if it
+        should not be retried.
+        """
+        import openai  # Only reached after a request failed, so openai is already loaded.
+
+        if isinstance(error, openai.APIStatusError):
+            if error.status_code not in RETRYABLE_STATUS:
+                return None
+            if error.status_code == 429 and getattr(error, "code", None) == "insufficient_quota":
+                return None  # Out of credits: retrying will not help.
+        elif not isinstance(error, openai.APIConnectionError):  # Includes timeouts.
+            return None
+        if attempt >= MAX_RETRIES:
+            return None
+
+        # Full jitter, so waiting requests do not all retry at the same moment.
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+        response = getattr(error, "response", None)
+        if response is not None:
+            headers = response.headers
+            retry_after = parse_duration(headers.get("retry-after-ms"))
+            retry_after = retry_after / 1000 if retry_after is not None else parse_duration(headers.get("retry-after"))
+            if retry_after is None and getattr(error, "status_code", None) == 429:
+                retry_after = max(filter(None, (
+                    parse_duration(headers.get("x-ratelimit-reset-requests")),
+                    parse_duration(headers.get("x-ratelimit-reset-tokens")),
+                )), default=None)
+            if retry_after is not None:
+                delay = min(BACKOFF_MAX, retry_after) + random.uniform(0, BACKOFF_BASE)
+
+        status = getattr(error, "status_code", None)
+        reason = str(status) if status else "connection"
+        metrics.registry.inc("llm_retries_total", model=self.model, reason=reason)
+        if status == 429:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + delay)
+            # Halve at most once per second, so one burst of 429s counts as one signal.
+            if now - self._last_decrease > 1.0:
+                self.limit = max(MIN_CONCURRENCY, self.limit / 2)
+                self._last_decrease = now
+        return delay
+
+
+# Limiters use asyncio primitives, so they are kept per event loop: loop -> {model: ModelLimiter}
+_limiters = weakref.WeakKeyDictionary()
+
+
+def get_rate_limiter(model):
+    """
+    Returns the limiter for 'model' on the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    limiters = _limiters.get(loop)
+    if limiters is None:
+        limiters = _limiters[loop] = {}
+    limiter = limiters.get(model)
+    if limiter is None:
+        limits = MODEL_LIMITS.get(model, {})
+        limiter = limiters[model] = ModelLimiter(
+            model, limits.get("rpm", DEFAULT_RPM), limits.get("tpm", DEFAULT_TPM)
+        )
+    return limiter
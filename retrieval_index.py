@@ -0,0 +1,189 @@
+# retrieval_index.py
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from disk_cache import DiskCache
+from text_processing import chunk_text
+from transcript_cleaning import CLEANING_VERSION
+
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "1") not in ("0", "false", "False")
+RETRIEVAL_DIR = os.getenv("RETRIEVAL_DIR", os.getenv("LLM_CACHE_DIR", ".cache"))
+RETRIEVAL_TTL = float(os.getenv("RETRIEVAL_TTL", str(30 * 24 * 3600)))
+RETRIEVAL_MAX_BYTES = int(os.getenv("RETRIEVAL_MAX_BYTES", str(512 * 1024 * 1024)))
+# Size of the indexed transcript chunks, and how many a follow-up prompt gets.
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", "250"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+# Indexes kept parsed in memory, for the videos of the most recent follow-ups.
+RETRIEVAL_MEMORY_ENTRIES = int(os.getenv("RETRIEVAL_MEMORY_ENTRIES", "32"))
+
+# BM25 parameters: term frequency saturation and document length normalization.
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a about an and are as at be but by can did do does for from had has have he her his how i in "
+    "is it its me my of on or our she so that the their them they this to was we were what when "
+    "where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    """
+    Lowercased words of 'text', without stopwords.
+    """
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    BM25 inverted index over the chunks of one text: for every term, the chunks
+    that contain it and how often. Built with from_text, saved with to_json.
+    """
+    def __init__(self, chunks, lengths, postings):
+        self.chunks = chunks
+        self.lengths = lengths
+        self.postings = postings  # term -> [[chunk index, term frequency], ...]
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def from_text(cls, text, chunk_tokens=RETRIEVAL_CHUNK_TOKENS):
+        chunks = chunk_text(text, chunk_tokens)
+        lengths, postings = [], {}
+        for i, chunk in enumerate(chunks):
+            terms = Counter(tokenize(chunk))
+            lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                postings.setdefault(term, []).append([i, frequency])
+        return cls(chunks, lengths, postings)
+
+    @classmethod
+    def from_json(cls, raw):
+        record = json.loads(raw)
+        return cls(record["chunks"], record["lengths"], record["postings"])
+
+    def to_json(self):
+        return json.dumps(
+            {"chunks": self.chunks, "lengths": self.lengths, "postings": self.postings},
+            ensure_ascii=False,
+        )
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, k=RETRIEVAL_TOP_K):
+        """
+        Returns the indexes of the (at most) 'k' chunks that best match 'query',
+        best first. Chunks sharing no term with the query are never returned.
+        """
+        scores = {}
+        count = len(self.chunks)
+        for term in set(tokenize(query)):
+            matches = self.postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (count - len(matches) + 0.5) / (len(matches) + 0.5))
+            for i, frequency in matches:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / self.average_length)
+                scores[i] = scores.get(i, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return sorted(scores, key=lambda i: (-scores[i], i))[:k]
+
+    def spread(self, k=RETRIEVAL_TOP_K):
+        """
+        Returns the indexes of 'k' chunks evenly spaced over the text, for prompts
+        that match nothing in particular (e.g. "summarize it").
+        """
+        count = len(self.chunks)
+        if count <= k:
+            return list(range(count))
+        return sorted({round(i * (count - 1) / (k - 1)) for i in range(k)}) if k > 1 else [0]
+
+
+class RetrievalIndexStore:
+    """
+    On-disk BM25 indexes of fetched transcripts, keyed by video ID, so follow-up
+    prompts about a video send the model only its most relevant chunks.
+    Keys include the caption cleaning version, like TranscriptStore's. Recently
+    used indexes stay parsed in memory. Indexing runs on one background thread,
+    so fetching a transcript does not wait for it; get() waits for queued work.
+    """
+    def __init__(self, path, ttl=RETRIEVAL_TTL, max_bytes=RETRIEVAL_MAX_BYTES,
+                 memory_entries=RETRIEVAL_MEMORY_ENTRIES, version=CLEANING_VERSION):
+        self.version = version
+        self.memory_entries = memory_entries
+        self.cache = DiskCache(path, max_bytes=max_bytes, default_ttl=ttl)
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retrieval-index")
+
+    def _key(self, video_id):
+        return f"{video_id}@v{self.version}"
+
+    def _remember(self, video_id, index):
+        with self._lock:
+            self._recent[video_id] = index
+            self._recent.move_to_end(video_id)
+            while len(self._recent) > self.memory_entries:
+                self._recent.popitem(last=False)
+
+    def get(self, video_id):
+        """
+        Returns the BM25Index of 'video_id', or None if it was never indexed. Blocking.
+        """
+        self._writer.submit(lambda: None).result()
+        with self._lock:
+            index = self._recent.get(video_id)
+            if index is not None:
+                self._recent.move_to_end(video_id)
+                return index
+        raw = self.cache.get(self._key(video_id))
+        if raw is None:
+            return None
+        index = BM25Index.from_json(raw)
+        self._remember(video_id, index)
+        return index
+
+    def build(self, video_id, transcript):
+        """
+        Chunks and indexes 'transcript', saves the index and returns it. Blocking.
+        """
+        index = BM25Index.from_text(transcript)
+        self.cache.set(self._key(video_id), index.to_json().encode("utf-8"))
+        self._remember(video_id, index)
+        print(f"Indexed transcript of {video_id} for retrieval: {len(index)} chunks.")
+        return index
+
+    def add(self, video_id, transcript):
+        """
+        Queues indexing of 'transcript' unless 'video_id' is already indexed.
+        """
+        def index():
+            with self._lock:
+                if video_id in self._recent:
+                    return
+            if self.cache.get(self._key(video_id)) is None:
+                self.build(video_id, transcript)
+        return self._writer.submit(index)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_retrieval_index_store():
+    """
+    Returns the process-wide RetrievalIndexStore, or None when retrieval is disabled.
+    """
+    global _store
+    if not RETRIEVAL_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = RetrievalIndexStore(os.path.join(RETRIEVAL_DIR, "retrieval.sqlite3"))
+        return _store
@@ -0,0 +1,373 @@
+# server.py
+import argparse
+import asyncio
+import json
+import os
+import time
+import config
+
+import metrics
+from batch import RESULT_KEYS
+from deadline import FLOW_TIMEOUT
+from llm_client import get_client, has_api_key
+from main import get_flow, run_agent_flow, stream_agent_flow
+
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+# Flows running at once. Requests beyond that wait in a queue of SERVER_QUEUE_SIZE;
+# once the queue is full, new requests get 503 with a Retry-After header.
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "16"))
+SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "64"))
+SERVER_RETRY_AFTER = int(os.getenv("SERVER_RETRY_AFTER", "2"))
+SERVER_MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", str(1024 * 1024)))
+# Idle keep-alive connections are closed after this many seconds.
+SERVER_KEEPALIVE_TIMEOUT = float(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "15"))
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def result_record(store):
+    record = {key: store.get(key) for key in RESULT_KEYS}
+    record["status"] = "failed" if store.get("error") else "ok"
+    return record
+
+
+class Job:
+    """
+    One queued /run request. 'events' is set for streamed requests and receives
+    the flow's events, ending with None.
+    """
+    def __init__(self, user_input, use_cache, stream, context_video_id=None, timeout=FLOW_TIMEOUT):
+        self.user_input = user_input
+        self.use_cache = use_cache
+        self.context_video_id = context_video_id
+        self.timeout = timeout
+        self.events = asyncio.Queue() if stream else None
+        self.result = asyncio.get_running_loop().create_future()
+        self.task = None
+        self.enqueued_at = time.perf_counter()
+
+    def time_left(self):
+        """
+        The request's timeout minus the time it spent queued (0: no limit).
+        """
+        if self.timeout <= 0:
+            return 0
+        return max(0.001, self.timeout - (time.perf_counter() - self.enqueued_at))
+
+
+def _load_nodes(flow):
+    """
+    Constructs the nodes of 'flow' and imports the clients they import on first
+    use (openai, youtube_transcript_api). Blocking.
+    """
+    for node in flow.graph.nodes.values():
+        node.node
+    import openai
+    import youtube_transcript_api
+
+
+class AgentServer:
+    """
+    Asyncio HTTP/1.1 server around the agent flow, built on the standard library.
+
+        POST /run      {"input": "...", "use_cache": true, "stream": false}
+                       -> the run's result as JSON, or with "stream": true an
+                          NDJSON stream of delta events ending with a result event;
+                          "context_video_id" answers a follow-up about that video;
+                          "timeout" (seconds, queueing included) overrides FLOW_TIMEOUT
+        GET  /healthz  -> queue and worker status
+        GET  /metrics  -> metrics.registry in the Prometheus text format
+
+    A fixed pool of workers takes requests from a bounded queue, so load beyond
+    capacity is rejected quickly (503 + Retry-After) instead of piling up tasks.
+    A request whose client disconnects before its result is ready has its flow cancelled.
+    """
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS,
+                 queue_size=SERVER_QUEUE_SIZE):
+        self.host = host
+        self.port = port
+        self.worker_count = max(1, workers)
+        self.queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.active = 0
+        self._workers = []
+        self._server = None
+
+    async def start(self):
+        await self._warm_up()
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.worker_count)]
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        print(f"Serving on http://{self.host}:{self.port} ({self.worker_count} workers, queue {self.queue.maxsize})")
+
+    async def _warm_up(self):
+        # Nodes and the clients they use are loaded on first use; load them now, off
+        # the loop, so the first requests do not stall the loop (and /healthz) on imports.
+        flow = get_flow()
+        await asyncio.to_thread(_load_nodes, flow)
+        if has_api_key():
+            get_client()
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    # --- Workers ---
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.result.done():
+                    continue  # The client went away while the job was queued.
+                metrics.registry.observe("server_queue_wait_seconds", time.perf_counter() - job.enqueued_at)
+                self.active += 1
+                job.task = asyncio.ensure_future(self._execute(job))
+                # wait() rather than await: a cancelled job must not stop the worker.
+                await asyncio.wait([job.task])
+            finally:
+                if job.task is not None:
+                    self.active -= 1
+                self.queue.task_done()
+
+    async def _execute(self, job):
+        try:
+            if job.events is None:
+                store = await run_agent_flow(job.user_input, use_cache=job.use_cache,
+                                             context_video_id=job.context_video_id, timeout=job.time_left())
+                job.result.set_result(result_record(store))
+                return
+            async for event in stream_agent_flow(job.user_input, use_cache=job.use_cache,
+                                               context_video_id=job.context_video_id, timeout=job.time_left()):
+                if event["type"] == "done":
+                    event = {"type": "result", **result_record(event["store"])}
+                job.events.put_nowait(event)
+            job.result.set_result(None)
+        except asyncio.CancelledError:
+            if not job.result.done():
+                job.result.cancel()
+            raise
+        except Exception as e:
+            print(f"Server: Unexpected error while running a flow: {e}")
+            if job.events is not None:
+                job.events.put_nowait({"type": "error", "error": f"Unexpected error: {e}"})
+                job.result.set_result(None)
+            elif not job.result.done():
+                job.result.set_exception(e)
+        finally:
+            if job.events is not None:
+                job.events.put_nowait(None)
+
+    # --- HTTP ---
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), SERVER_KEEPALIVE_TIMEOUT)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    keep_alive = await self._dispatch(method, path, body, reader, writer, keep_alive)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": str(e)}, keep_alive=keep_alive,
+                                          headers={"Retry-After": str(SERVER_RETRY_AFTER)} if e.status == 503 else None)
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(400, "Chunked request bodies are not supported; send Content-Length.")
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length.")
+        if length > SERVER_MAX_BODY_BYTES:
+            raise HTTPError(413, f"Request body exceeds {SERVER_MAX_BODY_BYTES} bytes.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def _dispatch(self, method, path, body, reader, writer, keep_alive):
+        """
+        Answers one request. Returns whether the connection can be kept alive.
+        """
+        if path == "/healthz":
+            if method != "GET":
+                raise HTTPError(405, "Use GET.")
+            await self._send_json(writer, 200, {
+                "status": "ok",
+                "workers": self.worker_count,
+                "active": self.active,
+                "queued": self.queue.qsize(),
+                "queue_size": self.queue.maxsize,
+            }, keep_alive=keep_alive)
+        elif path == "/metrics":
+            if method != "GET":
+                raise HTTPError(405, "Use GET.")
+            await self._send(writer, 200, metrics.registry.to_prometheus().encode("utf-8"),
+                             "text/plain; version=0.0.4", keep_alive=keep_alive)
+        elif path == "/run":
+            if method != "POST":
+                raise HTTPError(405, "Use POST.")
+            return await self._run(body, reader, writer, keep_alive)
+        else:
+            raise HTTPError(404, f"Unknown path: {path}")
+        return keep_alive
+
+    async def _wait_for_result(self, job, reader):
+        """
+        Waits for a non-streamed job, watching the connection meanwhile. Returns
+        "done", "disconnected" if the client closed the connection first, or
+        "pipelined" if it sent more data (which is then lost, so the connection
+        is closed after the response).
+        """
+        watch = asyncio.ensure_future(reader.read(1))
+        try:
+            await asyncio.wait([job.result, watch], return_when=asyncio.FIRST_COMPLETED)
+            if job.result.done() or not watch.done():
+                return "done"
+            if watch.cancelled() or watch.exception() is not None or watch.result() == b"":
+                return "disconnected"
+            return "pipelined"
+        finally:
+            watch.cancel()
+
+    async def _run(self, body, reader, writer, keep_alive):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Request body must be JSON.")
+        user_input = request.get("input") if isinstance(request, dict) else None
+        if not isinstance(user_input, str) or not user_input.strip():
+            raise HTTPError(400, "Missing 'input'.")
+
+        context_video_id = request.get("context_video_id")
+        if context_video_id is not None and not isinstance(context_video_id, str):
+            raise HTTPError(400, "'context_video_id' must be a string.")
+
+        timeout = request.get("timeout", FLOW_TIMEOUT)
+        if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout < 0:
+            raise HTTPError(400, "'timeout' must be a non-negative number of seconds.")
+
+        job = Job(user_input, request.get("use_cache", True) is not False, bool(request.get("stream")),
+                  context_video_id or None, float(timeout))
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            metrics.registry.inc("server_requests_total", status="rejected")
+            raise HTTPError(503, "Server is at capacity, retry later.")
+
+        try:
+            if job.events is None:
+                state = await self._wait_for_result(job, reader)
+                if state == "disconnected":
+                    print("Server: Client disconnected, cancelling its flow.")
+                    metrics.registry.inc("server_requests_total", status="disconnected")
+                    return False
+                keep_alive = keep_alive and state == "done"
+                try:
+                    record = await job.result
+                except Exception as e:
+                    metrics.registry.inc("server_requests_total", status="error")
+                    raise HTTPError(500, f"Unexpected error: {e}")
+                metrics.registry.inc("server_requests_total", status=record["status"])
+                await self._send_json(writer, 200, record, keep_alive=keep_alive)
+            else:
+                await self._stream_events(job, writer)
+                metrics.registry.inc("server_requests_total", status="streamed")
+            return keep_alive
+        finally:
+            # Stop work nobody is waiting for any more (e.g. the client disconnected).
+            if not job.result.done():
+                job.result.cancel()
+            if job.task is not None:
+                job.task.cancel()
+
+    async def _stream_events(self, job, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+            b"Transfer-Encoding: chunked\r\nCache-Control: no-cache\r\n\r\n"
+        )
+        await writer.drain()
+        while True:
+            event = await job.events.get()
+            if event is None:
+                break
+            data = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _send_json(self, writer, status, payload, keep_alive=True, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, data, "application/json", keep_alive, headers)
+
+    async def _send(self, writer, status, data, content_type, keep_alive=True, headers=None):
+        lines = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(data)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="HTTP server for the AI Research Assistant Agent")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Flows running at once.")
+    parser.add_argument("--queue-size", type=int, default=SERVER_QUEUE_SIZE, help="Requests waiting before 503s.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = AgentServer(args.host, args.port, args.workers, args.queue_size)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
@@ -1,10 +1,163 @@
 # shared_store.py
+import copy
+import hashlib
+import mmap
+import os
+import tempfile
+import threading
+import weakref
+import config
+
+# Strings larger than this many bytes (UTF-8) are kept in memory-mapped temp files
+# instead of on the Python heap. 0 disables spilling.
+SPILL_THRESHOLD = int(os.getenv("STORE_SPILL_THRESHOLD", str(64 * 1024)))
+SPILL_DIR = os.getenv("STORE_SPILL_DIR") or None  # None: the system temp directory
+
+# Keys the nodes and Flow use; these live in slots rather than a per-store dict.
+KNOWN_KEYS = (
+    "input",
+    "input_type",
+    "processed_input",
+    "transcript",
+    "video_ids",
+    "video_results",
+    "context_video_id",
+    "retrieved_context",
+    "user_intent",
+    "intent_source",
+    "summary",
+    "insights",
+    "generated_code",
+    "math_solution",
+    "math_solver_reasoning",
+    "math_solver_source",
+    "final_result",
+    "error",
+    "use_cache",
+    "deadline",
+    "partial",
+    "stream",
+    "trace",
+)
+_SLOTTED = frozenset(KNOWN_KEYS)
+
+
+class SpilledText:
+    """
+    A large string stored in an unlinked, memory-mapped temp file. The kernel can
+    page it out under memory pressure; it is decoded again on every read.
+    Identical texts share one SpilledText (see spill), and the file is released
+    once no store refers to it any more.
+    """
+    __slots__ = ("size", "_map", "__weakref__")
+
+    def __init__(self, data):
+        self.size = len(data)
+        with tempfile.TemporaryFile(dir=SPILL_DIR) as f:
+            f.write(data)
+            f.flush()
+            self._map = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+        weakref.finalize(self, self._map.close)
+
+    def text(self):
+        return self._map[:].decode("utf-8")
+
+
+_spilled = weakref.WeakValueDictionary()  # sha256 digest -> SpilledText
+_spill_lock = threading.Lock()
+
+
+def spill(data):
+    """
+    Returns the SpilledText holding the UTF-8 bytes 'data', reusing an existing one
+    with the same content, so a transcript shared by many concurrent runs is stored once.
+    """
+    digest = hashlib.sha256(data).digest()
+    with _spill_lock:
+        spilled = _spilled.get(digest)
+        if spilled is None:
+            spilled = _spilled[digest] = SpilledText(data)
+        return spilled
+
+
 class SharedStore:
+    """
+    Per-run key/value store shared by the nodes of a Flow.
+    Known keys are held in slots, anything else in a small overflow dict. Strings
+    above SPILL_THRESHOLD bytes are spilled to memory-mapped storage (see SpilledText).
+    Values are stored by reference, never copied; release() drops intermediates
+    that no remaining node needs (Graph.run does this as nodes finish).
+    """
+    __slots__ = KNOWN_KEYS + ("_extra",)
+
     def __init__(self):
-        self.memory = {}
+        self._extra = None
 
     def set(self, key, value):
-        self.memory[key] = value
+        # A str takes at most 4 bytes per character in UTF-8, so shorter ones are never encoded.
+        if SPILL_THRESHOLD and isinstance(value, str) and len(value) * 4 > SPILL_THRESHOLD:
+            data = value.encode("utf-8")
+            if len(data) > SPILL_THRESHOLD:
+                value = spill(data)
+        if key in _SLOTTED:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def _raw(self, key, default=None):
+        if key in _SLOTTED:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra else default
 
     def get(self, key):
-        return self.memory.get(key)
+        value = self._raw(key)
+        return value.text() if isinstance(value, SpilledText) else value
+
+    def release(self, key):
+        """
+        Drops 'key' from the store, if present.
+        """
+        if key in _SLOTTED:
+            if hasattr(self, key):
+                delattr(self, key)
+        elif self._extra:
+            self._extra.pop(key, None)
+
+    def keys(self):
+        known = [key for key in KNOWN_KEYS if hasattr(self, key)]
+        return known + list(self._extra or ())
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def copy(self):
+        """
+        Returns an independent store with the same values. Strings (spilled or not)
+        are immutable and shared; mutable values such as the trace are deep-copied.
+        """
+        other = SharedStore()
+        for key in self.keys():
+            value = self._raw(key)
+            if isinstance(value, (dict, list)):
+                value = copy.deepcopy(value)
+            if key in _SLOTTED:
+                setattr(other, key, value)
+            else:
+                other.set(key, value)
+        return other
+
+    def spilled_bytes(self):
+        """
+        Total size of this store's values held in memory-mapped storage.
+        """
+        return sum(value.size for value in map(self._raw, self.keys()) if isinstance(value, SpilledText))
+
+    @property
+    def memory(self):
+        """
+        A dict snapshot of all values (kept for code written against the old
+        dict-backed store). Changing it does not change the store.
+        """
+        return {key: self.get(key) for key in self.keys()}
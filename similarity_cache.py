@@ -0,0 +1,252 @@
+# similarity_cache.py
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from difflib import SequenceMatcher
+import config
+
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "1") not in ("0", "false", "False")
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.getenv("SIMILARITY_CACHE_MAX_ENTRIES", "10000"))
+SIMILARITY_CACHE_TTL = float(os.getenv("SIMILARITY_CACHE_TTL", str(24 * 3600)))
+# Minimum estimated Jaccard similarity for a hit, by the intent of the stored request;
+# 1.0 means an exact match (up to case, whitespace and sentence punctuation). Code and
+# math are exact: "below n" is not "above n", and "2+3" is not "2+4". Fuzzy hits also
+# need the same numbers and may differ only in filler words and spellings (see
+# _same_words), so "least important" never matches "most important".
+DEFAULT_THRESHOLDS = {
+    "summarize": 0.75,
+    "insights": 0.75,
+    "general_query": 1.0,
+    "code_generation": 1.0,
+    "math_query": 1.0,
+}
+SIMILARITY_THRESHOLDS = {**DEFAULT_THRESHOLDS, **json.loads(os.getenv("SIMILARITY_THRESHOLDS", "{}"))}
+# Prompts longer than this only match exactly (after normalization); MinHash is
+# computed for shorter ones, where rewording is common and hashing is cheap.
+MAX_FUZZY_CHARS = int(os.getenv("SIMILARITY_MAX_FUZZY_CHARS", "2000"))
+
+NUM_HASHES = 64
+BANDS = 16  # 16 bands of 4 rows: pairs above ~0.7 similarity almost always share a band.
+ROWS = NUM_HASHES // BANDS
+SHINGLE_CHARS = 5
+
+_rng = random.Random(20240601)
+_MASKS = [_rng.getrandbits(64) for _ in range(NUM_HASHES)]
+# Sentence punctuation is ignored for fuzzy matching; operators are kept.
+_PUNCTUATION = re.compile(r"[^\w\s+\-*/^=<>%]")
+# Punctuation ending a sentence or clause, ignored by exact matches too. Not "!" after
+# a digit ("what is 5!" is not "what is 5"); commas are kept ("f(x, y)").
+_SENTENCE_PUNCTUATION = re.compile(r"(?:[.?;:]|(?<![\d!])!)+(?=\s|$)")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_SPACES = re.compile(r"\s+")
+# Words whose presence does not change a request, for fuzzy matches.
+FILLER_WORDS = frozenset(
+    "a an the please kindly just me us can could would you this that these those of for about "
+    "give provide show tell".split()
+)
+# Words of two fuzzy-matched prompts with at least this similarity are spellings of
+# the same word ("summarise" / "summarize").
+SPELLING_RATIO = 0.8
+
+
+def normalize(text):
+    """
+    Lowercases, drops sentence punctuation and collapses whitespace. Other
+    punctuation is kept (it matters for math and code).
+    """
+    return _SPACES.sub(" ", _SENTENCE_PUNCTUATION.sub("", text.lower())).strip()
+
+
+def _fuzzy_text(normalized):
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", normalized)).strip()
+
+
+def _numbers(normalized):
+    # Prompts that differ in any number ("3 bullet points" vs "5") never match.
+    return tuple(_NUMBER.findall(normalized))
+
+
+def _same_words(a, b):
+    """
+    True if the word sets 'a' and 'b' differ only in filler words and spellings.
+    """
+    only_a = [word for word in a - b if word not in FILLER_WORDS]
+    only_b = [word for word in b - a if word not in FILLER_WORDS]
+    for words, others in ((only_a, only_b), (only_b, only_a)):
+        for word in words:
+            if not any(SequenceMatcher(None, word, other).ratio() >= SPELLING_RATIO for other in others):
+                return False
+    return True
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(text):
+    """
+    MinHash signature of the character shingles of 'text' (already normalized).
+    The share of equal positions in two signatures estimates their Jaccard similarity.
+    """
+    if len(text) <= SHINGLE_CHARS:
+        shingles = {_hash64(text)}
+    else:
+        shingles = {_hash64(text[i:i + SHINGLE_CHARS]) for i in range(len(text) - SHINGLE_CHARS + 1)}
+    return tuple(min(h ^ mask for h in shingles) for mask in _MASKS)
+
+
+def similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / NUM_HASHES
+
+
+class SimilarityCache:
+    """
+    Remembers the results of past text requests and finds repeats of new ones
+    (the same text up to whitespace, casing and sentence punctuation). For intents
+    with a 'thresholds' entry below 1.0 it also finds near-duplicates (other
+    punctuation, filler words or spellings, but the same numbers) through a MinHash
+    locality-sensitive-hashing index: only entries that share a band of their
+    signature are compared, so lookups do not scan the whole cache.
+    Entries expire after 'ttl' seconds; the least recently used are evicted beyond
+    'max_entries'.
+    """
+    def __init__(self, max_entries=SIMILARITY_CACHE_MAX_ENTRIES, ttl=SIMILARITY_CACHE_TTL,
+                 thresholds=SIMILARITY_THRESHOLDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.thresholds = thresholds
+        # MinHash signatures are only computed when some intent matches fuzzily.
+        self.fuzzy = any(threshold < 1.0 for threshold in thresholds.values())
+        self._entries = OrderedDict()  # entry id -> entry dict
+        self._exact = {}  # sha256 of the normalized text -> entry id
+        self._bands = {}  # (band number, band values) -> set of entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _exact_key(normalized):
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _band_keys(signature):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+    def _signature(self, normalized):
+        """
+        Returns (MinHash signature, word set) of the fuzzy text, or (None, None)
+        when the text only matches exactly.
+        """
+        if not self.fuzzy or len(normalized) > MAX_FUZZY_CHARS:
+            return None, None
+        fuzzy = _fuzzy_text(normalized)
+        if not fuzzy:
+            return None, None
+        return minhash(fuzzy), frozenset(fuzzy.split())
+
+    def lookup(self, text):
+        """
+        Returns (result, similarity) for the best stored request similar enough to
+        'text' (per the threshold of the stored request's intent), or None.
+        """
+        normalized = normalize(text)
+        signature, words = self._signature(normalized)
+        numbers = _numbers(normalized)
+        now = time.time()
+        with self._lock:
+            entry_id = self._exact.get(self._exact_key(normalized))
+            if entry_id is not None and self._entries[entry_id]["expires_at"] > now:
+                self._entries.move_to_end(entry_id)
+                return self._entries[entry_id]["result"], 1.0
+            if signature is None:
+                return None
+
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates |= self._bands.get(key, set())
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                entry = self._entries[candidate]
+                if entry["expires_at"] <= now or entry["numbers"] != numbers:
+                    continue
+                score = similarity(signature, entry["signature"])
+                threshold = self.thresholds.get(entry["intent"], 1.0)
+                if threshold >= 1.0:
+                    continue  # Exact-only intents were checked above.
+                if score >= threshold and score > best_score and _same_words(words, entry["words"]):
+                    best, best_score = candidate, score
+            if best is None:
+                return None
+            self._entries.move_to_end(best)
+            return self._entries[best]["result"], best_score
+
+    def add(self, text, intent, result):
+        """
+        Stores 'result' (a dict of store values) for the request 'text' of 'intent'.
+        """
+        normalized = normalize(text)
+        signature, words = self._signature(normalized)
+        exact_key = self._exact_key(normalized)
+        with self._lock:
+            old = self._exact.get(exact_key)
+            if old is not None:
+                self._remove(old)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "intent": intent,
+                "exact_key": exact_key,
+                "signature": signature,
+                "words": words,
+                "numbers": _numbers(normalized),
+                "result": result,
+                "expires_at": time.time() + self.ttl,
+            }
+            self._exact[exact_key] = entry_id
+            if signature is not None:
+                for key in self._band_keys(signature):
+                    self._bands.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        if self._exact.get(entry["exact_key"]) == entry_id:
+            del self._exact[entry["exact_key"]]
+        if entry["signature"] is not None:
+            for key in self._band_keys(entry["signature"]):
+                ids = self._bands.get(key)
+                if ids is not None:
+                    ids.discard(entry_id)
+                    if not ids:
+                        del self._bands[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._exact.clear()
+            self._bands.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_similarity_cache():
+    """
+    Returns the process-wide SimilarityCache, or None when it is disabled.
+    """
+    global _cache
+    if not SIMILARITY_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SimilarityCache()
+        return _cache
@@ -0,0 +1,77 @@
+# singleflight.py
+import asyncio
+import contextvars
+import os
+import weakref
+import config
+
+import metrics
+
+SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") not in ("0", "false", "False")
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "shared")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+        self.shared = False
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the work,
+    later callers with that key wait for the same result instead of repeating it.
+    Once the call finishes the key is forgotten, so this deduplicates in-flight work
+    only (caching is done elsewhere). The work is cancelled only when every waiter
+    has gone away. It runs in an empty context, so it does not inherit the context
+    variables (such as the deadline and metrics span) of whichever caller started
+    it: each caller applies its own bound to the wait.
+    """
+    def __init__(self, name):
+        self.name = name
+        # In-flight calls per event loop (tasks are loop-bound): loop -> {key: _Call}
+        self._calls = weakref.WeakKeyDictionary()
+
+    async def do(self, key, fn, copy=None, timeout=None):
+        """
+        Returns the result of 'await fn()', sharing it with concurrent calls for 'key'.
+        If the call was shared and 'copy' is given, each caller gets copy(result)
+        instead of the shared object. A caller that joins a call started by another
+        waits at most 'timeout' seconds for it (then raises asyncio.TimeoutError);
+        the caller that started it waits for the work itself.
+        """
+        if not SINGLEFLIGHT_ENABLED:
+            return await fn()
+
+        loop = asyncio.get_running_loop()
+        calls = self._calls.get(loop)
+        if calls is None:
+            calls = self._calls[loop] = {}
+        call = calls.get(key)
+        if call is None:
+            call = calls[key] = _Call(contextvars.Context().run(asyncio.ensure_future, fn()))
+            call.task.add_done_callback(lambda _: calls.pop(key, None) if calls.get(key) is call else None)
+            timeout = None
+        else:
+            call.shared = True
+            metrics.registry.inc("singleflight_shared_total", flight=self.name)
+
+        call.waiters += 1
+        try:
+            result = await asyncio.wait_for(asyncio.shield(call.task), timeout)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Every caller was cancelled: stop the work and let new callers start afresh.
+                if calls.get(key) is call:
+                    del calls[key]
+                call.task.cancel()
+        return copy(result) if copy is not None and call.shared else result
+
+    def in_flight(self):
+        """
+        Number of calls currently running on this event loop.
+        """
+        return len(self._calls.get(asyncio.get_running_loop(), ()))
@@ -0,0 +1,48 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Settings are read when modules are imported, so they are set before any test
+# module imports them: caches and checkpoints go to a scratch directory, and the
+# caches that would answer repeated test prompts are off.
+_CACHE_DIR = tempfile.mkdtemp(prefix="agent-tests-")
+os.environ.update(
+    OPENAI_API_KEY="test-key",
+    LLM_CACHE_DIR=_CACHE_DIR,
+    LLM_CACHE_ENABLED="0",
+    TRANSCRIPT_CACHE_ENABLED="0",
+    SIMILARITY_CACHE_ENABLED="0",
+    INTENT_MODEL_PATH=os.path.join(_CACHE_DIR, "intent_model.json"),
+)
+
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    """
+    The benchmarks' OpenAI stand-in, serving every LLM call of the session.
+    """
+    from benchmarks.fake_openai_server import FakeOpenAIServer
+
+    server = FakeOpenAIServer(latency=0.01, tokens_per_second=10000).start_in_thread()
+    os.environ["OPENAI_BASE_URL"] = server.base_url
+    return server
+
+
+@pytest.fixture
+def fake_transcripts():
+    """
+    Replaces YouTube with the benchmarks' fake transcript source for one test.
+    """
+    from benchmarks.fake_transcripts import FakeTranscriptSource
+    from nodes.youtube import set_transcript_source
+
+    source = FakeTranscriptSource(latency=0.01, words=500)
+    set_transcript_source(source)
+    yield source
+    set_transcript_source(None)
@@ -0,0 +1,99 @@
+# tests/test_checkpoint.py
+import asyncio
+import threading
+
+import pytest
+
+from checkpoint import CheckpointStore, checkpoint_key, completed
+from graph import DEADLINE_EXCEEDED
+
+
+@pytest.fixture
+def checkpoints(tmp_path):
+    return CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+
+
+@pytest.mark.parametrize("action, done", [
+    ("url", True), ("default", True), ("summarize", True),
+    ("error", False), ("partial", False), (DEADLINE_EXCEEDED, False),
+    ("fetch_failed", False), ("summary_timeout", False), (None, False),
+])
+def test_completed(action, done):
+    assert completed(action) is done
+
+
+def test_checkpoint_key():
+    assert checkpoint_key("summarize  this\nvideo ") == checkpoint_key("summarize this video")
+    assert checkpoint_key("summarize it") != checkpoint_key("summarize it", context_video_id="AAAAAAAAAAA")
+    assert checkpoint_key("summarize it", "AAAAAAAAAAA") != checkpoint_key("summarize it", "BBBBBBBBBBB")
+
+
+def test_saves_add_values_incrementally(checkpoints):
+    checkpoints.save("k", {"InputDetector": "url"}, {"transcript": "words " * 1000}, ["transcript"])
+    checkpoints.save("k", {"InputDetector": "url", "Summarizer": "default"}, {"summary": "short"},
+                     ["summary", "transcript"])
+    outcomes, values = checkpoints.load("k")
+    assert outcomes == {"InputDetector": "url", "Summarizer": "default"}
+    assert values == {"transcript": "words " * 1000, "summary": "short"}
+    assert checkpoints.load("other") is None
+
+
+def test_discard_removes_the_record_and_its_values(checkpoints):
+    checkpoints.save("k", {"InputDetector": "url"}, {"transcript": "t"}, ["transcript"])
+    checkpoints.discard("k").result()
+    assert checkpoints.load("k") is None
+    assert len(checkpoints.cache) == 0
+
+
+def test_a_checkpoint_with_an_evicted_value_is_ignored(checkpoints):
+    checkpoints.save("k", {"InputDetector": "url"}, {"transcript": "t", "video_info": {}},
+                     ["transcript", "video_info"]).result()
+    checkpoints.cache.delete(checkpoints._value_key("k", "transcript"))
+    assert checkpoints.load("k") is None
+
+
+def test_load_waits_for_queued_writes_of_its_key(checkpoints):
+    release = threading.Event()
+    checkpoints._writer.submit(release.wait)  # Holds the writer thread.
+    checkpoints.save("k", {"InputDetector": "url"}, {}, [])
+    loaded = []
+    reader = threading.Thread(target=lambda: loaded.append(checkpoints.load("k")))
+    reader.start()
+    reader.join(0.1)
+    assert reader.is_alive()
+    release.set()
+    reader.join(5)
+    assert loaded == [({"InputDetector": "url"}, {})]
+
+
+def test_a_retried_request_resumes_after_the_completed_nodes(fake_openai, fake_transcripts, monkeypatch):
+    from main import get_flow, run_agent_flow
+
+    node = get_flow().insights_node.node
+    execute = node.execute
+    failures = []
+
+    async def fails_once(store):
+        if not failures:
+            failures.append(True)
+            store.set("error", "insights failed")
+            return "insights_failed"
+        return await execute(store)
+
+    monkeypatch.setattr(node, "execute", fails_once)
+    url = "https://youtu.be/ckResume001"
+
+    first = asyncio.run(run_agent_flow(url))
+    assert first.get("insights") is None
+    assert fake_transcripts.calls == 1
+    requests = fake_openai.requests
+
+    second = asyncio.run(run_agent_flow(url))
+    assert second.get("insights")
+    assert second.get("summary") == first.get("summary")
+    assert second.get("error") is None
+    assert fake_transcripts.calls == 1  # The transcript came from the checkpoint.
+    assert fake_openai.requests == requests + 1  # Only the insights were generated.
+
+    asyncio.run(run_agent_flow(url))  # Completed runs leave no checkpoint behind.
+    assert fake_transcripts.calls == 2
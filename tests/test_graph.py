@@ -0,0 +1,198 @@
+# tests/test_graph.py
+import asyncio
+import time
+
+import pytest
+
+from graph import DEADLINE_EXCEEDED, Graph
+from shared_store import SharedStore
+
+
+class Step:
+    """
+    Graph node that sleeps 'delay' seconds, writes its name to its 'writes'
+    keys and returns 'action'. Records when it ran in 'log'.
+    """
+    def __init__(self, name, action="ok", delay=0.0, reads=(), writes=(), log=None):
+        self.name = name
+        self.action = action
+        self.delay = delay
+        self.reads = reads
+        self.writes = writes
+        self.log = log if log is not None else []
+
+    async def run(self, store):
+        started = time.monotonic()
+        await asyncio.sleep(self.delay)
+        for key in self.writes:
+            store.set(key, self.name)
+        self.log.append((self.name, started, time.monotonic()))
+        return self.action
+
+
+def build(steps, edges, start):
+    graph = Graph()
+    for step in steps:
+        graph.add_node(step, start=step.name == start)
+    for src, dst, on in edges:
+        graph.add_edge(src, dst, on=on)
+    graph.validate()
+    return graph
+
+
+def run(graph, store=None, **kwargs):
+    return asyncio.run(graph.run(store if store is not None else SharedStore(), **kwargs))
+
+
+def test_only_edges_matching_the_returned_action_fire():
+    log = []
+    graph = build(
+        [Step("detect", "text", log=log), Step("video", log=log), Step("prompt", log=log), Step("after_video", log=log)],
+        [("detect", "video", "url"), ("detect", "prompt", ("text", "other")), ("video", "after_video", "ok")],
+        "detect",
+    )
+    outcomes = run(graph)
+    assert outcomes == {"detect": "text", "prompt": "ok"}
+    assert [name for name, _, _ in log] == ["detect", "prompt"]
+
+
+def test_join_runs_when_one_branch_fired_and_the_other_was_skipped():
+    graph = build(
+        [Step("start", "a"), Step("a"), Step("b"), Step("join")],
+        [("start", "a", "a"), ("start", "b", "b"), ("a", "join", "ok"), ("b", "join", "ok")],
+        "start",
+    )
+    assert run(graph) == {"start": "a", "a": "ok", "join": "ok"}
+
+
+def test_node_waits_for_all_of_its_predecessors():
+    log = []
+    graph = build(
+        [Step("start", log=log), Step("fast", delay=0.01, log=log), Step("slow", delay=0.1, log=log), Step("join", log=log)],
+        [("start", "fast", "ok"), ("start", "slow", "ok"), ("fast", "join", "ok"), ("slow", "join", "ok")],
+        "start",
+    )
+    run(graph)
+    times = {name: (started, finished) for name, started, finished in log}
+    assert times["join"][0] >= times["slow"][1]
+
+
+def test_independent_branches_run_concurrently():
+    graph = build(
+        [Step("start"), Step("a", delay=0.2), Step("b", delay=0.2), Step("c", delay=0.2)],
+        [("start", "a", "ok"), ("start", "b", "ok"), ("start", "c", "ok")],
+        "start",
+    )
+    started = time.monotonic()
+    outcomes = run(graph)
+    assert time.monotonic() - started < 0.4
+    assert set(outcomes) == {"start", "a", "b", "c"}
+
+
+def test_done_nodes_are_not_run_again_but_their_edges_fire():
+    log = []
+    graph = build(
+        [Step("start", "x", log=log), Step("middle", log=log), Step("end", log=log)],
+        [("start", "middle", "x"), ("middle", "end", "ok")],
+        "start",
+    )
+    outcomes = run(graph, done={"start": "x", "middle": "ok", "removed_node": "ok"})
+    assert [name for name, _, _ in log] == ["end"]
+    assert outcomes == {"start": "x", "middle": "ok", "end": "ok"}
+
+
+def test_intermediate_values_are_released_once_no_node_reads_them():
+    graph = build(
+        [Step("start", writes=("transcript",)),
+         Step("summarize", reads=("transcript",), writes=("summary",)),
+         Step("insights", reads=("summary",), writes=("insights",))],
+        [("start", "summarize", "ok"), ("summarize", "insights", "ok")],
+        "start",
+    )
+    store = SharedStore()
+    store.set("input", "kept")
+    run(graph, store, keep=("summary", "insights"))
+    assert store.get("transcript") is None
+    assert store.get("summary") == "summarize"
+    assert store.get("insights") == "insights"
+    assert store.get("input") == "kept"
+
+
+def test_on_progress_sees_every_finished_node():
+    seen = []
+    graph = build([Step("start"), Step("next")], [("start", "next", "ok")], "start")
+    run(graph, on_progress=lambda outcomes: seen.append(dict(outcomes)))
+    assert seen == [{"start": "ok"}, {"start": "ok", "next": "ok"}]
+
+
+def test_deadline_cancels_overdue_nodes_and_skips_the_rest():
+    log = []
+    graph = build(
+        [Step("start", log=log), Step("hung", delay=10, log=log), Step("quick", log=log), Step("after", log=log)],
+        [("start", "hung", "ok"), ("start", "quick", "ok"), ("hung", "after", "ok")],
+        "start",
+    )
+    started = time.monotonic()
+    outcomes = run(graph, deadline=started + 0.1, grace=0.05)
+    assert time.monotonic() - started < 1
+    assert outcomes["hung"] == DEADLINE_EXCEEDED
+    assert outcomes["quick"] == "ok"
+    assert "after" not in outcomes
+    assert "hung" not in [name for name, _, _ in log]
+
+
+def test_nodes_ready_after_the_deadline_are_not_started():
+    graph = build([Step("start", delay=0.1), Step("next")], [("start", "next", "ok")], "start")
+    outcomes = run(graph, deadline=time.monotonic() + 0.05, grace=1)
+    assert outcomes == {"start": "ok", "next": DEADLINE_EXCEEDED}
+
+
+def test_validate_rejects_cycles():
+    graph = Graph()
+    for name in ("a", "b"):
+        graph.add_node(Step(name), start=name == "a")
+    graph.add_edge("a", "b", on="ok")
+    graph.add_edge("b", "a", on="ok")
+    with pytest.raises(ValueError, match="cycle"):
+        graph.validate()
+
+
+def test_validate_rejects_concurrent_writers_of_a_key():
+    graph = Graph()
+    graph.add_node(Step("start"), start=True)
+    graph.add_node(Step("a", writes=("summary",)))
+    graph.add_node(Step("b", writes=("summary",)))
+    graph.add_edge("start", "a", on="ok")
+    graph.add_edge("start", "b", on="ok")
+    with pytest.raises(ValueError, match="summary"):
+        graph.validate()
+
+
+def test_validate_allows_writers_on_mutually_exclusive_branches():
+    graph = build(
+        [Step("start"), Step("a", writes=("summary", "error")), Step("b", writes=("summary", "error"))],
+        [("start", "a", "left"), ("start", "b", "right")],
+        "start",
+    )
+    assert graph.mutually_exclusive("a", "b")
+
+
+def test_edges_and_nodes_are_checked_when_added():
+    graph = Graph()
+    graph.add_node(Step("a"), start=True)
+    with pytest.raises(ValueError, match="Duplicate"):
+        graph.add_node(Step("a"))
+    with pytest.raises(ValueError, match="Unknown node"):
+        graph.add_edge("a", "missing", on="ok")
+    with pytest.raises(ValueError, match="no start node"):
+        Graph().validate()
+
+
+@pytest.mark.parametrize("routing_mode", ["two_step", "single_call"])
+@pytest.mark.parametrize("parallel_insights", [False, True])
+def test_flow_graphs_validate(routing_mode, parallel_insights):
+    from flow import Flow
+
+    graph = Flow(parallel_insights=parallel_insights, routing_mode=routing_mode).graph
+    assert graph.start == "InputDetector"
+    assert graph.mutually_exclusive("YouTubeFetcher", "IntentClassifier")
@@ -0,0 +1,119 @@
+# tests/test_llm_cache.py
+import asyncio
+import itertools
+import os
+from types import SimpleNamespace
+
+import disk_cache
+from disk_cache import DiskCache
+from llm_cache import LLMCache
+
+
+def completion(text):
+    from openai.types.chat import ChatCompletion
+
+    return ChatCompletion.model_validate({
+        "id": "test", "created": 0, "model": "gpt-3.5-turbo", "object": "chat.completion",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+    })
+
+
+def use_clock(monkeypatch):
+    # Distinct, increasing access times, so LRU order does not depend on timer resolution.
+    ticks = itertools.count(1000)
+    monkeypatch.setattr(disk_cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_disk_cache_round_trip_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = DiskCache(path)
+    cache.set("a", b"value a")
+    assert cache.get("a") == b"value a"
+    assert cache.get("missing") is None
+
+    reopened = DiskCache(path)
+    assert reopened.get("a") == b"value a"
+    assert reopened.total_bytes() == cache.total_bytes() > 0
+
+
+def test_disk_cache_expires_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), default_ttl=3600)
+    cache.set("expired", b"x", ttl=0)
+    cache.set("fresh", b"y")
+    assert cache.get("expired") is None
+    assert cache.get("fresh") == b"y"
+    assert len(cache) == 1
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    use_clock(monkeypatch)
+    values = {key: os.urandom(1000) for key in "abc"}  # Incompressible: ~1000 bytes each.
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=2500)
+    cache.set("a", values["a"])
+    cache.set("b", values["b"])
+    assert cache.get("a") == values["a"]  # "b" is now the least recently used.
+    cache.set("c", values["c"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == values["a"]
+    assert cache.get("c") == values["c"]
+    assert cache.total_bytes() <= 2500
+
+
+def test_disk_cache_replacing_a_key_keeps_the_size_accurate(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    cache.set("a", os.urandom(1000))
+    cache.set("a", os.urandom(10))
+    cache.delete("missing")
+    assert cache.total_bytes() < 100
+    cache.delete("a")
+    assert cache.total_bytes() == 0
+
+
+def test_make_key_ignores_transport_options():
+    params = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.2}
+    key = LLMCache.make_key(params)
+    assert LLMCache.make_key({**params, "stream": True, "timeout": 5}) == key
+    assert LLMCache.make_key(dict(reversed(list(params.items())))) == key
+    assert LLMCache.make_key({**params, "temperature": 0.3}) != key
+    assert LLMCache.make_key({**params, "messages": [{"role": "user", "content": "hello"}]}) != key
+
+
+def test_memory_tier_evicts_least_recently_used():
+    async def scenario():
+        cache = LLMCache(max_entries=2)
+        for key in ("a", "b"):
+            await cache.set(key, completion(key))
+        assert await cache.get("a") is not None  # "b" is now the least recently used.
+        await cache.set("c", completion("c"))
+        return [await cache.get(key) for key in ("a", "b", "c")], cache.stats()
+
+    (a, b, c), stats = asyncio.run(scenario())
+    assert b is None
+    assert a.choices[0].message.content == "a"
+    assert c.choices[0].message.content == "c"
+    assert stats["memory_entries"] == 2
+    assert stats["misses"] == 1
+
+
+def test_disk_tier_answers_after_memory_eviction(tmp_path):
+    async def scenario():
+        cache = LLMCache(max_entries=1, disk_path=str(tmp_path / "llm.sqlite3"))
+        await cache.set("a", completion("first"))
+        await cache.set("b", completion("second"))  # Evicts "a" from memory only.
+        found = await cache.get("a")
+        return found, cache.stats()
+
+    found, stats = asyncio.run(scenario())
+    assert found.choices[0].message.content == "first"
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 0
+
+
+def test_expired_memory_entries_miss():
+    async def scenario():
+        cache = LLMCache(ttl=-1)
+        await cache.set("a", completion("a"))
+        return await cache.get("a")
+
+    assert asyncio.run(scenario()) is None
@@ -0,0 +1,175 @@
+# tests/test_rate_limiter.py
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+import rate_limiter
+from rate_limiter import MAX_RETRIES, ModelLimiter, TokenBucket, estimate_request_tokens, parse_duration
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def api_error(status, headers=None, code=None):
+    request = httpx.Request("POST", "https://api.openai.test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    body = {"code": code} if code else None  # The SDK passes the inner "error" object.
+    return openai.APIStatusError("error", response=response, body=body)
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1h2m", 3720.0), ("2.5", 2.5), ("", None), ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    if seconds is None:
+        assert parse_duration(value) is None
+    else:
+        assert parse_duration(value) == pytest.approx(seconds)
+
+
+def test_estimate_counts_prompt_and_completion_budget():
+    params = {"messages": [{"role": "user", "content": "word " * 100}], "max_tokens": 50}
+    assert estimate_request_tokens(params) > 100 + 50
+    assert estimate_request_tokens({"messages": []}) == rate_limiter.DEFAULT_COMPLETION_ESTIMATE
+
+
+def test_token_bucket_refills_evenly_up_to_its_capacity(clock):
+    bucket = TokenBucket(60)  # One unit per second.
+    bucket.take(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now += 30
+    assert bucket.wait_time(30) == 0
+    assert bucket.wait_time(31) == pytest.approx(1.0)
+    clock.now += 1000
+    bucket.take(0)
+    assert bucket.level == 60
+
+
+def test_token_bucket_oversized_requests_wait_for_a_full_bucket(clock):
+    bucket = TokenBucket(60)
+    bucket.take(30)
+    assert bucket.wait_time(1000) == pytest.approx(30.0)
+
+
+def test_observed_headers_replace_the_budgets(clock):
+    limiter = ModelLimiter("gpt-test", rpm=10, tpm=1000)
+    limiter.observe_headers({
+        "x-ratelimit-limit-requests": "500",
+        "x-ratelimit-limit-tokens": "90000",
+        "x-ratelimit-remaining-requests": "3",
+        "x-ratelimit-remaining-tokens": "not a number",
+    })
+    assert limiter.requests.capacity == 500
+    assert limiter.tokens.capacity == 90000
+    assert limiter.requests.level == 3
+
+
+def test_successes_grow_the_concurrency_limit_additively(clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10 ** 6)
+    start = limiter.limit
+    for _ in range(int(start)):
+        limiter.on_success(100, None)
+    assert start + 0.9 < limiter.limit < start + 1.01
+
+
+def test_usage_corrects_the_token_estimate(clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10000)
+    limiter.tokens.take(1000)
+    limiter.on_success(1000, SimpleNamespace(total_tokens=400))  # 600 fewer than estimated.
+    assert limiter.tokens.level == pytest.approx(9600)
+
+
+def test_429_halves_the_limit_once_per_burst_and_blocks_the_model(clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10 ** 6)
+    start = limiter.limit
+    delays = [limiter.retry_delay(api_error(429), attempt=0) for _ in range(3)]
+    assert limiter.limit == start / 2
+    assert limiter.blocked_until >= clock.now + max(delays) - 1e-9
+    clock.now += 2
+    limiter.retry_delay(api_error(429), attempt=0)
+    assert limiter.limit == start / 4
+
+
+def test_retry_after_headers_set_the_delay(clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10 ** 6)
+    delay = limiter.retry_delay(api_error(429, {"retry-after": "3"}), attempt=0)
+    assert 3 <= delay <= 3 + rate_limiter.BACKOFF_BASE
+    delay = limiter.retry_delay(api_error(503, {"retry-after-ms": "1500"}), attempt=0)
+    assert 1.5 <= delay <= 1.5 + rate_limiter.BACKOFF_BASE
+    delay = limiter.retry_delay(api_error(429, {"x-ratelimit-reset-requests": "2s", "x-ratelimit-reset-tokens": "6s"}), attempt=0)
+    assert 6 <= delay <= 6 + rate_limiter.BACKOFF_BASE
+
+
+def test_backoff_without_headers_is_bounded_and_jittered(clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10 ** 6)
+    for attempt in range(MAX_RETRIES):
+        delay = limiter.retry_delay(api_error(500), attempt)
+        assert 0 <= delay <= min(rate_limiter.BACKOFF_MAX, rate_limiter.BACKOFF_BASE * 2 ** attempt)
+
+
+@pytest.mark.parametrize("error, attempt", [
+    (api_error(400), 0),
+    (api_error(401), 0),
+    (api_error(429, code="insufficient_quota"), 0),
+    (api_error(500), MAX_RETRIES),
+    (ValueError("not an API error"), 0),
+])
+def test_errors_that_are_not_retried(error, attempt, clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10 ** 6)
+    assert limiter.retry_delay(error, attempt) is None
+
+
+def test_connection_errors_are_retried(clock):
+    limiter = ModelLimiter("gpt-test", rpm=1000, tpm=10 ** 6)
+    error = openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.test"))
+    assert limiter.retry_delay(error, 0) is not None
+
+
+def test_slots_respect_the_concurrency_limit():
+    async def scenario():
+        limiter = ModelLimiter("gpt-test", rpm=10 ** 6, tpm=10 ** 9)
+        limiter.limit = 2
+        running, peak = 0, 0
+
+        async def request():
+            nonlocal running, peak
+            async with limiter.slot(10):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(request() for _ in range(6)))
+        return peak, limiter.active
+
+    peak, active = asyncio.run(scenario())
+    assert peak == 2
+    assert active == 0
+
+
+def test_slots_wait_for_the_request_budget():
+    async def scenario():
+        limiter = ModelLimiter("gpt-test", rpm=600, tpm=10 ** 9)  # 10 requests per second.
+        limiter.requests.level = 0
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        async with limiter.slot(10):
+            pass
+        return loop.time() - started
+
+    assert 0.05 <= asyncio.run(scenario()) < 1
@@ -0,0 +1,115 @@
+# tests/test_similarity_cache.py
+from types import SimpleNamespace
+
+import pytest
+
+import similarity_cache
+from similarity_cache import DEFAULT_THRESHOLDS, SimilarityCache, normalize
+
+
+def cache_with(text, intent, thresholds=DEFAULT_THRESHOLDS, **kwargs):
+    cache = SimilarityCache(thresholds=thresholds, **kwargs)
+    cache.add(text, intent, {"answer": text})
+    return cache
+
+
+def test_normalize_ignores_case_spacing_and_sentence_punctuation():
+    assert normalize("  What is  2+2?! ") == "what is 2+2"
+    assert normalize("Summarize this video, please.") == "summarize this video, please"
+    assert normalize("what is 5!") == "what is 5!"  # Factorial, not an exclamation.
+    assert normalize("write f(x, y): return x") == "write f(x, y) return x"
+
+
+@pytest.mark.parametrize("intent", sorted(DEFAULT_THRESHOLDS))
+@pytest.mark.parametrize("stored, asked", [
+    ("What is 2+2?", "what is 2+2"),
+    ("Write a Python function to reverse a list.", "  write a python   function to reverse a list "),
+])
+def test_exact_repeats_hit_for_every_intent(intent, stored, asked):
+    assert cache_with(stored, intent).lookup(asked) == ({"answer": stored}, 1.0)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("what is 5!", "what is 5"),
+    ("what is 2+3", "what is 2+4"),
+    ("write a function that sorts a list", "write a function that sorts the list"),
+])
+def test_code_and_math_only_match_exactly(stored, asked):
+    for intent in ("code_generation", "math_query", "general_query"):
+        assert cache_with(stored, intent).lookup(asked) is None
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Summarize the most important points made in this lecture",
+     "Summarise the most important points made in this lecture."),
+    ("What are the key insights and takeaways from this interview",
+     "what are the key insights and take-aways from this interview?"),
+    ("Summarize the main points of this video", "please summarize the main points of this video"),
+])
+def test_rewordings_of_summaries_and_insights_hit(stored, asked):
+    result = cache_with(stored, "summarize").lookup(asked)
+    assert result is not None
+    assert result[0] == {"answer": stored}
+    assert DEFAULT_THRESHOLDS["summarize"] <= result[1] < 1.0
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("what are the most important points of the video", "what are the least important points of the video"),
+    ("summarize the part above the chart", "summarize the part below the chart"),
+    ("summarize the video in 3 bullet points", "summarize the video in 5 bullet points"),
+    ("insights that are relevant to beginners", "insights that are not relevant to beginners"),
+])
+def test_requests_with_a_different_meaning_miss(stored, asked):
+    assert cache_with(stored, "insights").lookup(asked) is None
+
+
+def test_fuzzy_matching_is_opt_in_per_intent():
+    text, reworded = "explain how photosynthesis works", "please explain how photosynthesis works"
+    assert cache_with(text, "general_query").lookup(reworded) is None
+    thresholds = {**DEFAULT_THRESHOLDS, "general_query": 0.6}
+    assert cache_with(text, "general_query", thresholds).lookup(reworded) is not None
+
+
+def test_exact_only_caches_skip_minhash():
+    cache = cache_with("summarize this video", "summarize", {"summarize": 1.0})
+    assert not cache.fuzzy
+    assert cache._bands == {}
+    assert cache.lookup("Summarize this video.") is not None
+
+
+def test_entries_expire(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(similarity_cache, "time", SimpleNamespace(time=lambda: clock.now))
+    cache = cache_with("summarize the main points of this video", "summarize", ttl=60)
+    clock.now += 59
+    assert cache.lookup("please summarize the main points of this video") is not None
+    clock.now += 2
+    assert cache.lookup("summarize the main points of this video") is None
+    assert cache.lookup("please summarize the main points of this video") is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = SimilarityCache(max_entries=2, thresholds=DEFAULT_THRESHOLDS)
+    cache.add("what is 1+1", "math_query", {"answer": 2})
+    cache.add("what is 2+2", "math_query", {"answer": 4})
+    assert cache.lookup("what is 1+1") is not None  # "2+2" is now the least recently used.
+    cache.add("what is 3+3", "math_query", {"answer": 6})
+    assert len(cache) == 2
+    assert cache.lookup("what is 2+2") is None
+    assert cache.lookup("what is 1+1") == ({"answer": 2}, 1.0)
+
+
+def test_adding_a_repeat_replaces_the_entry():
+    cache = cache_with("summarize the main points of this video", "summarize")
+    cache.add("Summarize the main points of this video.", "summarize", {"answer": "new"})
+    assert len(cache) == 1
+    assert cache.lookup("summarize the main points of this video") == ({"answer": "new"}, 1.0)
+    assert cache.lookup("please summarize the main points of this video")[0] == {"answer": "new"}
+
+
+def test_long_prompts_only_match_exactly():
+    text = "summarize " + "the video in detail " * 150
+    cache = cache_with(text, "summarize")
+    assert len(normalize(text)) > similarity_cache.MAX_FUZZY_CHARS
+    assert cache.lookup(text.upper()) is not None
+    assert cache.lookup("please " + text) is None
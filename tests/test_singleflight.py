@@ -0,0 +1,197 @@
+# tests/test_singleflight.py
+import asyncio
+
+import pytest
+
+import deadline
+import metrics
+from main import request_key
+from nodes.input_detector import InputDetector
+from shared_store import SharedStore
+from singleflight import SingleFlight
+
+
+class Work:
+    """
+    Counts its runs; each run waits for 'release' and returns the run number.
+    """
+    def __init__(self, error=None):
+        self.runs = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+        self.error = error
+
+    async def __call__(self):
+        self.runs += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return {"run": self.runs}
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        callers = [asyncio.ensure_future(flight.do("k", work, copy=dict)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.in_flight() == 1
+        work.release.set()
+        results = await asyncio.gather(*callers)
+        return work, results, flight.in_flight()
+
+    work, results, in_flight = asyncio.run(scenario())
+    assert work.runs == 1
+    assert results == [{"run": 1}] * 3
+    assert len({id(result) for result in results}) == 3  # Shared results are copied per caller.
+    assert in_flight == 0
+
+
+def test_different_keys_run_separately():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        work.release.set()
+        return await asyncio.gather(flight.do("a", work), flight.do("b", work)), work.runs
+
+    _, runs = asyncio.run(scenario())
+    assert runs == 2
+
+
+def test_errors_reach_every_caller_and_are_not_remembered():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work(error=ValueError("boom"))
+        callers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        work.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        work.error = None
+        again = await flight.do("k", work)
+        return results, again, work.runs
+
+    results, again, runs = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert again == {"run": 2}
+    assert runs == 2
+
+
+def test_work_continues_while_any_caller_waits():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        return await second, first.cancelled(), work.cancelled
+
+    result, first_cancelled, work_cancelled = asyncio.run(scenario())
+    assert result == {"run": 1}
+    assert first_cancelled
+    assert work_cancelled == 0
+
+
+def test_work_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        callers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        cancelled, in_flight = work.cancelled, flight.in_flight()
+        work.release.set()
+        fresh = await flight.do("k", work)  # A new caller starts afresh.
+        return cancelled, in_flight, fresh
+
+    cancelled, in_flight, fresh = asyncio.run(scenario())
+    assert cancelled == 1
+    assert in_flight == 0
+    assert fresh == {"run": 2}
+
+
+def test_joining_callers_wait_at_most_their_timeout():
+    async def scenario():
+        flight, work = SingleFlight("test"), Work()
+        owner = asyncio.ensure_future(flight.do("k", work, timeout=0.01))  # Ignored for the owner.
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await flight.do("k", work, timeout=0.05)
+        await asyncio.sleep(0.05)
+        work.release.set()
+        return await owner, work.cancelled
+
+    result, cancelled = asyncio.run(scenario())
+    assert result == {"run": 1}
+    assert cancelled == 0
+
+
+def test_work_does_not_inherit_the_first_callers_context():
+    async def work():
+        await asyncio.sleep(0)
+        return deadline.current_deadline.get(), metrics.current_span.get()
+
+    async def caller(flight, run_deadline):
+        deadline.current_deadline.set(run_deadline)
+        metrics.current_span.set(object())
+        return await flight.do("k", work)
+
+    async def scenario():
+        flight = SingleFlight("test")
+        return await asyncio.gather(caller(flight, 123.0), caller(flight, None))
+
+    assert asyncio.run(scenario()) == [(None, None), (None, None)]
+
+
+def detected_type(user_input):
+    store = SharedStore()
+    store.set("input", user_input)
+    return asyncio.run(InputDetector().execute(store))
+
+
+@pytest.mark.parametrize("a, b", [
+    ("what is 2+2", "  what   is 2+2 "),
+    ("https://youtu.be/AAAAAAAAAAA", "  https://youtu.be/AAAAAAAAAAA"),
+    ("https://youtu.be/AAAAAAAAAAA", "https://www.youtube.com/watch?v=AAAAAAAAAAA&list=PLx"),
+])
+def test_request_key_matches_equivalent_requests(a, b):
+    assert request_key(a) == request_key(b)
+    assert detected_type(a) == detected_type(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("https://youtu.be/AAAAAAAAAAA", "https://youtu.be/AAAAAAAAAAA https://youtu.be/BBBBBBBBBBB"),
+    ("https://youtu.be/AAAAAAAAAAA", "https://www.youtube.com/playlist?list=PLx"),
+    ("what is 2+2", "what is 2+3"),
+])
+def test_request_key_separates_different_requests(a, b):
+    assert request_key(a) != request_key(b)
+
+
+def test_request_key_depends_on_cache_use_and_context_video():
+    assert request_key("summarize it") != request_key("summarize it", use_cache=False)
+    assert request_key("summarize it") != request_key("summarize it", context_video_id="AAAAAAAAAAA")
+
+
+def test_identical_concurrent_flows_share_one_run(fake_openai):
+    from main import run_agent_flow
+
+    def shared_flows():
+        return sum(counter["value"] for counter in metrics.registry.snapshot()["counters"]
+                   if counter["name"] == "singleflight_shared_total" and counter["labels"] == {"flight": "flow"})
+
+    async def scenario():
+        prompt = "write a python function that adds two numbers"
+        return await asyncio.gather(run_agent_flow(prompt), run_agent_flow("  " + prompt))
+
+    before, requests = shared_flows(), fake_openai.requests
+    first, second = asyncio.run(scenario())
+    assert shared_flows() == before + 1
+    assert fake_openai.requests == requests + 1
+    assert first is not second
+    assert first.get("generated_code") == second.get("generated_code")
+    assert second.get("input").startswith("  ")
@@ -0,0 +1,107 @@
+# text_processing.py
+import re
+
+try:
+    import tiktoken
+except ImportError:  # Optional: without it token counts are estimated.
+    tiktoken = None
+
+# Rough average for English text with OpenAI tokenizers.
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text):
+    """
+    Estimates the number of model tokens in 'text' without calling the API.
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _encoding(model):
+    encoding = _encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Counts the tokens of 'text' for 'model' with tiktoken when it is installed,
+    otherwise falls back to estimate_tokens.
+    """
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_tokens(text)
+    return len(_encoding(model).encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens, model="gpt-3.5-turbo"):
+    """
+    Returns 'text' cut to at most about 'max_tokens' tokens (at a word boundary,
+    marked with "..."), or unchanged if it already fits.
+    """
+    if not text or count_tokens(text, model) <= max_tokens:
+        return text
+    if tiktoken is not None:
+        encoding = _encoding(model)
+        cut = encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        cut = text[:max_tokens * CHARS_PER_TOKEN]
+    if " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut + " ..."
+
+
+def split_sentences(text):
+    """
+    Splits text at sentence boundaries. Returns a list of non-empty sentences.
+    """
+    return [s.strip() for s in _SENTENCE_END.split(text) if s.strip()]
+
+
+def _split_words(sentence, max_tokens):
+    # Auto-generated captions often have no punctuation at all, so a single
+    # "sentence" can be the whole transcript. Fall back to word boundaries.
+    pieces, current, current_tokens = [], [], 0
+    for word in sentence.split():
+        word_tokens = estimate_tokens(word + " ")
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += word_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text, max_tokens):
+    """
+    Splits 'text' into chunks of at most about 'max_tokens' tokens each,
+    breaking at sentence boundaries wherever possible.
+    """
+    chunks, current, current_tokens = [], [], 0
+    for sentence in split_sentences(text):
+        sentence_tokens = estimate_tokens(sentence)
+        pieces = [sentence] if sentence_tokens <= max_tokens else _split_words(sentence, max_tokens)
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
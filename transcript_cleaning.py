@@ -0,0 +1,81 @@
+# transcript_cleaning.py
+import html
+import re
+
+# Bump when clean_captions changes, so transcripts cached by an older version
+# are fetched and cleaned again (see TranscriptStore).
+CLEANING_VERSION = 2
+
+# Non-speech annotations: [Music], [Applause], [ __ ] (censored word), (laughter), ♪ lyrics ♪
+_NON_SPEECH = re.compile(
+    r"\[[^\]]{0,40}\]"
+    r"|\((?:music|applause|laughter|laughs|inaudible|silence|cheering|cheers|no audio)\)"
+    r"|♪[^♪]{0,200}♪|♪",
+    re.IGNORECASE,
+)
+# Speaker changes: ">>" anywhere, or a dash starting a caption line.
+_SPEAKER_MARK = re.compile(r"^\s*-\s+|>>")
+# "mm" after a number is the unit ("35 mm lens"), not a filler.
+_FILLER = re.compile(r"\b(?:u+h+|u+m+|uhm|erm|hmm+|(?<!\d)(?<!\d\s)mm+)\b,?\s*", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+_SPACE_BEFORE_PUNCT = re.compile(r"\s+([.,!?;:])")
+_WORD_KEY = re.compile(r"[^\w']+")
+
+# Longest caption overlap / repeated phrase (in words) that is removed.
+MAX_OVERLAP_WORDS = 12
+MAX_REPEAT_WORDS = 6
+
+
+def _word_key(word):
+    return _WORD_KEY.sub("", word.lower())
+
+
+def _strip_overlap(previous, current):
+    """
+    Drops the words at the start of 'current' that repeat the end of 'previous'
+    (auto-generated captions show each phrase in two consecutive snippets).
+    """
+    limit = min(MAX_OVERLAP_WORDS, len(previous), len(current))
+    for size in range(limit, 0, -1):
+        if [_word_key(w) for w in previous[-size:]] == [_word_key(w) for w in current[:size]]:
+            return current[size:]
+    return current
+
+
+def _collapse_repeats(words):
+    """
+    Removes immediately repeated words and phrases ("the the", "going to going to").
+    """
+    keys = [_word_key(w) for w in words]
+    out, out_keys = [], []
+    for word, key in zip(words, keys):
+        out.append(word)
+        out_keys.append(key)
+        for size in range(1, MAX_REPEAT_WORDS + 1):
+            if len(out_keys) >= 2 * size and out_keys[-size:] == out_keys[-2 * size:-size] and any(out_keys[-size:]):
+                del out[-size:]
+                del out_keys[-size:]
+                break
+    return out
+
+
+def clean_captions(captions):
+    """
+    Normalizes caption text before it is cached or sent to the LLM: unescapes HTML
+    entities, strips non-speech markers and filler words, removes text repeated
+    across consecutive caption lines and immediately repeated words/phrases.
+    'captions' is the transcript text (one caption per line) or a list of captions.
+    Returns a single cleaned string.
+    """
+    lines = captions.split("\n") if isinstance(captions, str) else list(captions)
+    words, previous = [], []
+    for line in lines:
+        line = html.unescape(html.unescape(line))  # Captions are sometimes escaped twice.
+        line = _NON_SPEECH.sub(" ", line)
+        line = _SPEAKER_MARK.sub(" ", line)
+        line = _FILLER.sub("", line)
+        current = _strip_overlap(previous, line.split())
+        words.extend(current)
+        previous = line.split() or previous
+    text = " ".join(_collapse_repeats(words))
+    return _SPACE_BEFORE_PUNCT.sub(r"\1", _SPACES.sub(" ", text)).strip()
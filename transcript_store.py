@@ -0,0 +1,71 @@
+# transcript_store.py
+import json
+import os
+import threading
+
+import config
+
+from disk_cache import DiskCache
+from transcript_cleaning import CLEANING_VERSION
+
+TRANSCRIPT_CACHE_ENABLED = os.getenv("TRANSCRIPT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.getenv("LLM_CACHE_DIR", ".cache"))
+TRANSCRIPT_CACHE_TTL = float(os.getenv("TRANSCRIPT_CACHE_TTL", str(30 * 24 * 3600)))
+TRANSCRIPT_NEGATIVE_TTL = float(os.getenv("TRANSCRIPT_NEGATIVE_TTL", str(6 * 3600)))
+TRANSCRIPT_CACHE_MAX_BYTES = int(os.getenv("TRANSCRIPT_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class TranscriptStore:
+    """
+    Compressed on-disk store of fetched YouTube transcripts, keyed by video ID.
+    Besides transcripts it remembers videos that have no transcript or have
+    transcripts disabled (negative caching, with a shorter TTL), so known-bad
+    IDs fail fast instead of hitting YouTube again.
+    Keys include 'version' (the caption cleaning version), so entries written
+    by an older cleaner are ignored and fetched again.
+    """
+    def __init__(self, path, ttl=TRANSCRIPT_CACHE_TTL, negative_ttl=TRANSCRIPT_NEGATIVE_TTL,
+                 max_bytes=TRANSCRIPT_CACHE_MAX_BYTES, version=CLEANING_VERSION):
+        self.version = version
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.cache = DiskCache(path, max_bytes=max_bytes, default_ttl=ttl)
+
+    def _key(self, video_id):
+        return f"{video_id}@v{self.version}"
+
+    def get(self, video_id):
+        """
+        Returns (status, transcript) for a known video, or None if it has to be fetched.
+        'status' is "success" with the transcript text, or the failure action
+        (e.g. "no_transcript_found") with transcript None.
+        """
+        raw = self.cache.get(self._key(video_id))
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        return record["status"], record.get("transcript")
+
+    def put(self, video_id, transcript):
+        record = {"status": "success", "transcript": transcript}
+        self.cache.set(self._key(video_id), json.dumps(record).encode("utf-8"), ttl=self.ttl)
+
+    def put_failure(self, video_id, status):
+        self.cache.set(self._key(video_id), json.dumps({"status": status}).encode("utf-8"), ttl=self.negative_ttl)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transcript_store():
+    """
+    Returns the process-wide TranscriptStore, or None when the transcript cache is disabled.
+    """
+    global _store
+    if not TRANSCRIPT_CACHE_ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = TranscriptStore(os.path.join(TRANSCRIPT_CACHE_DIR, "transcripts.sqlite3"))
+        return _store